@@ -0,0 +1,452 @@
+# ======================
+# 蒙特卡洛树搜索（MCTS）敌人 AI
+# ======================
+import math
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from game.Entity.condition import CONDITIONS
+from game.Entity.entity import MODIFIABLE, UNARMED_DICE, Entity
+from game.Item.item import Consumable, EquipmentSlot
+from utils import output
+from utils.rng import BlockRNG, RNGStream
+
+
+class EnemyAction(NamedTuple):
+    """
+    敌人的一次行动
+
+    target 为单位编号（玩家 + 敌人 的初始顺序），-1 表示群体技能的全部目标
+    """
+    kind: str       # "attack" / "skill" / "item"
+    index: int      # 技能 / 道具下标，attack 时为 0
+    target: int
+
+
+class SimUnit:
+    """
+    用于推演的轻量单位
+
+    静态数据（命中、AC、伤害骰、技能、装备）与原单位共享，只有 HP / MP / 技能次数 / 道具数量是各自的，
+    clone() 只复制这几个字段；状态表和修正栈与 Entity 一样整体替换（写时复制），可以直接共享。
+    接口与 Entity 相同的部分（属性、take_damage、heal、状态、修正栈）足够技能效果函数使用。
+    """
+    __slots__ = ("name", "side", "HP", "MAX_HP", "MP", "MAX_MP", "STR", "DEX", "CON", "INT", "WIS", "CHA",
+                 "to_hit", "ac", "str_mod", "plan", "skills", "uses", "items", "equipment", "hp_listener",
+                 "condition_mask", "condition_turns", "modifiers")
+
+    @classmethod
+    def from_entity(cls, entity, side: int, present: bool = True) -> "SimUnit":
+        unit = cls.__new__(cls)
+        unit.name = entity.name
+        unit.side = side                                   # 0 = 玩家，1 = 敌人
+        unit.HP = entity.HP if present else 0              # 已逃跑的单位视为离场
+        unit.MAX_HP = entity.MAX_HP
+        unit.MP, unit.MAX_MP = entity.MP, entity.MAX_MP
+        unit.STR, unit.DEX, unit.CON = entity.STR, entity.DEX, entity.CON
+        unit.INT, unit.WIS, unit.CHA = entity.INT, entity.WIS, entity.CHA
+        unit.equipment = dict(entity.equipment)  # 实体上可能是共享的只读 EMPTY，无法 pickle 给子进程
+        unit.hp_listener = None
+        unit.condition_mask = entity.condition_mask
+        unit.condition_turns = dict(entity.condition_turns)
+        unit.modifiers = dict(entity.modifiers)
+
+        # 与 Entity.resolve_attack 相同的命中与伤害规则
+        unit.to_hit = entity.to_hit
+        unit.ac = entity.armor_class
+        unit.str_mod = entity.damage_bonus
+        weapon = entity.equipment.get(EquipmentSlot.WEAPON)
+        unit.plan = weapon.damage_plan if weapon else UNARMED_DICE
+
+        unit.skills = [s for s in getattr(entity, "skills", []) if s.effect_func is not None]
+        unit.uses = [s.remaining_uses for s in unit.skills]
+        inventory = getattr(entity, "inventory", None)
+        unit.items = [[item, quantity] for item, quantity in inventory.list_items()
+                      if isinstance(item, Consumable)] if inventory else []
+        return unit
+
+    def clone(self) -> "SimUnit":
+        unit = SimUnit.__new__(SimUnit)
+        for name in SimUnit.__slots__:
+            setattr(unit, name, getattr(self, name))
+        unit.uses = self.uses[:]
+        unit.items = [slot[:] for slot in self.items]
+        return unit
+
+    def take_damage(self, amount: int):
+        if amount > 0:
+            self.HP = max(self.HP - amount, 0)
+
+    def heal(self, amount: int):
+        self.HP = min(self.HP + amount, self.MAX_HP)
+
+    def is_alive(self) -> bool:
+        return self.HP > 0
+
+    # 状态：与 Entity 相同的实现（只用到 condition_mask / condition_turns / 修正栈 / take_damage）
+    Condition = Entity.Condition
+    add_condition = Entity.add_condition
+    remove_condition = Entity.remove_condition
+    clear_conditions = Entity.clear_conditions
+    has_condition = Entity.has_condition
+    has_any = Entity.has_any
+    can_act = Entity.can_act
+    tick_conditions = Entity.tick_conditions
+
+    # 修正栈：与 Entity 相同的接口，按新旧加值之差直接调整推演用到的属性
+    def set_modifier(self, source, modifiers: dict):
+        modifiers = {stat: value for stat, value in modifiers.items() if stat in MODIFIABLE and value}
+        old = self.modifiers.get(source, {})
+        stack = {key: value for key, value in self.modifiers.items() if key != source}
+        if modifiers:
+            stack[source] = modifiers
+        self.modifiers = stack
+        self._apply_bonus(old, modifiers)
+
+    def remove_modifier(self, source):
+        if source in self.modifiers:
+            old = self.modifiers[source]
+            self.modifiers = {key: value for key, value in self.modifiers.items() if key != source}
+            self._apply_bonus(old, {})
+
+    def _apply_bonus(self, old: dict, new: dict):
+        for stat in old.keys() | new.keys():
+            delta = new.get(stat, 0) - old.get(stat, 0)
+            if not delta:
+                continue
+            # 派生值的规则同 Entity.recalculate
+            if stat == "DEX":
+                self.to_hit += delta
+                self.ac += (self.DEX + delta - 10) // 2 - (self.DEX - 10) // 2
+            elif stat == "STR":
+                self.str_mod += (self.STR + delta - 10) // 2 - (self.STR - 10) // 2
+            if stat in _DERIVED_BONUS:
+                name = _DERIVED_BONUS[stat]
+                setattr(self, name, getattr(self, name) + delta)
+            elif stat in _SIM_STATS:
+                setattr(self, stat, getattr(self, stat) + delta)
+        self.HP = min(self.HP, self.MAX_HP)
+        self.MP = min(self.MP, self.MAX_MP)
+
+
+# 只作用于派生值的修正 → SimUnit 上对应的字段；Speed 不参与推演
+_DERIVED_BONUS = {"AC": "ac", "to_hit": "to_hit", "damage": "str_mod"}
+_SIM_STATS = {"STR", "DEX", "CON", "INT", "WIS", "CHA", "MAX_HP", "MAX_MP"}
+
+
+# -----------------------------
+# 推演规则
+# -----------------------------
+def legal_actions(units: List[SimUnit], actor: int) -> List[EnemyAction]:
+    """actor 当前可以采取的行动"""
+    me = units[actor]
+    foes = [i for i, u in enumerate(units) if u.side != me.side and u.HP > 0]
+    allies = [i for i, u in enumerate(units) if u.side == me.side and u.HP > 0]
+    actions = [EnemyAction("attack", 0, t) for t in foes]
+    for s, skill in enumerate(me.skills):
+        if me.uses[s] <= 0 or me.MP < skill.mp_cost or me.condition_mask & skill.blocked_by:
+            continue
+        targets = allies if skill.effect_type in ("heal", "buff") else foes
+        if skill.target_type == "single":
+            actions.extend(EnemyAction("skill", s, t) for t in targets)
+        elif targets:
+            actions.append(EnemyAction("skill", s, -1))
+    for i, (item, quantity) in enumerate(me.items):
+        if quantity > 0:
+            actions.append(EnemyAction("item", i, actor))
+    return actions
+
+
+def apply_action(units: List[SimUnit], actor: int, action: EnemyAction, rng):
+    """在推演状态上执行一次行动"""
+    me = units[actor]
+    if action.kind == "attack":
+        target = units[action.target]
+        natural_roll = rng(1, 20)
+        crit = natural_roll == 20
+        if crit or natural_roll + me.to_hit >= target.ac:
+            target.take_damage(max(me.plan.roll_total(crit=crit, rng=rng) + me.str_mod, 0))
+    elif action.kind == "skill":
+        skill = me.skills[action.index]
+        me.MP -= skill.mp_cost
+        me.uses[action.index] -= 1
+        if action.target >= 0:
+            targets = [units[action.target]]
+        else:
+            side = me.side if skill.effect_type in ("heal", "buff") else 1 - me.side
+            targets = [u for u in units if u.side == side and u.HP > 0]
+        if skill._effect_takes_rng:
+            skill.effect_func(me, targets, rng=rng)
+        else:
+            skill.effect_func(me, targets)
+    elif action.kind == "item":
+        slot = me.items[action.index]
+        slot[1] -= 1
+        slot[0].use(me)
+
+
+def _random_attack(units: List[SimUnit], actor: int, rng, choice) -> bool:
+    """默认策略：与 auto 模式相同，攻击随机存活对手；没有对手时返回 False"""
+    side = units[actor].side
+    foes = [i for i, u in enumerate(units) if u.side != side and u.HP > 0]
+    if not foes:
+        return False
+    apply_action(units, actor, EnemyAction("attack", 0, choice(foes)), rng)
+    return True
+
+
+def _evaluate(units: List[SimUnit], side: int) -> float:
+    """从 side 一方看的局面价值，取值 0 ~ 1：获胜为 1，全灭为 0，否则按双方剩余 HP 比例插值"""
+    own = sum(u.HP for u in units if u.side == side)
+    foe = sum(u.HP for u in units if u.side != side)
+    if foe <= 0:
+        return 1.0
+    if own <= 0:
+        return 0.0
+    own_max = sum(u.MAX_HP for u in units if u.side == side)
+    foe_max = sum(u.MAX_HP for u in units if u.side != side)
+    return 0.5 + 0.5 * (own / own_max - foe / foe_max)
+
+
+class _Node:
+    __slots__ = ("children", "visits", "value")
+
+    def __init__(self):
+        self.children: Dict[EnemyAction, "_Node"] = {}
+        self.visits = 0
+        self.value = 0.0
+
+
+# -----------------------------
+# 搜索
+# -----------------------------
+def search(units: List[SimUnit], actor: int, budget: Optional[float] = 0.05, iterations: int = None,
+           rollout_rounds: int = 20, exploration: float = 1.4, seed: int = None) -> Dict[EnemyAction, Tuple[int, float]]:
+    """
+    对 actor 的这次决策做开环 MCTS
+
+    - 行动顺序按 BattleManager 默认模式：本回合 actor 之后的敌人，然后每回合玩家在前、敌人在后；
+      眩晕等状态的单位跳过行动，每回合结束时结算持续伤害和持续时间（同 BattleManager.end_round）
+    - 树只覆盖 actor 一方的决策；对手按 auto 模式随机攻击（视为环境的随机性）
+    - 每次迭代从根状态复制一份，沿树下降（UCB1），扩展一个新动作后用随机攻击推演 rollout_rounds 回合，
+      再用 _evaluate 估值并回传
+    - budget 为墙钟时间上限（秒，None 表示不限），iterations 为迭代次数上限（None 表示不限），二者先到者为准
+
+    返回 {根动作: (访问次数, 累计价值)}
+    """
+    stream = RNGStream(seed)
+    rng = BlockRNG(stream, block_size=1024)   # 推演用批量预取的骰子
+    choice, pick = stream.choice, stream.random
+    skip = CONDITIONS.skip_turn_mask
+    side = units[actor].side
+    order = [i for i, u in enumerate(units) if u.side == 0] + [i for i, u in enumerate(units) if u.side == 1]
+    start_pos = order.index(actor)
+    root = _Node()
+    deadline = time.perf_counter() + budget if budget is not None else math.inf
+    limit = iterations if iterations is not None else math.inf
+    count = 0
+
+    while count < limit and time.perf_counter() < deadline:
+        count += 1
+        state = [u.clone() for u in units]
+        node, path, in_tree = root, [root], True
+        pos, rounds = start_pos, 0
+
+        while rounds < rollout_rounds:
+            index = order[pos]
+            unit = state[index]
+            if unit.HP > 0 and not unit.condition_mask & skip:
+                if not any(u.HP > 0 for u in state if u.side != unit.side):
+                    break
+                if in_tree and unit.side == side:
+                    actions = legal_actions(state, index)
+                    untried = [a for a in actions if a not in node.children]
+                    if untried:
+                        # 扩展：随机挑一个未尝试的动作，之后转入随机推演
+                        action = untried[int(pick() * len(untried))]
+                        node.children[action] = node = _Node()
+                        in_tree = False
+                    else:
+                        # 选择：UCB1
+                        log_n = math.log(node.visits)
+                        action = max(actions, key=lambda a: node.children[a].value / node.children[a].visits
+                                     + exploration * math.sqrt(log_n / node.children[a].visits))
+                        node = node.children[action]
+                    path.append(node)
+                    apply_action(state, index, action, rng)
+                else:
+                    _random_attack(state, index, rng, choice)
+            pos += 1
+            if pos == len(order):
+                pos, rounds = 0, rounds + 1
+                for u in state:
+                    if u.condition_mask and u.HP > 0:
+                        u.tick_conditions()
+
+        value = _evaluate(state, side)
+        for visited in path:
+            visited.visits += 1
+            visited.value += value
+
+    return {action: (child.visits, child.value) for action, child in root.children.items()}
+
+
+def _search_worker(args):
+    # ProcessPoolExecutor.map 只接受单个参数；技能效果等的输出在子进程中丢弃
+    with output.redirect(output.NullOutput()):
+        return search(*args)
+
+
+class MCTSPolicy:
+    """
+    敌人回合的 MCTS 策略，传给 BattleManager(enemy_policy=...)
+
+    参数：
+    - budget: 每次决策的墙钟时间上限（秒），保证回合循环不会卡住；None 表示不限
+    - iterations: 每次决策的迭代上限，None 表示只受 budget 限制；
+                  budget=None + iterations + seed 时决策完全可复现
+    - rollout_rounds: 每次推演的最大回合数
+    - exploration: UCB1 的探索系数
+    - workers: >1 时用多进程做根并行（每个进程独立搜索，合并根节点统计）；
+               技能效果函数无法 pickle 或进程池崩溃时退回单进程，并在战斗日志中记一条 warning
+    - seed: 搜索随机种子，None 表示每次决策从战斗的随机数流中取一个
+    """
+
+    def __init__(self, budget: float = 0.05, iterations: int = None, rollout_rounds: int = 20,
+                 exploration: float = 1.4, workers: int = 1, seed: int = None):
+        self.budget = budget
+        self.iterations = iterations
+        self.rollout_rounds = rollout_rounds
+        self.exploration = exploration
+        self.workers = workers
+        self.seed = seed
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.last_stats: Dict[EnemyAction, Tuple[int, float]] = {}  # 最近一次决策的根节点统计
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def snapshot(self, battle) -> List[SimUnit]:
+        """把 BattleManager 的当前局面复制成推演状态，单位编号与 battle.units 一致"""
+        return [SimUnit.from_entity(u, 0 if i < battle.num_players else 1,
+                                    present=i >= battle.num_players or u in battle.players)
+                for i, u in enumerate(battle.units)]
+
+    def act(self, battle, enemy):
+        """BattleManager 的敌人策略接口：选择并执行行动"""
+        perform_enemy_action(battle, enemy, self.choose(battle, enemy))
+
+    def choose(self, battle, enemy) -> EnemyAction:
+        """为 battle 中的 enemy 选择行动"""
+        units = self.snapshot(battle)
+        actor = battle.units.index(enemy)
+        seed = self.seed if self.seed is not None else battle.rng.randint(0, (1 << 63) - 1)
+
+        stats = None
+        if self.workers > 1:
+            stats = self._parallel_search(battle, units, actor, seed)
+        if stats is None:
+            with output.redirect(output.NullOutput()):
+                stats = search(units, actor, self.budget, self.iterations, self.rollout_rounds,
+                               self.exploration, seed)
+        self.last_stats = stats
+        if not stats:
+            return legal_actions(units, actor)[0]
+        # 选访问次数最多的动作（比平均价值更稳健）
+        return max(stats, key=lambda a: (stats[a][0], stats[a][1]))
+
+    def _parallel_search(self, battle, units, actor, seed):
+        """多进程根并行；推演状态无法 pickle 或进程池崩溃时退回单进程（返回 None），其余异常照常抛出"""
+        # 先在本进程试着序列化：效果函数是闭包 / lambda 时 pickle 抛 PicklingError，
+        # 局部函数抛 AttributeError（"Can't pickle local object"）；只在这里捕获，不掩盖搜索本身的错误
+        try:
+            pickle.dumps(units)
+        except (pickle.PicklingError, AttributeError, TypeError) as e:
+            return self._fall_back(battle, e)
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        iterations = -(-self.iterations // self.workers) if self.iterations else None
+        tasks = [(units, actor, self.budget, iterations, self.rollout_rounds, self.exploration, seed + i)
+                 for i in range(self.workers)]
+        try:
+            results = list(self._pool.map(_search_worker, tasks))
+        except (pickle.PicklingError, BrokenProcessPool) as e:
+            return self._fall_back(battle, e)
+        merged: Dict[EnemyAction, Tuple[int, float]] = {}
+        for result in results:
+            for action, (visits, value) in result.items():
+                old_visits, old_value = merged.get(action, (0, 0.0))
+                merged[action] = (old_visits + visits, old_value + value)
+        return merged
+
+    def _fall_back(self, battle, error: Exception):
+        self.close()
+        self.workers = 1
+        battle.logger.warning("mcts_fallback", "⚠️ MCTS 多进程搜索不可用（{error}），改为单进程搜索",
+                              error=f"{type(error).__name__}: {error}")
+        return None
+
+
+def perform_enemy_action(battle, enemy, action: EnemyAction):
+    """在真实战斗中执行 MCTS 选出的行动"""
+    if action.kind == "attack":
+        target = battle.units[action.target]
+        battle.emit_attack(enemy, target, enemy.attack(target, rng=battle.rng))
+    elif action.kind == "skill":
+        skill = [s for s in getattr(enemy, "skills", []) if s.effect_func is not None][action.index]
+        if action.target >= 0:
+            targets = battle.units[action.target]
+        elif skill.effect_type in ("heal", "buff"):
+            targets = list(battle.alive_enemies)
+        else:
+            targets = list(battle.alive_players)
+        result = skill.use(enemy, targets, rng=battle.rng)
+        if isinstance(result, dict) and result.get("msg"):
+            battle.log_msg(result["msg"])
+        else:
+            battle.log_msg(f"{enemy.name} 使用了 {skill.name}")
+    elif action.kind == "item":
+        item = [i for i, _ in enemy.inventory.list_items() if isinstance(i, Consumable)][action.index]
+        enemy.inventory.remove(item, 1)
+        item.use(enemy)
+        battle.log_msg(f"{enemy.name} 使用了 {item.name}")
+
+
+if __name__ == "__main__":
+    from game.Event.battle import BattleManager
+    from game.Simulation.montecarlo import create_units
+    from game.Skill.skill import Skill
+    from utils.logger import OFF
+
+    def smite(user, targets):
+        targets[0].take_damage(7)
+
+    def play(policy, battles: int) -> float:
+        wins = 0
+        for seed in range(battles):
+            players, enemies = create_units(["战士", "法师"], ["兽人", "兽人"])
+            for enemy in enemies:
+                enemy.skills = [Skill("重击", effect_func=smite, uses_per_battle=1, description="固定 7 点伤害")]
+            battle = BattleManager(players, enemies, rng=seed, log_level=OFF, enemy_policy=policy)
+            with output.redirect(output.NullOutput()):
+                battle.start_battle()
+            wins += bool(battle.alive_players)
+        return wins / battles
+
+    battles = 50
+    start = time.perf_counter()
+    print(f"随机敌人: 玩家胜率 {play(None, battles):.0%}（{time.perf_counter() - start:.2f}s）")
+    start = time.perf_counter()
+    print(f"MCTS 敌人（每步 200 次迭代）: 玩家胜率 {play(MCTSPolicy(budget=None, iterations=200, seed=1), battles):.0%}"
+          f"（{time.perf_counter() - start:.2f}s）")
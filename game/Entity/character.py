@@ -1,6 +1,7 @@
 from game.Item.item import EquipmentSlot, Equipment
 from game.Inventory.inventory import Inventory
 from game.Entity.entity import Entity
+from utils import output
 
 # ----------------------
 # 固定经验需求表
@@ -16,6 +17,9 @@ EXP_TABLE = {
 # 玩家类
 # ======================
 class Character(Entity):
+    __slots__ = ("background", "occupation", "deputy_occupation", "experience", "attribute_points",
+                 "skills", "inventory")
+
     def __init__(self, background="", occupation="", deputy_occupation="", **kwargs):
         super().__init__(**kwargs)
 
@@ -32,7 +36,8 @@ class Character(Entity):
         self.skills = []  # [Skill]
         self.inventory = Inventory()
 
-        print(f"角色已创建：{self.info()}")
+        if output.enabled:
+            output.emit(f"角色已创建：{self.info()}")
 
     def info(self):
         info = super().info()
@@ -44,19 +49,20 @@ class Character(Entity):
             "attribute_points": self.attribute_points,
             "skills": [skill.name for skill in self.skills],
             "inventory": self.inventory.list_items(),
-            "equipment": {slot.name: (item.name if item else None) for slot, item in self.equipment.items()}
+            "equipment": {slot.name: (self.equipment[slot].name if slot in self.equipment else None)
+                          for slot in EquipmentSlot}
         })
         return info
 
     def learn_skill(self, skill):
-        print(f"✅ {skill.name} 习得了技能 {skill.name}")
+        output.emit(f"✅ {skill.name} 习得了技能 {skill.name}")
         self.skills.append(skill)
 
-    def use_skill(self, skill, targets):
+    def use_skill(self, skill, targets, rng=None):
         if skill in self.skills:
-            return skill.use(self, targets)
+            return skill.use(self, targets, rng=rng)
         else:
-            print(f"{self.name} 没有学会技能 {skill.name}！")
+            output.emit(f"{self.name} 没有学会技能 {skill.name}！")
             return False
 
     # 升级逻辑
@@ -68,10 +74,11 @@ class Character(Entity):
     def level_up(self):
         self.level += 1
         self.attribute_points += 2  # 示例：每级送 2 点属性
-        self.MAX_HP += 5
+        # 每级 +5 最大生命：在已有的等级加值上累加（以高于 1 级创建 / 读取的角色没有之前各级的加值）
+        self.set_modifier("level", {"MAX_HP": self.modifiers.get("level", {}).get("MAX_HP", 0) + 5})
         self.HP = self.MAX_HP
         # TODO: 职业特性提升
-        print(f"{self.name} 升级到 {self.level} 级！")
+        output.emit(f"{self.name} 升级到 {self.level} 级！")
 
     def allocate_points(self, attr: str, points: int):
         ATTR_MAP = {
@@ -87,7 +94,7 @@ class Character(Entity):
             setattr(self, real_attr, getattr(self, real_attr) + points)
             self.attribute_points -= points
         else:
-            print("点数不足！")
+            output.emit("点数不足！")
     # 背包与物品
     def add_item(self, item, quantity: int = 1):
         success, msg = self.inventory.add(item, quantity)
@@ -120,8 +127,8 @@ class Character(Entity):
         if slot in self.equipment and self.equipment.get(slot):
             item = self.equipment.get(slot)
             item.unequip_from(self)
-            print(f"{self.name} 卸下了 {item.name}")
+            output.emit(f"{self.name} 卸下了 {item.name}")
         else:
-            print(f"{self.name} 没有装备在 {slot} 槽位的物品")
+            output.emit(f"{self.name} 没有装备在 {slot} 槽位的物品")
 
 
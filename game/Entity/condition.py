@@ -0,0 +1,115 @@
+# ======================
+# 状态系统（中毒、眩晕等）
+# ======================
+from typing import Callable, Dict, Iterable, List, NamedTuple, Tuple, Union
+
+
+class ConditionType(NamedTuple):
+    """一种登记过的状态"""
+    name: str
+    flag: int                    # 位标记，实体的 condition_mask 中对应的一位
+    modifiers: Dict[str, int]    # 持续期间的属性加值（写入实体的修正栈），如 {"damage": -2}
+    damage: int                  # 每回合结束时造成的伤害（中毒等）
+    skip_turn: bool              # 是否无法行动（眩晕等）
+
+
+class ConditionRegistry:
+    """
+    状态登记表
+
+    每种状态登记时分配一个位标记，实体用一个整数 condition_mask 保存当前所有状态，
+    查询“是否眩晕”“是否有 X 或 Y 中任一状态”都是一次按位与。
+    skip_turn_mask / damage_mask 汇总了具有对应效果的所有状态，回合结算时直接与之相与。
+    """
+
+    def __init__(self):
+        self._by_name: Dict[str, ConditionType] = {}
+        self._by_flag: Dict[int, ConditionType] = {}
+        self.skip_turn_mask = 0
+        self.damage_mask = 0
+
+    def register(self, name: str, modifiers: Dict[str, int] = None, damage: int = 0,
+                 skip_turn: bool = False) -> int:
+        """登记一种状态，返回它的位标记；已登记的名字直接返回原来的标记"""
+        if name in self._by_name:
+            return self._by_name[name].flag
+        flag = 1 << len(self._by_name)
+        condition = ConditionType(name, flag, dict(modifiers or {}), damage, skip_turn)
+        self._by_name[name] = condition
+        self._by_flag[flag] = condition
+        if skip_turn:
+            self.skip_turn_mask |= flag
+        if damage:
+            self.damage_mask |= flag
+        return flag
+
+    def flag(self, condition: Union[str, int], create: bool = True) -> int:
+        """
+        状态名或位标记 → 位标记
+
+        未登记的名字在 create=True 时登记为没有额外效果的状态（兼容任意字符串状态），
+        否则返回 0（查询未登记的状态时不会误加入登记表）
+        """
+        if isinstance(condition, int):
+            return condition
+        found = self._by_name.get(condition)
+        if found is not None:
+            return found.flag
+        return self.register(condition) if create else 0
+
+    def mask(self, *conditions: Union[str, int]) -> int:
+        """多个状态的位标记按位或，用于 has_any 等查询"""
+        mask = 0
+        for condition in conditions:
+            mask |= self.flag(condition, create=False)
+        return mask
+
+    def get(self, condition: Union[str, int]) -> ConditionType:
+        if isinstance(condition, int):
+            return self._by_flag[condition]
+        return self._by_name[condition]
+
+    def types(self, mask: int) -> List[ConditionType]:
+        """mask 中所有状态，按登记顺序"""
+        found = []
+        while mask:
+            low = mask & -mask
+            found.append(self._by_flag[low])
+            mask ^= low
+        return found
+
+    def names(self, mask: int) -> Tuple[str, ...]:
+        return tuple(condition.name for condition in self.types(mask))
+
+    def __contains__(self, name: str):
+        return name in self._by_name
+
+
+CONDITIONS = ConditionRegistry()
+
+# 内置状态
+POISONED = CONDITIONS.register("中毒", damage=2)
+STUNNED = CONDITIONS.register("眩晕", skip_turn=True)
+WEAKENED = CONDITIONS.register("虚弱", modifiers={"damage": -2})
+
+
+def tick_conditions(units: Iterable, report: Callable = None) -> List:
+    """
+    回合结束时统一结算一批单位的状态
+
+    没有任何状态的单位只做一次整数判断；其余单位由 Entity.tick_conditions 结算持续伤害、
+    持续时间减一、到期移除。report(unit, condition, event, value) 可选，
+    event 为 "damage"（value 为伤害）或 "expire"。
+
+    返回因状态伤害而死亡的单位列表
+    """
+    died = []
+    for unit in units:
+        if not unit.condition_mask or unit.HP <= 0:
+            continue
+        for condition, event, value in unit.tick_conditions():
+            if report is not None:
+                report(unit, condition, event, value)
+        if unit.HP <= 0:
+            died.append(unit)
+    return died
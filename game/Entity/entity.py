@@ -1,13 +1,116 @@
 # ======================
 # 公共实体类
 # ======================
-from typing import List
+import random
+from types import MappingProxyType
+from typing import List, NamedTuple, Optional, Tuple, Union
 
+from game.Entity.condition import CONDITIONS, ConditionType
 from game.Item.item import EquipmentSlot
-from utils.dice import roll_detail
+from utils.dice import compile_dice, DiceResult
+from utils.profiler import profiled
+from utils import output
+
+# 常用骰子预先编译，攻击时直接复用
+ATTACK_DICE = compile_dice("1d20")
+ADVANTAGE_DICE = compile_dice("2d20kh1")     # 优势：2d20 取高
+DISADVANTAGE_DICE = compile_dice("2d20kl1")  # 劣势：2d20 取低
+UNARMED_DICE = compile_dice("1d4")
+
+
+class AttackResult(NamedTuple):
+    """一次普通攻击的结算结果"""
+    natural_roll: int                  # d20 原始点数（优劣势时为保留的那颗）
+    attack_roll: int                   # 命中值
+    target_ac: int                     # 目标 AC
+    hit: bool                          # 是否命中
+    crit: bool                         # 是否暴击
+    damage: int                        # 造成的伤害（未命中为 0）
+    damage_roll: Optional[DiceResult]  # 伤害骰详情（仅 detail=True 时保留）
+
+
+class Stat:
+    """
+    可被修正的属性描述符（六维、MAX_HP、MAX_MP、Speed）
+
+    基础值存放在 "_STR" 槽位，读取时返回 基础值 + 修正栈中的加值；
+    赋值时写入 “赋的值 - 当前加值”，所以 allocate_points、level_up 里的 += 只改变基础值。
+    每次赋值都会使派生属性失效（见 Entity.recalculate）
+    """
+    __slots__ = ("name", "base")
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.base = owner.__dict__["_" + name]   # 槽位的成员描述符
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        return self.base.__get__(obj, owner) + obj._bonus.get(self.name, 0)
+
+    def __set__(self, obj, value):
+        self.base.__set__(obj, value - obj._bonus.get(self.name, 0))
+        obj._dirty = True
+
+
+class Derived:
+    """
+    派生属性描述符（XXX_MOD、armor_class、to_hit、damage_bonus）
+
+    值缓存在 "_名字" 槽位；来源变化后（_dirty）第一次读取时整体重算一次，之后直接返回缓存
+    """
+    __slots__ = ("cache",)
+
+    def __set_name__(self, owner, name):
+        self.cache = owner.__dict__["_" + name]
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        if obj._dirty:
+            obj.recalculate()
+        return self.cache.__get__(obj, owner)
+
+
+# 共享的只读空容器：实体的修正栈、装备在第一次写入时才创建自己的字典（写时复制）
+EMPTY = MappingProxyType({})
+
+# 修正栈可以修改的属性：Stat 属性，以及只作用于派生值的 "AC"（护甲等级）、"to_hit"（命中）、"damage"（伤害加值）
+MODIFIABLE = frozenset({"STR", "DEX", "CON", "INT", "WIS", "CHA", "MAX_HP", "MAX_MP", "Speed",
+                        "AC", "to_hit", "damage"})
 
 
 class Entity:
+    # 用 __slots__ 代替实例 __dict__，大量创建怪物时更省内存、属性访问更快
+    __slots__ = ("name", "gender", "race", "level",
+                 "_STR", "_DEX", "_CON", "_INT", "_WIS", "_CHA", "_MAX_HP", "_MAX_MP", "_Speed",
+                 "_STR_MOD", "_DEX_MOD", "_CON_MOD", "_INT_MOD", "_WIS_MOD", "_CHA_MOD",
+                 "_armor_class", "_to_hit", "_damage_bonus",
+                 "modifiers", "_bonus", "_dirty",
+                 "HP", "MP", "AC", "condition_mask", "condition_turns", "hp_listener", "equipment")
+
+    # 基础属性（读取值包含修正栈的加值）
+    STR = Stat()
+    DEX = Stat()
+    CON = Stat()
+    INT = Stat()
+    WIS = Stat()
+    CHA = Stat()
+    MAX_HP = Stat()
+    MAX_MP = Stat()
+    Speed = Stat()
+
+    # 派生属性（缓存，来源变化时才重算）
+    STR_MOD = Derived()
+    DEX_MOD = Derived()
+    CON_MOD = Derived()
+    INT_MOD = Derived()
+    WIS_MOD = Derived()
+    CHA_MOD = Derived()
+    armor_class = Derived()   # 10 + 敏捷调整值 + 护甲 / 盾牌 / 其他 "AC" 加值
+    to_hit = Derived()        # 命中加值：敏捷 + 其他 "to_hit" 加值（武器的 attack_bonus 目前不参与）
+    damage_bonus = Derived()  # 伤害加值：力量调整值 + 其他 "damage" 加值
+
     def __init__(self,
                  name: str = "",
                  gender:str = "",
@@ -28,6 +131,12 @@ class Entity:
         self.race = race
         self.level = level
 
+        # 修正栈：{来源: {属性: 加值}}，来源如 ("equipment", 槽位)、("condition", 状态)、"level"
+        # 修改时整体替换（写时复制），未修改的实体共享只读的 EMPTY
+        self.modifiers = EMPTY
+        self._bonus = EMPTY  # 所有来源按属性求和
+        self._dirty = True
+
         # 六维属性
         self.STR = STR
         self.DEX = DEX
@@ -43,10 +152,59 @@ class Entity:
         self.MP = MP
         self.AC = AC
         self.Speed = Speed
-        self.Condition: List[str] = []  # 状态（中毒、眩晕等）
+        # 状态（中毒、眩晕等）：登记过的状态位标记按位或，见 game.Entity.condition
+        self.condition_mask = 0
+        self.condition_turns = EMPTY  # {位标记: 剩余回合数}，只记录有持续时间的状态；修改时整体替换
+        self.hp_listener = None  # 生死状态变化时的回调 hp_listener(self)，由 BattleManager 设置
 
         # TODO:装备槽位
-        self.equipment = {slot: None for slot in EquipmentSlot}     # {slot: Item}
+        self.equipment = EMPTY  # {slot: Item}，只保存已装备的槽位，查询请用 equipment.get(slot)；修改时整体替换
+
+    # ------------------
+    # 修正栈
+    # ------------------
+    def set_modifier(self, source, modifiers: dict):
+        """设置（或替换）一个来源的加值，例如装备、状态、等级成长"""
+        modifiers = {stat: value for stat, value in modifiers.items() if stat in MODIFIABLE and value}
+        stack = {key: value for key, value in self.modifiers.items() if key != source}
+        if modifiers:
+            stack[source] = modifiers
+        self.modifiers = stack
+        self._rebuild_bonus()
+
+    def remove_modifier(self, source):
+        if source in self.modifiers:
+            self.modifiers = {key: value for key, value in self.modifiers.items() if key != source}
+            self._rebuild_bonus()
+
+    def _rebuild_bonus(self):
+        bonus = {}
+        for modifiers in self.modifiers.values():
+            for stat, value in modifiers.items():
+                bonus[stat] = bonus.get(stat, 0) + value
+        self._bonus = bonus
+        self._dirty = True
+        # 上限降低时收回超出的 HP / MP
+        if self.HP > self.MAX_HP:
+            self.HP = self.MAX_HP
+        if self.MP > self.MAX_MP:
+            self.MP = self.MAX_MP
+
+    def recalculate(self):
+        """重算所有派生属性（由 Derived 在来源变化后的第一次读取时调用）"""
+        bonus = self._bonus
+        self._STR_MOD = (self.STR - 10) // 2
+        self._DEX_MOD = (self.DEX - 10) // 2
+        self._CON_MOD = (self.CON - 10) // 2
+        self._INT_MOD = (self.INT - 10) // 2
+        self._WIS_MOD = (self.WIS - 10) // 2
+        self._CHA_MOD = (self.CHA - 10) // 2
+        self._armor_class = 10 + self._DEX_MOD + bonus.get("AC", 0)
+        # 注意：命中沿用原有规则，用完整的敏捷值而不是 DEX_MOD；
+        # 先攻（initiative.py）和逃跑检定（battle.py）用的是 DEX_MOD，两者不要混用
+        self._to_hit = self.DEX + bonus.get("to_hit", 0)
+        self._damage_bonus = self._STR_MOD + bonus.get("damage", 0)
+        self._dirty = False
 
     def info(self):
         return {
@@ -65,67 +223,166 @@ class Entity:
             "Charisma": self.CHA,
             "AC": self.AC,
             "Speed": self.Speed,
-            "Condition": self.Condition if self.Condition else ["正常"],
+            "Condition": list(self.Condition) if self.Condition else ["正常"],
         }
 
-    # TODO: 待修改
-    def attack(self, target):
-        """普通攻击，掷 d20 决定命中，伤害用骰子 + 力量"""
-        # TODO:优劣势检定
-        roll_res = roll_detail("1d20")
-        natural_roll = roll_res.rolls[0]
-        attack_roll = roll_res.total + self.DEX  # total = d20点数
+    @profiled("entity.resolve_attack")
+    def resolve_attack(self, target, advantage: int = 0, rng=random.randint, detail: bool = False) -> AttackResult:
+        """
+        结算一次普通攻击（不输出任何信息），命中时直接对目标造成伤害
+
+        规则与 attack 相同；detail=True 时额外保留伤害骰的 DiceResult 供展示，
+        两种方式消耗的随机数完全一致，相同 rng 下结果相同
+        """
+        if advantage > 0:
+            natural_roll = ADVANTAGE_DICE.roll_total(rng=rng)
+        elif advantage < 0:
+            natural_roll = DISADVANTAGE_DICE.roll_total(rng=rng)
+        else:
+            natural_roll = ATTACK_DICE.roll_total(rng=rng)
+        attack_roll = natural_roll + self.to_hit  # d20点数 + 命中加值（敏捷）
         crit = (natural_roll == 20)  # 暴击判定
 
-        target_ac = 10 + (target.DEX - 10) // 2  # 基础AC
-        if target.equipment[EquipmentSlot.ARMOR]:  # 如果目标有护甲
-            target_ac += target.equipment[EquipmentSlot.ARMOR].armor_class
+        target_ac = target.armor_class  # 含护甲与盾牌
 
-        print(f"{self.name} 掷命中骰子: d20={natural_roll} + 敏捷修正({self.DEX}) → {attack_roll} vs AC {target_ac}")
+        if not (attack_roll >= target_ac or crit):
+            return AttackResult(natural_roll, attack_roll, target_ac, False, False, 0, None)
 
-        if attack_roll >= target_ac or crit:
-            # 伤害骰子
-            if self.equipment.get(EquipmentSlot.WEAPON):
-                damage = self.equipment.get(EquipmentSlot.WEAPON).get_damage(self.STR, crit=crit)
+        # 伤害骰子：有武器用武器伤害骰，否则徒手 1d4
+        weapon = self.equipment.get(EquipmentSlot.WEAPON)
+        plan = weapon.damage_plan if weapon else UNARMED_DICE
+        if detail:
+            damage_roll = plan.roll(crit=crit, rng=rng)
+            damage = max(damage_roll.total + self.damage_bonus, 0)  # 负的伤害加值（如虚弱）最多抵消到 0
+        else:
+            damage_roll = None
+            damage = max(plan.roll_total(crit=crit, rng=rng) + self.damage_bonus, 0)
 
-            else:
-                # TODO:优劣势检定
-                dmg_res = roll_detail("1d4", crit=crit)
-                damage = dmg_res.total + (self.STR - 10)//2
-                print(f"{self.name} 徒手攻击伤害: {dmg_res.rolls} + 力量({(self.STR - 10)//2}) → {damage}")
+        target.take_damage(damage)
+        return AttackResult(natural_roll, attack_roll, target_ac, True, crit, damage, damage_roll)
+
+    # TODO: 待修改
+    @profiled("entity.attack")
+    def attack(self, target, advantage: int = 0, rng=random.randint):
+        """普通攻击，掷 d20 决定命中，伤害用骰子 + 力量
+
+        advantage > 0 为优势检定，< 0 为劣势检定
+        rng 为掷骰用的随机数函数，战斗中由 BattleManager 传入它的 RNGStream
+        """
+        if not output.enabled:
+            # 输出关闭时不需要骰子明细，也不拼接任何文本
+            return self.resolve_attack(target, advantage, rng)
+        result = self.resolve_attack(target, advantage, rng, detail=True)
 
-            target.take_damage(damage)
+        output.emit(f"{self.name} 掷命中骰子: d20={result.natural_roll} + 命中加值({self.to_hit}) → {result.attack_roll} vs AC {result.target_ac}")
 
-            if crit:
-                print(f"✨ 暴击！{self.name} 重创了 {target.name}！")
-            print(f"💥 {self.name} 命中 {target.name}，造成 {damage} 点伤害！（{target.HP}/{target.MAX_HP} HP）")
+        if result.hit:
+            weapon = self.equipment.get(EquipmentSlot.WEAPON)
+            if weapon:
+                output.emit(f"{weapon.name} 伤害: {result.damage_roll.rolls} + 伤害加值({self.damage_bonus}) → {result.damage}")
+            else:
+                output.emit(f"{self.name} 徒手攻击伤害: {result.damage_roll.rolls} + 伤害加值({self.damage_bonus}) → {result.damage}")
+
+            if result.crit:
+                output.emit(f"✨ 暴击！{self.name} 重创了 {target.name}！")
+            output.emit(f"💥 {self.name} 命中 {target.name}，造成 {result.damage} 点伤害！（{target.HP}/{target.MAX_HP} HP）")
         else:
-            print(f"❌ {self.name} 攻击未命中 {target.name}！")
+            output.emit(f"❌ {self.name} 攻击未命中 {target.name}！")
+        return result
 
     # 承受伤害
     def take_damage(self, amount: int):
+        if amount <= 0:  # 负数伤害不能变成治疗
+            return
+        was_alive = self.HP > 0
         self.HP = max(self.HP - amount, 0)
+        if self.hp_listener is not None and was_alive != (self.HP > 0):
+            self.hp_listener(self)
 
     # 治疗
     def heal(self, amount: int):
+        was_alive = self.HP > 0
         self.HP = min(self.HP + amount, self.MAX_HP)
+        if self.hp_listener is not None and was_alive != (self.HP > 0):
+            self.hp_listener(self)
 
     # 是否存活
     def is_alive(self) -> bool:
         return self.HP > 0
 
     def get_AC(self):
-        ac = 10 + (self.DEX - 10) // 2
-        if self.equipment.get(EquipmentSlot.ARMOR):
-            ac += self.equipment[EquipmentSlot.ARMOR].armor_class
-        if self.equipment.get(EquipmentSlot.SHIELD):
-            ac += self.equipment[EquipmentSlot.SHIELD].armor_class
-        return ac
-
-    def add_condition(self, condition: str):
-        if condition not in self.Condition:
-            self.Condition.append(condition)
-
-    def remove_condition(self, condition: str):
-        if condition in self.Condition:
-            self.Condition.remove(condition)
\ No newline at end of file
+        return self.armor_class
+
+    # ------------------
+    # 状态
+    # ------------------
+    @property
+    def Condition(self) -> Tuple[str, ...]:
+        """当前状态名（按登记顺序）"""
+        return CONDITIONS.names(self.condition_mask)
+
+    def add_condition(self, condition: Union[str, int], duration: int = None):
+        """
+        添加状态（状态名或位标记，未登记的名字自动登记）
+
+        duration 为持续回合数，每回合结束时减一，到期自动移除；None 表示直到 remove_condition。
+        重复添加时取较长的持续时间
+        """
+        flag = CONDITIONS.flag(condition)
+        turns = self.condition_turns
+        if duration is None:
+            if flag in turns:
+                self.condition_turns = {f: n for f, n in turns.items() if f != flag} or EMPTY
+        elif not self.condition_mask & flag or flag in turns:
+            self.condition_turns = {**turns, flag: max(duration, turns.get(flag, 0))}
+        if not self.condition_mask & flag:
+            self.condition_mask |= flag
+            modifiers = CONDITIONS.get(flag).modifiers
+            if modifiers:
+                self.set_modifier(("condition", flag), modifiers)
+
+    def remove_condition(self, condition: Union[str, int]):
+        flag = CONDITIONS.flag(condition, create=False)
+        if not self.condition_mask & flag:
+            return
+        self.condition_mask &= ~flag
+        if flag in self.condition_turns:
+            self.condition_turns = {f: n for f, n in self.condition_turns.items() if f != flag} or EMPTY
+        self.remove_modifier(("condition", flag))
+
+    def clear_conditions(self):
+        for condition in CONDITIONS.types(self.condition_mask):
+            self.remove_condition(condition.flag)
+
+    def has_condition(self, condition: Union[str, int]) -> bool:
+        return bool(self.condition_mask & CONDITIONS.flag(condition, create=False))
+
+    def has_any(self, mask: int) -> bool:
+        """是否有 mask（如 CONDITIONS.mask("中毒", "眩晕")）中的任一状态"""
+        return bool(self.condition_mask & mask)
+
+    def can_act(self) -> bool:
+        """没有眩晕等无法行动的状态"""
+        return not self.condition_mask & CONDITIONS.skip_turn_mask
+
+    def tick_conditions(self) -> List[Tuple[ConditionType, str, int]]:
+        """
+        回合结束结算：持续伤害，然后持续时间减一，到期的状态移除
+
+        返回 [(状态, "damage" / "expire", 数值)]；批量结算见 condition.tick_conditions
+        """
+        events = []
+        damaging = self.condition_mask & CONDITIONS.damage_mask
+        if damaging:
+            for condition in CONDITIONS.types(damaging):
+                self.take_damage(condition.damage)
+                events.append((condition, "damage", condition.damage))
+        turns = self.condition_turns
+        if turns:
+            remaining = {flag: n - 1 for flag, n in turns.items() if n > 1}
+            expired = [flag for flag in turns if flag not in remaining]
+            self.condition_turns = remaining or EMPTY
+            for flag in expired:
+                self.remove_condition(flag)
+                events.append((CONDITIONS.get(flag), "expire", 0))
+        return events
\ No newline at end of file
@@ -1,8 +1,11 @@
 import json
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List
 from game.Entity.character import Character
-from game.Entity.monster import Monster
+from game.Entity.monster import Monster, MonsterArchetype
+from game.Entity import serializer
 from game.Item.item import Weapon
+from game.Skill.skill import Skill
+from utils import output
 
 
 class EntityFactory:
@@ -10,7 +13,7 @@ class EntityFactory:
     Entity 工厂类
     -----------------
     负责创建 Character / Monster 对象，
-    以及 JSON 的保存和加载
+    以及存档的保存和加载（单个实体存 JSON，批量存二进制，见 game.Entity.serializer）
     """
 
     # 角色模板
@@ -39,34 +42,69 @@ class EntityFactory:
             raise ValueError(f"未知角色模板: {template_name}")
         return Character(**template)
 
+    # 怪物模板对应的共享原型（MonsterArchetype），第一次创建该怪物时构造；修改 MONSTER_TEMPLATES 后需调用 clear_archetypes
+    _ARCHETYPES: Dict[str, MonsterArchetype] = {}
+
+    @classmethod
+    def monster_archetype(cls, template_name: str) -> MonsterArchetype:
+        archetype = cls._ARCHETYPES.get(template_name)
+        if archetype is None:
+            template = cls.MONSTER_TEMPLATES.get(template_name)
+            if not template:
+                raise ValueError(f"未知怪物模板: {template_name}")
+            archetype = cls._ARCHETYPES[template_name] = MonsterArchetype(template_name, template)
+        return archetype
+
+    @classmethod
+    def clear_archetypes(cls):
+        cls._ARCHETYPES.clear()
+
     @classmethod
     def create_monster(cls, template_name: str) -> Monster:
-        """根据模板生成 Monster"""
-        template = cls.MONSTER_TEMPLATES.get(template_name)
-        if not template:
-            raise ValueError(f"未知怪物模板: {template_name}")
-        return Monster(**template)
+        """根据模板生成 Monster（共享模板数据，见 MonsterArchetype）"""
+        return cls.monster_archetype(template_name).spawn()
+
+    @classmethod
+    def create_monsters(cls, template_name: str, n: int) -> List[Monster]:
+        """批量生成同一模板的 n 个 Monster"""
+        return cls.monster_archetype(template_name).spawn_many(n)
 
     @staticmethod
     def save_entity_to_json(entity, filepath: str):
-        """保存 Character 或 Monster 到 JSON 文件"""
-        data = entity.get_info()
+        """保存 Character 或 Monster 的完整状态到 JSON 文件"""
+        data = serializer.entity_to_dict(entity)
         with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-        print(f"{entity.name} 已保存到 {filepath}")
+            json.dump(data, f, ensure_ascii=False)
+        output.emit(f"{entity.name} 已保存到 {filepath}")
 
-    @staticmethod
-    def load_entity_from_json(filepath: str):
+    @classmethod
+    def load_entity_from_json(cls, filepath: str, skills: Dict[str, Skill] = None):
         """从 JSON 文件加载实体，自动判断是 Character 还是 Monster"""
         with open(filepath, "r", encoding="utf-8") as f:
             data = json.load(f)
 
-        # 判断是角色还是怪物
-        if "occupation" in data:  # Character 特有字段
+        if "version" in data:  # save_entity_to_json 保存的完整状态
+            entity = serializer.entity_from_dict(data, skills, cls.monster_archetype)
+        # 旧格式：构造参数
+        elif "occupation" in data:  # Character 特有字段
             entity = Character(**data)
         elif "exp_reward" in data:  # Monster 特有字段
             entity = Monster(**data)
         else:
             entity = Character(**data)  # 默认当 Character
-        print(f"{entity.name} 已从 {filepath} 加载")
+        output.emit(f"{entity.name} 已从 {filepath} 加载")
         return entity
+
+    @classmethod
+    def save_entities(cls, entities, filepath: str, codec: str = None) -> int:
+        """批量保存到一个二进制存档，由模板生成的怪物只保存模板名和 HP / MP / 状态；返回保存的数量"""
+        return serializer.save_entities(entities, filepath, codec, archetypes=cls.monster_archetype)
+
+    @classmethod
+    def iter_entities(cls, filepath: str, skills: Dict[str, Skill] = None) -> Iterator:
+        """流式读取 save_entities 的存档"""
+        return serializer.iter_entities(filepath, skills, archetypes=cls.monster_archetype)
+
+    @classmethod
+    def load_entities(cls, filepath: str, skills: Dict[str, Skill] = None) -> List:
+        return list(cls.iter_entities(filepath, skills))
@@ -1,25 +1,30 @@
 # ======================
 # 怪物类
 # ======================
+from typing import Dict
 
 from game.Entity.entity import Entity
 
 
 class Monster(Entity):
+    __slots__ = ("exp_reward", "currency_reward", "item_reward", "skills", "archetype")
+
     def __init__(self, exp_reward=0, currency_reward=0, item_reward=None, **kwargs):
         super().__init__(**kwargs)
 
         # 怪物特有
         self.exp_reward = exp_reward
         self.currency_reward = currency_reward
-        self.item_reward = item_reward or []
+        self.item_reward = tuple(item_reward or ())  # 只读，同模板的怪物共享
+        self.skills = ()  # [Skill]，由敌人 AI（如 MCTSPolicy）使用；需要时整体赋值
+        self.archetype = None  # 由 MonsterArchetype.spawn 创建时指向模板
 
     # 怪物掉落
     def drop_loot(self):
         return {
             "exp": self.exp_reward,
             "currency": self.currency_reward,
-            "items": self.item_reward
+            "items": list(self.item_reward)
         }
 
     def info(self):
@@ -27,6 +32,64 @@ class Monster(Entity):
         info.update({
             "exp_reward": self.exp_reward,
             "currency_reward": self.currency_reward,
-            "item_reward": self.item_reward
+            "item_reward": list(self.item_reward)
         })
-        return info
\ No newline at end of file
+        return info
+
+
+# 每个怪物实例自己持有的可变状态，spawn 时重置；其余槽位复制原型上的值（引用同一批对象）
+_MUTABLE = {"HP", "MP", "condition_mask", "condition_turns", "hp_listener", "archetype"}
+# 由其他槽位算出的缓存，判断实例是否被改动过时不比较
+_CACHED = {"_STR_MOD", "_DEX_MOD", "_CON_MOD", "_INT_MOD", "_WIS_MOD", "_CHA_MOD",
+           "_armor_class", "_to_hit", "_damage_bonus", "_bonus", "_dirty"}
+
+
+class MonsterArchetype:
+    """
+    怪物模板（共享原型）
+
+    按模板构造一次原型，预先算好六维调整值、AC、命中、伤害加值等派生属性；
+    spawn() 不再走 __init__，而是把原型的槽位值逐个复制到新实例上，再重置 HP / MP 等可变状态。
+
+    这不是严格意义上的享元：每个实例仍然有完整的一组槽位（Entity 的 __slots__ 决定了这一点），
+    只是槽位里引用的是原型上的同一批对象。名字、掉落等不可变数据因此不会重复创建；
+    装备、修正栈、状态在实例第一次修改时才创建自己的容器（写时复制，见 Entity.modifiers /
+    equipment / condition_turns），不会影响其他实例。省下的内存主要来自这些共享的容器。
+    """
+    __slots__ = ("template_name", "template", "prototype", "_values", "_state")
+
+    def __init__(self, template_name: str, template: Dict):
+        self.template_name = template_name
+        self.template = dict(template)
+        self.prototype = prototype = Monster(**template)
+        prototype.recalculate()
+        self._values = tuple((name, getattr(prototype, name)) for name in _slot_names(Monster)
+                             if name not in _MUTABLE)
+        self._state = tuple((name, value) for name, value in self._values if name not in _CACHED)
+
+    def spawn(self) -> Monster:
+        """创建一个满 HP / MP 的实例"""
+        monster = Monster.__new__(Monster)
+        for name, value in self._values:
+            setattr(monster, name, value)
+        prototype = self.prototype
+        monster.HP = prototype.HP
+        monster.MP = prototype.MP
+        monster.condition_mask = 0
+        monster.condition_turns = prototype.condition_turns
+        monster.hp_listener = None
+        monster.archetype = self
+        return monster
+
+    def spawn_many(self, n: int):
+        spawn = self.spawn
+        return [spawn() for _ in range(n)]
+
+    def matches(self, monster: Monster) -> bool:
+        """除 HP / MP / 状态外，monster 是否仍与原型一致（存档时只需保存模板名和可变状态）"""
+        return all(getattr(monster, name) == value for name, value in self._state)
+
+
+def _slot_names(cls):
+    """cls 及其父类 __slots__ 中的所有槽位名"""
+    return [name for klass in cls.__mro__ for name in klass.__dict__.get("__slots__", ())]
@@ -0,0 +1,466 @@
+# ======================
+# 实体存档：完整、带版本号的序列化（二进制 / JSON）
+# ======================
+import copy
+import json
+import struct
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+from game.Entity.character import Character
+from game.Entity.condition import CONDITIONS
+from game.Entity.entity import EMPTY
+from game.Entity.monster import Monster, MonsterArchetype
+from game.Inventory.inventory import Inventory
+from game.Item.item import EquipmentSlot, ItemFactory
+from game.Skill.skill import Skill
+
+try:
+    import msgpack
+except ImportError:  # msgpack 为可选依赖：没有时变长部分用 JSON 编码
+    msgpack = None
+
+VERSION = 1
+
+# 按模板名查找怪物模板，通常为 EntityFactory.monster_archetype（未知模板抛 ValueError）
+ArchetypeLookup = Callable[[str], MonsterArchetype]
+
+BASE_STATS = ("STR", "DEX", "CON", "INT", "WIS", "CHA", "MAX_HP", "MAX_MP", "Speed")
+
+
+# -----------------------------
+# 实体 ↔ 字典
+# -----------------------------
+def entity_to_dict(entity) -> Dict:
+    """
+    实体的完整状态，只含 JSON 可表示的类型
+
+    六维等保存基础值（不含加值）；装备、状态的加值在读取时重新装备 / 添加状态得到，
+    修正栈中只保存其余来源（如等级成长）。物品保存在实体自己的物品表中，
+    装备、背包、掉落按下标引用，同一实体内共享的物品读取后仍是同一个对象
+    """
+    items: List[Dict] = []
+    index: Dict[int, int] = {}
+
+    def ref(item) -> int:
+        i = index.get(id(item))
+        if i is None:
+            i = index[id(item)] = len(items)
+            items.append(item.to_dict())
+        return i
+
+    data = {
+        "version": VERSION,
+        "kind": "character" if isinstance(entity, Character) else "monster",
+        "name": entity.name,
+        "gender": entity.gender,
+        "race": entity.race,
+        "level": entity.level,
+        "base": {stat: getattr(entity, "_" + stat) for stat in BASE_STATS},
+        "HP": entity.HP,
+        "MP": entity.MP,
+        "AC": entity.AC,
+        "modifiers": [[_encode_source(source), dict(modifiers)] for source, modifiers in entity.modifiers.items()
+                      if not (isinstance(source, tuple) and source[0] in ("equipment", "condition"))],
+        "conditions": [[condition.name, entity.condition_turns.get(condition.flag)]
+                       for condition in CONDITIONS.types(entity.condition_mask)],
+        "equipment": {slot.value: ref(item) for slot, item in entity.equipment.items()},
+        "skills": [_skill_to_dict(skill) for skill in entity.skills],
+    }
+    if isinstance(entity, Character):
+        inventory = entity.inventory
+        data.update({
+            "background": entity.background,
+            "occupation": entity.occupation,
+            "deputy_occupation": entity.deputy_occupation,
+            "experience": entity.experience,
+            "attribute_points": entity.attribute_points,
+            "inventory": {"capacity": inventory.capacity, "max_weight": inventory.max_weight,
+                          "slots": [[ref(slot["item"]), slot["quantity"]] for slot in inventory.items]},
+        })
+    else:
+        data.update({
+            "exp_reward": entity.exp_reward,
+            "currency_reward": entity.currency_reward,
+            "item_reward": [ref(item) for item in entity.item_reward],
+            "template": entity.archetype.template_name if entity.archetype is not None else None,
+        })
+    data["items"] = items
+    return data
+
+
+def entity_from_dict(data: Dict, skills: Dict[str, Skill] = None, archetypes: ArchetypeLookup = None):
+    """
+    由 entity_to_dict 的结果重建实体（不经过 __init__，不输出提示信息）
+
+    skills 为 {技能名: Skill}，用于找回技能的效果函数（复制一份后写回剩余次数）；
+    不在其中的技能按保存的参数重建，没有效果函数
+    """
+    version = data.get("version")
+    if version is None or version > VERSION:
+        raise ValueError(f"不支持的存档版本: {version}")
+
+    if data["kind"] == "character":
+        entity = Character.__new__(Character)
+    else:
+        entity = Monster.__new__(Monster)
+    entity.modifiers = EMPTY
+    entity._bonus = EMPTY
+    entity._dirty = True
+    entity.name = data["name"]
+    entity.gender = data["gender"]
+    entity.race = data["race"]
+    entity.level = data["level"]
+    for stat, value in data["base"].items():
+        setattr(entity, "_" + stat, value)
+    entity.AC = data["AC"]
+    entity.HP = data["HP"]
+    entity.MP = data["MP"]
+    entity.condition_mask = 0
+    entity.condition_turns = EMPTY
+    entity.hp_listener = None
+    entity.equipment = EMPTY
+
+    items = [ItemFactory.create_from_template(item) for item in data["items"]]
+    restored = [_skill_from_dict(skill, skills) for skill in data["skills"]]
+    if isinstance(entity, Character):
+        entity.background = data["background"]
+        entity.occupation = data["occupation"]
+        entity.deputy_occupation = data["deputy_occupation"]
+        entity.experience = data["experience"]
+        entity.attribute_points = data["attribute_points"]
+        entity.skills = restored
+        saved = data["inventory"]
+        entity.inventory = inventory = Inventory(saved["capacity"], saved["max_weight"])
+        inventory.items = [{"item": items[i], "quantity": quantity} for i, quantity in saved["slots"]]
+    else:
+        entity.exp_reward = data["exp_reward"]
+        entity.currency_reward = data["currency_reward"]
+        entity.item_reward = tuple(items[i] for i in data["item_reward"])
+        entity.skills = tuple(restored)
+        entity.archetype = _find_archetype(archetypes, data["template"])
+
+    # 修正栈：其余来源、装备、状态依次写回，最后恢复 HP / MP（上限变化时会被截断）
+    for source, modifiers in data["modifiers"]:
+        entity.set_modifier(_decode_source(source), modifiers)
+    if data["equipment"]:
+        entity.equipment = {EquipmentSlot(slot): items[i] for slot, i in data["equipment"].items()}
+        for item in entity.equipment.values():
+            item.apply_effects(entity)
+    for name, turns in data["conditions"]:
+        entity.add_condition(name, turns)
+    entity.HP = data["HP"]
+    entity.MP = data["MP"]
+    return entity
+
+
+def _encode_source(source):
+    """修正来源：字符串 / 整数，或由它们组成的元组（保存为列表）"""
+    if isinstance(source, (str, int)):
+        return source
+    if isinstance(source, tuple) and all(isinstance(part, (str, int)) for part in source):
+        return list(source)
+    raise TypeError(f"无法保存的修正来源: {source!r}")
+
+
+def _decode_source(source):
+    return tuple(source) if isinstance(source, list) else source
+
+
+def _skill_to_dict(skill: Skill) -> Dict:
+    return {
+        "name": skill.name,
+        "description": skill.description,
+        "mp_cost": skill.mp_cost,
+        "target_type": skill.target_type,
+        "uses_per_battle": skill.uses_per_battle,
+        "remaining_uses": skill.remaining_uses if skill.uses_per_battle is not None else None,
+        "effect_type": skill.effect_type,
+        "blocked_by": list(CONDITIONS.names(skill.blocked_by)),
+    }
+
+
+def _skill_from_dict(data: Dict, skills: Optional[Dict[str, Skill]]) -> Skill:
+    known = skills.get(data["name"]) if skills else None
+    if known is not None:
+        skill = copy.copy(known)
+    else:
+        skill = Skill(data["name"], mp_cost=data["mp_cost"], target_type=data["target_type"],
+                      description=data["description"], uses_per_battle=data["uses_per_battle"],
+                      effect_type=data["effect_type"], blocked_by=data["blocked_by"])
+    skill.reset_uses()
+    if data["remaining_uses"] is not None:
+        skill.remaining_uses = data["remaining_uses"]
+    return skill
+
+
+def _find_archetype(archetypes: Optional[ArchetypeLookup], template_name: Optional[str]):
+    if archetypes is None or template_name is None:
+        return None
+    try:
+        return archetypes(template_name)
+    except ValueError:
+        return None
+
+
+# -----------------------------
+# 二进制存档格式
+# -----------------------------
+# 文件头: MAGIC + 版本(u8) + 变长部分的编码(u8)，之后为记录流，每条记录以 kind(u8) 开头：
+#   STRING : kind 长度(u16) UTF-8              —— 字符串表的下一个编号（模板名、状态名）
+#   SPAWNED: kind 模板(u16) HP(i16) MP(i16) 状态数(u8) + 状态数 × [状态名(u16) 剩余回合(i16，-1 为永久)]
+#            —— 由模板生成、除 HP / MP / 状态外未改动过的怪物，读取时从模板 spawn
+#   ENTITY : kind 长度(u32) + entity_to_dict 的结果（按文件头的编码）
+# 大批同模板怪物每个只占 8 字节左右；其余实体保存完整状态
+MAGIC = b"AGEN"
+
+CODEC_MSGPACK = 1
+CODEC_JSON = 2
+CODECS = {"msgpack": CODEC_MSGPACK, "json": CODEC_JSON}
+
+KIND_STRING = 1
+KIND_SPAWNED = 2
+KIND_ENTITY = 3
+
+_HEADER = struct.Struct("<4sBB")
+_KIND = struct.Struct("<B")
+_STRING = struct.Struct("<H")
+_SPAWNED = struct.Struct("<HhhB")
+_CONDITION = struct.Struct("<Hh")
+_LENGTH = struct.Struct("<I")
+
+_I16_MIN, _I16_MAX = -(1 << 15), (1 << 15) - 1
+
+
+def _encoder(codec: int) -> Callable[[Dict], bytes]:
+    if codec == CODEC_MSGPACK:
+        return msgpack.Packer(use_bin_type=True).pack
+    return lambda data: json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _decoder(codec: int) -> Callable[[bytes], Dict]:
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise RuntimeError("该存档使用 msgpack 编码，需要安装 msgpack")
+        return lambda raw: msgpack.unpackb(raw, raw=False)
+    if codec == CODEC_JSON:
+        return json.loads
+    raise ValueError(f"未知的存档编码: {codec}")
+
+
+class EntityWriter:
+    """
+    流式写入实体存档
+
+    记录追加到缓冲区，超过 buffer_size 时整块写盘，存多少实体内存占用都是常数。
+    archetypes 用于判断怪物能否只按模板名保存（模板须能按名字找回同一个 MonsterArchetype），
+    为 None 时所有实体都保存完整状态。codec 为 "msgpack" / "json"，默认有 msgpack 时用 msgpack。
+
+    用法：
+        with EntityWriter("save.bin", archetypes=EntityFactory.monster_archetype) as writer:
+            writer.write_many(entities)
+    """
+
+    def __init__(self, file: Union[str, BinaryIO], codec: str = None, archetypes: ArchetypeLookup = None,
+                 buffer_size: int = 64 * 1024):
+        if codec is None:
+            codec = "msgpack" if msgpack is not None else "json"
+        if codec not in CODECS:
+            raise ValueError(f"未知的存档编码: {codec}")
+        if codec == "msgpack" and msgpack is None:
+            raise RuntimeError("msgpack 编码需要安装 msgpack")
+        self._owns_file = isinstance(file, str)
+        self.file = open(file, "wb") if self._owns_file else file
+        self.codec = CODECS[codec]
+        self.archetypes = archetypes
+        self.buffer_size = buffer_size
+        self.count = 0
+        self._encode = _encoder(self.codec)
+        self._strings: Dict[str, int] = {}
+        self._buffer = bytearray(_HEADER.pack(MAGIC, VERSION, self.codec))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _string(self, text: str) -> int:
+        i = self._strings.get(text)
+        if i is None:
+            encoded = text.encode("utf-8")
+            self._buffer += _KIND.pack(KIND_STRING) + _STRING.pack(len(encoded)) + encoded
+            i = self._strings[text] = len(self._strings)
+        return i
+
+    def write(self, entity):
+        if not self._write_spawned(entity):
+            payload = self._encode(entity_to_dict(entity))
+            self._buffer += _KIND.pack(KIND_ENTITY) + _LENGTH.pack(len(payload)) + payload
+        self.count += 1
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def write_many(self, entities: Iterable):
+        for entity in entities:
+            self.write(entity)
+
+    def _write_spawned(self, entity) -> bool:
+        """能按模板保存时写入 SPAWNED 记录并返回 True"""
+        archetype = getattr(entity, "archetype", None)
+        if archetype is None or self.archetypes is None:
+            return False
+        if _find_archetype(self.archetypes, archetype.template_name) is not archetype:
+            return False
+        if not (_I16_MIN <= entity.HP <= _I16_MAX and _I16_MIN <= entity.MP <= _I16_MAX):
+            return False
+        conditions = [(condition.name, entity.condition_turns.get(condition.flag, -1))
+                      for condition in CONDITIONS.types(entity.condition_mask)]
+        if any(not -1 <= turns <= _I16_MAX for _, turns in conditions) or not archetype.matches(entity):
+            return False
+
+        record = bytearray(_KIND.pack(KIND_SPAWNED))
+        record += _SPAWNED.pack(self._string(archetype.template_name), entity.HP, entity.MP, len(conditions))
+        for name, turns in conditions:
+            record += _CONDITION.pack(self._string(name), turns)
+        self._buffer += record
+        return True
+
+    def flush(self):
+        if self._buffer:
+            self.file.write(self._buffer)
+            self._buffer.clear()
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        if self._owns_file:
+            self.file.close()
+
+
+def iter_entities(file: Union[str, BinaryIO], skills: Dict[str, Skill] = None,
+                  archetypes: ArchetypeLookup = None) -> Iterator:
+    """
+    流式读取实体存档，逐个生成实体，不把整个文件读入内存
+
+    文件中有按模板保存的怪物时必须提供 archetypes
+    """
+    owns_file = isinstance(file, str)
+    f = open(file, "rb") if owns_file else file
+    try:
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise ValueError("不是实体存档：文件过短")
+        magic, version, codec = _HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError("不是实体存档：文件头不符")
+        if version > VERSION:
+            raise ValueError(f"不支持的存档版本: {version}")
+        decode = _decoder(codec)
+        strings: List[str] = []
+
+        while True:
+            kind = f.read(1)
+            if not kind:
+                return
+            kind = kind[0]
+            if kind == KIND_STRING:
+                length, = _STRING.unpack(_read(f, _STRING.size))
+                strings.append(_read(f, length).decode("utf-8"))
+            elif kind == KIND_SPAWNED:
+                template, hp, mp, n = _SPAWNED.unpack(_read(f, _SPAWNED.size))
+                if archetypes is None:
+                    raise ValueError("存档中有按模板保存的怪物，读取时需要提供 archetypes")
+                monster = archetypes(strings[template]).spawn()
+                for _ in range(n):
+                    name, turns = _CONDITION.unpack(_read(f, _CONDITION.size))
+                    monster.add_condition(strings[name], None if turns < 0 else turns)
+                monster.HP = hp
+                monster.MP = mp
+                yield monster
+            elif kind == KIND_ENTITY:
+                length, = _LENGTH.unpack(_read(f, _LENGTH.size))
+                yield entity_from_dict(decode(_read(f, length)), skills, archetypes)
+            else:
+                raise ValueError(f"未知的记录类型: {kind}")
+    finally:
+        if owns_file:
+            f.close()
+
+
+def _read(f: BinaryIO, n: int) -> bytes:
+    data = f.read(n)
+    if len(data) < n:
+        raise ValueError("实体存档不完整")
+    return data
+
+
+def save_entities(entities: Iterable, file: Union[str, BinaryIO], codec: str = None,
+                  archetypes: ArchetypeLookup = None) -> int:
+    """把一批实体写入一个存档，返回写入的数量"""
+    with EntityWriter(file, codec=codec, archetypes=archetypes) as writer:
+        writer.write_many(entities)
+    return writer.count
+
+
+def load_entities(file: Union[str, BinaryIO], skills: Dict[str, Skill] = None,
+                  archetypes: ArchetypeLookup = None) -> List:
+    return list(iter_entities(file, skills, archetypes))
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+    import time
+
+    from game.Entity.entityfactory import EntityFactory
+    from game.Item.item import create_preset_item
+    from utils import output
+
+    # 10000 个兽人（部分受伤 / 中毒）+ 200 个带装备、背包、技能的角色
+    with output.redirect(output.NullOutput()):
+        monsters = EntityFactory.create_monsters("兽人", 10000)
+        for i, monster in enumerate(monsters[::7]):
+            monster.HP -= i % 15
+            monster.add_condition("中毒", 3)
+        monsters[0].add_condition("虚弱")  # 有加值的状态：保存完整状态
+        characters = [EntityFactory.create_character("战士" if i % 2 else "法师") for i in range(200)]
+        for character in characters:
+            character.equip(create_preset_item("铁剑"))
+            character.equip(create_preset_item("皮甲"))
+            character.add_item(create_preset_item("小生命药水"), 3)
+            character.learn_skill(Skill("火球", mp_cost=5, uses_per_battle=3, blocked_by=("眩晕",)))
+            character.gain_experience(150)
+    entities = monsters + characters
+    expected = [entity_to_dict(entity) for entity in entities]
+    directory = tempfile.gettempdir()
+
+    def bench(name, save, load, path):
+        start = time.perf_counter()
+        save(path)
+        saved = time.perf_counter() - start
+        start = time.perf_counter()
+        loaded = load(path)
+        elapsed = time.perf_counter() - start
+        assert [entity_to_dict(entity) for entity in loaded] == expected
+        print(f"{name:<22}{os.path.getsize(path) / 1024:>10.1f} KB  保存 {saved:.3f}s  读取 {elapsed:.3f}s")
+        os.remove(path)
+
+    def save_json(path):  # 原来的 JSON 方式：完整字典、缩进
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump([entity_to_dict(entity) for entity in entities], f, ensure_ascii=False, indent=4)
+
+    def load_json(path):
+        with open(path, encoding="utf-8") as f:
+            return [entity_from_dict(data, archetypes=EntityFactory.monster_archetype) for data in json.load(f)]
+
+    print(f"{len(monsters)} 个怪物 + {len(characters)} 个角色")
+    with output.redirect(output.NullOutput()):
+        bench("JSON（缩进）", save_json, load_json, os.path.join(directory, "entities.json"))
+        bench("二进制（json，不用模板）", lambda path: save_entities(entities, path, "json"),
+              lambda path: load_entities(path, archetypes=EntityFactory.monster_archetype),
+              os.path.join(directory, "entities.full.bin"))
+        for codec in ["json"] + (["msgpack"] if msgpack is not None else []):
+            bench(f"二进制（{codec}）",
+                  lambda path: save_entities(entities, path, codec, EntityFactory.monster_archetype),
+                  lambda path: load_entities(path, archetypes=EntityFactory.monster_archetype),
+                  os.path.join(directory, f"entities.{codec}.bin"))
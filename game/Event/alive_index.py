@@ -0,0 +1,104 @@
+# ======================
+# 增量维护的存活单位索引
+# ======================
+from typing import Iterable
+
+
+class AliveIndex:
+    """
+    一方存活单位的索引
+
+    内部是“列表 + {id: 下标}”：
+    - add / discard 为 O(1)（删除时把末尾元素换到被删位置）
+    - len / bool / in 为 O(1)，可直接判断“这一方是否全灭”
+    - 支持 len 和下标访问，rng.choice(index) 即 O(1) 随机选取目标
+
+    注意：删除会打乱顺序，需要稳定顺序（如手动模式的目标列表）时请另行按原顺序过滤。
+    BattleManager 通过 Entity.hp_listener 在单位生死变化时自动调用 update。
+    """
+    __slots__ = ("_units", "_pos")
+
+    def __init__(self, units: Iterable = ()):
+        self._units = []
+        self._pos = {}
+        for unit in units:
+            if unit.HP > 0:
+                self.add(unit)
+
+    def __len__(self):
+        return len(self._units)
+
+    def __bool__(self):
+        return bool(self._units)
+
+    def __contains__(self, unit):
+        return id(unit) in self._pos
+
+    def __getitem__(self, i):
+        return self._units[i]
+
+    def __iter__(self):
+        # 返回快照，迭代过程中可以安全地增删
+        return iter(list(self._units))
+
+    def __repr__(self):
+        return f"AliveIndex([{', '.join(u.name for u in self._units)}])"
+
+    def add(self, unit):
+        if id(unit) not in self._pos:
+            self._pos[id(unit)] = len(self._units)
+            self._units.append(unit)
+
+    def discard(self, unit):
+        i = self._pos.pop(id(unit), None)
+        if i is None:
+            return
+        last = self._units.pop()
+        if last is not unit:
+            self._units[i] = last
+            self._pos[id(last)] = i
+
+    def update(self, unit):
+        """按单位当前 HP 加入或移除"""
+        if unit.HP > 0:
+            self.add(unit)
+        else:
+            self.discard(unit)
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    from game.Event.battle import BattleManager
+    from game.Simulation.engine import HeadlessBattle
+    from game.Simulation.montecarlo import create_units
+    from utils import output
+    from utils.logger import OFF
+
+    # 1. 目标选择：每次重建存活列表 vs 增量索引
+    units, _ = create_units(["战士"] * 1000, [])
+    for unit in units[::3]:
+        unit.HP = 0
+    rng = random.Random(1)
+    start = time.perf_counter()
+    for _ in range(10000):
+        rng.choice([u for u in units if u.is_alive()])
+    rebuild = time.perf_counter() - start
+    index = AliveIndex(units)
+    start = time.perf_counter()
+    for _ in range(10000):
+        rng.choice(index)
+    print(f"1000 个单位中选目标 1 万次: 重建列表 {rebuild:.3f}s，AliveIndex {time.perf_counter() - start:.4f}s")
+
+    # 2. 500 vs 500 整场战斗
+    for name, run in [
+        ("BattleManager", lambda p, e: BattleManager(p, e, rng=1, log_level=OFF).start_battle()),
+        ("HeadlessBattle", lambda p, e: HeadlessBattle(p, e, rng=1).run()),
+    ]:
+        players, enemies = create_units(["战士"] * 250 + ["法师"] * 250, ["兽人"] * 500)
+        start = time.perf_counter()
+        with output.redirect(output.NullOutput()):
+            run(players, enemies)
+        alive = sum(p.is_alive() for p in players), sum(e.is_alive() for e in enemies)
+        print(f"500 vs 500 {name}: {time.perf_counter() - start:.2f}s，剩余 {alive[0]} vs {alive[1]}")
@@ -0,0 +1,323 @@
+# ======================
+# 异步战斗驱动：玩家行动来自可等待的行动提供者
+# ======================
+import asyncio
+import math
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from game.Event.battle import BattleManager
+from game.Item.item import Consumable
+from utils.logger import INFO
+from utils.profiler import profiled
+
+
+@dataclass
+class BattleAction:
+    """
+    玩家的一次行动
+
+    下标均相对于决策时刻的列表：target 对应存活敌人列表，
+    item 对应 player.inventory.list_items()，skill 对应 player.skills
+    """
+    kind: str = "attack"          # "attack" / "item" / "skill" / "escape"
+    target: int = 0               # 攻击 / 单体技能的目标下标
+    item: int = 0                 # 道具下标
+    skill: int = 0                # 技能下标
+    round: Optional[int] = None   # 行动针对的回合，None 表示不限；用于丢弃超时后才到达的旧行动
+    player: Optional[int] = None  # 行动针对的玩家（单位编号，见 BattleManager.units），None 表示不限
+
+
+class ActionProvider:
+    """
+    行动提供者基类
+
+    子类实现 choose，返回（或在等待输入后返回）一个 BattleAction；
+    ready 在 choose 之前等待，不计入回合超时（例如等待网络连接可写）
+    """
+
+    async def ready(self, battle: "AsyncBattleManager", player):
+        pass
+
+    async def choose(self, battle: "AsyncBattleManager", player, alive_enemies: List) -> BattleAction:
+        raise NotImplementedError
+
+
+class AutoActionProvider(ActionProvider):
+    """
+    AI 策略：与 auto 模式相同，用战斗的随机数流攻击随机存活敌人
+
+    与 BattleManager.player_action 一样从存活索引中选取目标，再换算成 alive_enemies 中的下标，
+    因此相同种子下异步战斗与同步 auto 战斗的随机数序列和结果完全一致
+    """
+
+    async def choose(self, battle, player, alive_enemies):
+        target = battle.choose_target(battle.alive_enemies)
+        return BattleAction("attack", target=alive_enemies.index(target))
+
+
+class ConsoleActionProvider(ActionProvider):
+    """
+    控制台输入
+
+    input() 放到线程池中执行，不阻塞事件循环；同一时刻最好只有一场战斗使用控制台
+    """
+
+    async def choose(self, battle, player, alive_enemies):
+        battle.log_msg(f"\n{player.name} 的回合！")
+        for i, e in enumerate(alive_enemies):
+            battle.log_msg(f"{i + 1}. {e.name} (HP {e.HP}/{e.MAX_HP})")
+        battle.log_msg("\n动作选择：1. 攻击  2. 使用道具  3. 使用技能  4. 逃跑")
+        choice = await asyncio.to_thread(input, "请选择动作编号: ")
+        while choice not in ("1", "2", "3", "4"):
+            battle.log_msg("无效选择，请重新输入。")
+            choice = await asyncio.to_thread(input, "请选择动作编号: ")
+        if choice == "1":
+            return BattleAction("attack", target=await self._ask_index("选择攻击目标编号: "))
+        if choice == "2":
+            for j, (item, quantity) in enumerate(player.inventory.list_items()):
+                battle.log_msg(f"{j + 1}. {item.name} * {quantity}")
+            return BattleAction("item", item=await self._ask_index("选择道具编号使用: "))
+        if choice == "3":
+            for i, sk in enumerate(player.skills):
+                uses_left = sk.remaining_uses if not math.isinf(sk.remaining_uses) else "∞"
+                battle.log_msg(f"{i + 1}. {sk.name} - {sk.description} (剩余次数 {uses_left})")
+            skill = await self._ask_index("选择技能编号: ")
+            target = 0
+            if 0 <= skill < len(player.skills) and player.skills[skill].target_type == "single":
+                target = await self._ask_index("选择技能目标编号: ")
+            return BattleAction("skill", target=target, skill=skill)
+        return BattleAction("escape")
+
+    @staticmethod
+    async def _ask_index(prompt: str) -> int:
+        text = await asyncio.to_thread(input, prompt)
+        return int(text) - 1 if text.strip().lstrip("-").isdigit() else -1
+
+
+class QueueActionProvider(ActionProvider):
+    """
+    基于队列的行动提供者，作为网络客户端的替身
+
+    轮到玩家时，把 (战斗, 玩家, 存活敌人) 放入 prompts 通知客户端；
+    客户端调用 submit(action) 提交行动。round 与当前回合不符、或 player 不是当前玩家的行动
+    （例如某玩家超时后才到达的行动）会被丢弃，不会被用到同一回合的下一个玩家身上。
+    """
+
+    def __init__(self):
+        self.actions: asyncio.Queue = asyncio.Queue()
+        self.prompts: asyncio.Queue = asyncio.Queue()
+
+    def submit(self, action: BattleAction):
+        self.actions.put_nowait(action)
+
+    async def choose(self, battle, player, alive_enemies):
+        self.prompts.put_nowait((battle, player, list(alive_enemies)))
+        player_id = battle.unit_id(player)
+        while True:
+            action = await self.actions.get()
+            if action.round is not None and action.round != battle.round_num:
+                continue
+            if action.player is not None and action.player != player_id:
+                continue
+            return action
+
+
+class AsyncBattleManager(BattleManager):
+    """
+    异步战斗管理器
+
+    规则与 BattleManager 相同，但玩家的行动通过 await provider.choose(...) 获得，
+    等待期间事件循环可以推进其他战斗，因此一个进程可以同时承载成百上千场战斗。
+
+    参数：
+    - providers: {玩家: ActionProvider}，未指定的玩家使用 default_provider
+    - default_provider: 默认行动提供者，None 表示 AutoActionProvider
+    - turn_timeout: 每个玩家回合的等待上限（秒），超时改用 fallback 的行动
+    - fallback: 超时或行动无效时使用的提供者，None 表示 AutoActionProvider
+    - 其余参数同 BattleManager（initiative=True 时按先攻时间轴行动，enemy_policy 为敌人策略）
+    """
+
+    def __init__(self, players, enemies, providers: Dict = None, default_provider: ActionProvider = None,
+                 turn_timeout: float = None, fallback: ActionProvider = None, log_callback=None, rng=None,
+                 sink=None, initiative=False, enemy_policy=None, log_level=INFO, logger=None):
+        super().__init__(players, enemies, mode="async", log_callback=log_callback, rng=rng, sink=sink,
+                         initiative=initiative, enemy_policy=enemy_policy, log_level=log_level, logger=logger)
+        self.providers = dict(providers or {})
+        self.default_provider = default_provider or AutoActionProvider()
+        self.turn_timeout = turn_timeout
+        self.fallback = fallback or AutoActionProvider()
+        self._auto = self.fallback if isinstance(self.fallback, AutoActionProvider) else AutoActionProvider()
+        self.timeouts = 0  # 超时次数（统计用）
+
+    # 战斗开始
+    @profiled("battle.start")
+    async def start_battle(self):
+        try:
+            self.log_start()
+
+            if self.initiative:
+                await self.run_timeline()
+            while self.alive_players and self.alive_enemies:
+                self.logger.info("round", "\n--- 回合 {round} ---", round=self.round_num)
+                await self.player_turn()
+                self.enemy_turn()
+                self.end_round()
+                self.print_status()
+                self.round_num += 1
+                # 每回合让出一次事件循环，避免纯 AI 的战斗独占循环
+                await asyncio.sleep(0)
+
+            self.log_result()
+            self.calculate_reward()
+        finally:
+            self.release_units()  # 包括会话被取消的情况
+
+    async def run_timeline(self):
+        """按先攻时间轴进行战斗（顺序同 BattleManager.timeline），玩家行动通过行动提供者获得"""
+        turns = self.timeline()
+        escaped = None
+        try:
+            while True:
+                player = turns.send(escaped)
+                escaped = await self.take_action(player)
+                await asyncio.sleep(0)
+        except StopIteration:
+            pass
+
+    # ------------------
+    # 玩家回合
+    # ------------------
+    @profiled("battle.player_turn")
+    async def player_turn(self):
+        escaped_players = []
+        for player in self.all_alive(self.players):
+            if not self.alive_enemies:
+                break
+            if self.skip_turn(player):
+                continue
+            if await self.take_action(player):
+                escaped_players.append(player)
+
+        # 回合结束后移除逃跑玩家
+        for player in escaped_players:
+            self.remove_player(player)
+
+    async def take_action(self, player) -> bool:
+        """
+        单个玩家的一次行动：请求、执行，返回是否成功逃跑
+
+        行动无效时改用 fallback；fallback 的行动也无效时改为自动攻击（存活敌人非空时总是有效），
+        不会悄悄丢掉玩家的回合
+        """
+        alive_enemies = self.all_alive(self.enemies)  # 行动中的下标按原顺序
+        action = await self.request_action(player, alive_enemies)
+        done = self.perform(player, action, alive_enemies)
+        if done is None:
+            self.logger.warning("invalid_action", "⚠️ {name} 的行动无效，改为默认行动", name=player.name)
+            done = self.perform(player, await self.fallback.choose(self, player, alive_enemies), alive_enemies)
+        if done is None:
+            self.logger.warning("invalid_fallback", "⚠️ {name} 的默认行动也无效，改为自动攻击", name=player.name)
+            done = self.perform(player, await self._auto.choose(self, player, alive_enemies), alive_enemies)
+        return done == "escaped"
+
+    @profiled("battle.wait_action")
+    async def request_action(self, player, alive_enemies) -> BattleAction:
+        """向玩家的行动提供者请求行动，超时则使用 fallback；provider.ready 的等待不计入超时"""
+        provider = self.providers.get(player, self.default_provider)
+        await provider.ready(self, player)
+        try:
+            return await asyncio.wait_for(provider.choose(self, player, alive_enemies), self.turn_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.logger.warning("timeout", "⏰ {name} 行动超时，自动行动", name=player.name)
+            return await self.fallback.choose(self, player, alive_enemies)
+
+    def perform(self, player, action: BattleAction, alive_enemies):
+        """
+        执行一次行动
+
+        返回 True 表示行动完成，"escaped" 表示逃跑成功，None 表示行动无效（未消耗回合）
+        """
+        if action.kind == "attack":
+            if not 0 <= action.target < len(alive_enemies):
+                return None
+            target = alive_enemies[action.target]
+            self.emit_attack(player, target, player.attack(target, rng=self.rng))
+            return True
+
+        if action.kind == "item":
+            items_list = player.inventory.list_items()
+            if not 0 <= action.item < len(items_list):
+                return None
+            item = items_list[action.item][0]
+            if not isinstance(item, Consumable):
+                return None
+            player.use_item(item)
+            self.logger.info("item", "{name} 使用了 {item}", name=player.name, item=item.name)
+            return True
+
+        if action.kind == "skill":
+            if not 0 <= action.skill < len(player.skills):
+                return None
+            skill = player.skills[action.skill]
+            if skill.remaining_uses == 0:
+                self.logger.info("skill_exhausted", "{name} 尝试使用 {skill}，但是已经没有使用次数了！",
+                                 name=player.name, skill=skill.name)
+                return None
+            if skill.target_type == "single":
+                if not 0 <= action.target < len(alive_enemies):
+                    return None
+                player.use_skill(skill, alive_enemies[action.target], rng=self.rng)
+            else:
+                player.use_skill(skill, alive_enemies, rng=self.rng)
+            return True
+
+        if action.kind == "escape":
+            return "escaped" if self.attempt_escape(player, alive_enemies) else True
+
+        return None
+
+
+async def run_battles(battles: Iterable[AsyncBattleManager]) -> List[AsyncBattleManager]:
+    """在当前事件循环中并发进行多场战斗"""
+    battles = list(battles)
+    await asyncio.gather(*(battle.start_battle() for battle in battles))
+    return battles
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    from game.Simulation.montecarlo import create_units
+    from utils import output
+    from utils.logger import OFF
+
+    async def fake_client(provider: QueueActionProvider, rng: random.Random):
+        """模拟网络客户端：收到提示后随机延迟再提交攻击，偶尔慢到超时"""
+        while True:
+            battle, player, alive_enemies = await provider.prompts.get()
+            await asyncio.sleep(rng.choice([0.001, 0.002, 0.005, 0.2]))
+            provider.submit(BattleAction("attack", target=rng.randrange(len(alive_enemies)), round=battle.round_num,
+                                         player=battle.unit_id(player)))
+
+    async def main(count: int):
+        rng = random.Random(1)
+        battles, clients = [], []
+        for seed in range(count):
+            players, enemies = create_units(["战士", "法师"], ["哥布林", "兽人"])
+            provider = QueueActionProvider()
+            clients.append(asyncio.create_task(fake_client(provider, rng)))
+            battles.append(AsyncBattleManager(players, enemies, default_provider=provider, turn_timeout=0.05,
+                                              log_level=OFF, rng=seed))
+        start = time.perf_counter()
+        with output.redirect(output.NullOutput()):
+            await run_battles(battles)
+        for client in clients:
+            client.cancel()
+        wins = sum(1 for b in battles if b.alive_players)
+        print(f"{count} 场并发战斗: {time.perf_counter() - start:.2f}s，玩家胜 {wins} 场，"
+              f"超时自动行动 {sum(b.timeouts for b in battles)} 次")
+
+    asyncio.run(main(300))
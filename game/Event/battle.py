@@ -1,5 +1,4 @@
 import math
-import random
 from typing import List
 
 from game.Entity.monster import Monster
@@ -7,7 +6,15 @@ from game.Event.event import Event
 from game.Item.item import Consumable
 from game.Map.map import Tile
 from game.Team.team import Team
-from utils.dice import roll_detail
+from utils import output
+from utils.logger import INFO, BattleLogger, CallbackSink, ConsoleSink
+from utils.profiler import profiled
+from utils.rng import RNGStream
+from game.Entity.condition import CONDITIONS, tick_conditions
+from game.Entity.entity import ATTACK_DICE
+from game.Event.alive_index import AliveIndex
+from game.Event.initiative import InitiativeScheduler
+from game.Simulation.engine import CombatEvent
 
 class BattleEvent(Event):
     def __init__(self, monsters: List[Monster], description: str = ""):
@@ -16,7 +23,7 @@ class BattleEvent(Event):
 
     def trigger(self, team: Team, tile: Tile):
         if self.triggered:
-            print("⚠️ 战斗事件已解决，无法再次触发。")
+            output.emit("⚠️ 战斗事件已解决，无法再次触发。")
             return
 
         battle = BattleManager(
@@ -27,11 +34,11 @@ class BattleEvent(Event):
         battle.start_battle()
 
         if not team.is_alive():
-            print("💀 游戏结束")
+            output.emit("💀 游戏结束")
         else:
             reward = battle.reward or {}
 
-            print(f"🎉 战斗胜利！奖励: {reward}")
+            output.emit(f"🎉 战斗胜利！奖励: {reward}")
 
             # 取得经验
             exp = reward.get("exp", 0)
@@ -51,7 +58,7 @@ class BattleEvent(Event):
             for item in items:
                 tile.inventory.add(item)
             if items:
-                print(f"掉落物已放入当前格子背包: {[i.name for i in items]}")
+                output.emit(f"掉落物已放入当前格子背包: {[i.name for i in items]}")
 
             # -----------------------------
             # 玩家选择拾取
@@ -59,66 +66,119 @@ class BattleEvent(Event):
             for slot in list(tile.inventory.items):
                 item = slot["item"]
                 quantity = slot["quantity"]
-                choice = input(f"是否拾取 {item.name}? (y/n): ")
+                choice = output.prompt(f"是否拾取 {item.name}? (y/n): ")
                 if choice.lower() != "y":
                     continue
 
                 allocated = False
                 while not allocated:
-                    print(f"\n选择物品 {item.name} 放入哪个背包：")
+                    output.emit(f"\n选择物品 {item.name} 放入哪个背包：")
                     for i, member in enumerate(team.members):
-                        print(f"{i}. {member.name} (已有 {len(member.inventory.items)} 件物品)")
-                    print("t. 放入队伍背包")
+                        output.emit(f"{i}. {member.name} (已有 {len(member.inventory.items)} 件物品)")
+                    output.emit("t. 放入队伍背包")
 
-                    target = input("请输入编号或 t：")
+                    target = output.prompt("请输入编号或 t：")
                     if target.lower() == "t":
                         success, msg = team.inventory.add(item)
                         if success:
-                            print(f"{item.name} 放入队伍背包")
+                            output.emit(f"{item.name} 放入队伍背包")
                             tile.inventory.remove(item)
                             allocated = True
                         else:
-                            print(f"失败: {msg}")
+                            output.emit(f"失败: {msg}")
                     elif target.isdigit():
                         idx = int(target)
                         if 0 <= idx < len(team.members):
                             success, msg = team.members[idx].inventory.add(item)
                             if success:
-                                print(f"{item.name} 放入 {team.members[idx].name} 背包")
+                                output.emit(f"{item.name} 放入 {team.members[idx].name} 背包")
                                 tile.inventory.remove(item)
                                 allocated = True
                             else:
-                                print(f"失败: {msg}")
+                                output.emit(f"失败: {msg}")
                         else:
-                            print("无效编号")
+                            output.emit("无效编号")
                     else:
-                        print("输入无效，请重新选择")
+                        output.emit("输入无效，请重新选择")
 
             self.triggered = True
 
 
 class BattleManager:
-    def __init__(self, players, enemies, mode="auto", log_callback=None):
+    def __init__(self, players, enemies, mode="auto", log_callback=None, rng=None, sink=None, initiative=False,
+                 enemy_policy=None, log_level=INFO, logger=None):
         self.players = players
         self.enemies = enemies
         self.reward = {}
         self.round_num = 1
         self.mode = mode  # auto / manual
         self.log_callback = log_callback  # 用于前端或界面接收日志
-        self.log = []  # 保存战斗日志
+        # 结构化日志：低于 log_level 的记录直接丢弃，文本在接收方读取时才格式化；
+        # 最近的记录保存在 self.logger.buffer 环形缓冲区中。可传入自定义的 BattleLogger（如加上 AsyncFileSink）
+        if logger is None:
+            log_sink = CallbackSink(log_callback, log_level) if log_callback else ConsoleSink(log_level)
+            logger = BattleLogger(sinks=[log_sink], buffer_level=log_level)
+        self.logger = logger
+        # 随机数流：战斗中所有掷骰和目标选择都从这里取，相同种子可逐位重放
+        # 可传入 RNGStream / BlockRNG 或整数种子，None 表示随机种子（可从 self.rng.seed 取回）
+        self.rng = RNGStream(rng) if rng is None or isinstance(rng, int) else rng
+        # 结构化事件接收函数 sink(CombatEvent)，例如 replay.ReplayWriter；单位编号为 玩家 + 敌人 的初始顺序
+        self.sink = sink
+        self.units = list(players) + list(enemies)  # 全部参战单位的初始顺序（单位编号）
+        self.num_players = len(players)
+        self._unit_index = {id(u): i for i, u in enumerate(self.units)}
+        # initiative=True 时按速度与先攻的时间轴行动（见 InitiativeScheduler），否则玩家全体先于敌人全体
+        self.initiative = initiative
+        self.scheduler = None
+        # 敌人策略：提供 act(battle, enemy) 的对象（如 game.AI.mcts.MCTSPolicy），None 表示攻击随机存活玩家
+        self.enemy_policy = enemy_policy
+        # 存活单位索引：单位生死变化时由 Entity.hp_listener 增量更新，判断胜负与选目标都是 O(1)
+        self.alive_players = AliveIndex(players)
+        self.alive_enemies = AliveIndex(enemies)
+        self._player_ids = {id(p) for p in players}
+        for unit in list(players) + list(enemies):
+            unit.hp_listener = self._on_life_change
+
+    def _on_life_change(self, unit):
+        """单位死亡或复活时更新对应一方的存活索引"""
+        if id(unit) in self._player_ids:
+            if unit in self.players:  # 已逃跑的玩家不再回到战斗
+                self.alive_players.update(unit)
+        else:
+            self.alive_enemies.update(unit)
+
+    def remove_player(self, player):
+        """玩家离开战斗（逃跑）"""
+        if player in self.players:
+            self.players.remove(player)
+        self.alive_players.discard(player)
+
+    def unit_id(self, unit) -> int:
+        """单位编号：玩家 + 敌人 的初始顺序，与 CombatEvent、服务器协议中的编号一致"""
+        return self._unit_index[id(unit)]
+
+    def emit_attack(self, attacker, target, result):
+        """把一次普通攻击的结果发送给 sink"""
+        if self.sink is not None:
+            self.sink(CombatEvent(self.round_num, self._unit_index[id(attacker)], self._unit_index[id(target)],
+                                  result.natural_roll, result.hit, result.crit, result.damage, target.HP))
 
     # 日志输出
+    @profiled("battle.log")
     def log_msg(self, msg):
-        self.log.append(msg)
-        if self.log_callback:
-            self.log_callback(msg)
-        else:
-            print(msg)
+        """记录一条已格式化的文本（手动模式的菜单等）；战斗流程中的日志请用 self.logger 传模板和字段"""
+        self.logger.log(INFO, "message", msg)
+
+    @property
+    def log(self):
+        """环形缓冲区中最近的战斗日志文本"""
+        return self.logger.messages()
 
     # 存活单位
     def all_alive(self, units):
         return [u for u in units if u.is_alive()]
 
+    @profiled("battle.reward")
     def calculate_reward(self):
         """战斗结束时统计奖励"""
         total_exp = 0
@@ -127,7 +187,8 @@ class BattleManager:
         for enemy in self.enemies:
             if not enemy.is_alive() and hasattr(enemy, "drop_loot"):
                 loot = enemy.drop_loot()
-                print(loot)
+                if output.enabled:
+                    output.emit(f"{enemy.name} 掉落: {loot}")
                 total_exp += loot["exp"]
                 total_currency += loot["currency"]
                 item = loot["items"]
@@ -140,198 +201,345 @@ class BattleManager:
         })
 
     # 战斗开始
+    @profiled("battle.start")
     def start_battle(self):
-        self.log_msg(f"\n战斗开始！玩家 {', '.join(p.name for p in self.players)} VS 敌人 {', '.join(e.name for e in self.enemies)}")
+        try:
+            self.log_start()
+
+            if self.initiative:
+                self.run_timeline()
+            while self.alive_players and self.alive_enemies:
+                # TODO:切换自动/手动模式
+                self.logger.info("round", "\n--- 回合 {round} ---", round=self.round_num)
+                self.player_turn()
+                self.enemy_turn()
+                self.end_round()
+                self.print_status()
+                self.round_num += 1
+
+            self.log_result()
+            self.calculate_reward()
+        finally:
+            self.release_units()
+
+    def release_units(self):
+        """
+        战斗结束（或异常中断）后解除单位上的 hp_listener
+
+        否则每个单位都通过绑定方法引用着已结束的 BattleManager（日志缓冲、存活索引和所有单位），
+        直到下一场战斗覆盖它为止；已被其他战斗接管的单位不受影响
+        """
+        for unit in self.units:
+            if unit.hp_listener == self._on_life_change:
+                unit.hp_listener = None
 
-        while self.all_alive(self.players) and self.all_alive(self.enemies):
-            # TODO:切换自动/手动模式
-            self.log_msg(f"\n--- 回合 {self.round_num} ---")
-            self.player_turn()
-            self.enemy_turn()
-            self.print_status()
-            self.round_num += 1
-
-        if self.all_alive(self.players):
-            self.log_msg("\n玩家胜利！")
+    # ------------------
+    # 状态
+    # ------------------
+    def end_round(self):
+        """回合结束：统一结算所有参战单位的状态（持续伤害、持续时间）"""
+        tick_conditions(self.players + self.enemies, self._log_condition)
+
+    def _log_condition(self, unit, condition, event, value):
+        if event == "damage":
+            self.logger.info("condition", "☠️ {name} 受到{condition}伤害 {damage} 点（{hp}/{max_hp} HP）",
+                             name=unit.name, condition=condition.name, damage=value, hp=unit.HP, max_hp=unit.MAX_HP)
+        else:
+            self.logger.info("condition", "{name} 的{condition}状态结束", name=unit.name, condition=condition.name)
+
+    def skip_turn(self, unit) -> bool:
+        """单位有眩晕等无法行动的状态时跳过本次行动"""
+        if unit.condition_mask & CONDITIONS.skip_turn_mask:
+            self.logger.info("skip", "💫 {name} 处于{conditions}状态，无法行动", name=unit.name,
+                             conditions="、".join(CONDITIONS.names(unit.condition_mask & CONDITIONS.skip_turn_mask)))
+            return True
+        return False
+
+    def log_start(self):
+        if self.logger.enabled_for(INFO):
+            self.logger.info("start", "\n战斗开始！玩家 {players} VS 敌人 {enemies}",
+                             players=", ".join(p.name for p in self.players),
+                             enemies=", ".join(e.name for e in self.enemies))
+
+    def log_result(self):
+        if self.alive_players:
+            self.logger.info("victory", "\n玩家胜利！", winner="players")
         else:
-            self.log_msg("\n敌人胜利！")
+            self.logger.info("victory", "\n敌人胜利！", winner="enemies")
 
-        self.calculate_reward()
+    # ------------------
+    # 先攻时间轴
+    # ------------------
+    def run_timeline(self):
+        """按先攻时间轴进行战斗，直到一方全灭；每次行动 O(log n) 取出下一个行动者"""
+        turns = self.timeline()
+        escaped = None
+        try:
+            while True:
+                player = turns.send(escaped)
+                escaped = self.player_action(player, self.targets_for_player())
+        except StopIteration:
+            pass
+
+    def timeline(self):
+        """
+        先攻时间轴的流程（生成器）：敌人行动、回合结算都在这里完成，
+        轮到玩家时 yield 该玩家，调用方执行玩家行动后 send 回是否成功逃跑。
+        run_timeline 和 AsyncBattleManager 共用同一套行动顺序
+        """
+        self.scheduler = scheduler = InitiativeScheduler(self.players + self.enemies, rng=self.rng)
+        current = None
+        order = sorted(self.players + self.enemies, key=lambda u: -scheduler.initiative[id(u)])
+        if self.logger.enabled_for(INFO):
+            self.logger.info("initiative", "先攻顺序：{order}",
+                             order=" > ".join(f"{u.name}({scheduler.initiative[id(u)]})" for u in order))
+
+        while self.alive_players and self.alive_enemies:
+            time, unit = scheduler.next()
+            if not unit.is_alive():
+                scheduler.remove(unit)
+                continue
+
+            round_num = scheduler.round_of(time)
+            if round_num != current:
+                if current is not None:
+                    self.end_round()
+                    self.print_status()
+                    if not unit.is_alive():  # 死于回合结束时的状态伤害
+                        continue
+                current = self.round_num = round_num
+                self.logger.info("round", "\n--- 回合 {round} ---", round=self.round_num)
+
+            if self.skip_turn(unit):
+                continue
+            if id(unit) in self._player_ids:
+                if (yield unit):
+                    self.remove_player(unit)
+                    scheduler.remove(unit)
+            else:
+                self.enemy_action(unit, self.alive_players)
+
+        if current is not None:
+            self.end_round()
+            self.print_status()
+            self.round_num += 1
 
     # ------------------
     # 玩家回合
     # ------------------
+    @profiled("battle.player_turn")
     def player_turn(self):
         escaped_players = []
         for player in self.all_alive(self.players):
-            alive_enemies = self.all_alive(self.enemies)
-            if not alive_enemies:
+            if not self.alive_enemies:
                 break
-
-            if self.mode == "auto":
-                target = random.choice(alive_enemies)
-                player.attack(target)
+            if self.skip_turn(player):
                 continue
+            if self.player_action(player, self.targets_for_player()):
+                escaped_players.append(player)
+
+        # 回合结束后移除逃跑玩家
+        for player in escaped_players:
+            self.remove_player(player)
+
+    def targets_for_player(self):
+        """
+        玩家可选的目标：auto 模式直接用存活索引（O(1) 随机选取），
+        手动模式按原顺序列出，便于玩家按编号选择
+        """
+        if self.mode == "auto":
+            return self.alive_enemies
+        return self.all_alive(self.enemies)
+
+    def player_action(self, player, alive_enemies) -> bool:
+        """单个玩家的一次行动，返回是否成功逃跑"""
+        if self.mode == "auto":
+            target = self.choose_target(alive_enemies)
+            self.emit_attack(player, target, player.attack(target, rng=self.rng))
+            return False
+
+        # 手动回合
+        escaped = False
+        action_done = False
+        while not action_done:
+            self.log_msg(f"\n{player.name} 的回合！")
+
+            # 显示敌人
+            self.log_msg("敌人列表：")
+            for i, e in enumerate(alive_enemies):
+                self.log_msg(f"{i + 1}. {e.name} (HP {e.HP}/{e.MAX_HP})")
+
+
+            # 显示背包道具
+            self.log_msg("\n背包道具：")
+            items_list = player.inventory.list_items() # [(item,quantity)]
+            if items_list:
+                for j, items in enumerate(items_list):
+                    item, quantity = items
+                    self.log_msg(f"{j + 1}. {item.name} * {quantity}")
+            else:
+                self.log_msg("无可用道具")
+
+            # 动作选择
+            self.log_msg("\n动作选择：1. 攻击  2. 使用道具  3. 使用技能  4. 逃跑")
+            choice = output.prompt("请选择动作编号: ")
+
+            # ----------------------- 攻击 -----------------------
+            if choice == "1":
+                while True:
+                    target_choice = output.prompt("选择攻击目标编号: ")
+                    try:
+                        idx = int(target_choice) - 1
+                        if 0 <= idx < len(alive_enemies):
+                            target = alive_enemies[idx]
+                            self.emit_attack(player, target, player.attack(target, rng=self.rng))
+                            break
+                        else:
+                            self.log_msg("无效编号，请重新输入。")
+                    except Exception as e:
+                        self.log_msg(f"输入错误，请输入数字编号。{e}")
+                break
 
-            # 手动回合
-            action_done = False
-            while not action_done:
-                self.log_msg(f"\n{player.name} 的回合！")
-
-                # 显示敌人
-                self.log_msg("敌人列表：")
-                for i, e in enumerate(alive_enemies):
-                    self.log_msg(f"{i + 1}. {e.name} (HP {e.HP}/{e.MAX_HP})")
-
-
-                # 显示背包道具
-                self.log_msg("\n背包道具：")
-                items_list = player.inventory.list_items() # [(item,quantity)]
-                if items_list:
-                    for j, items in enumerate(items_list):
-                        item, quantity = items
-                        self.log_msg(f"{j + 1}. {item.name} * {quantity}")
-                else:
-                    self.log_msg("无可用道具")
-
-                # 动作选择
-                self.log_msg("\n动作选择：1. 攻击  2. 使用道具  3. 使用技能  4. 逃跑")
-                choice = input("请选择动作编号: ")
-
-                # ----------------------- 攻击 -----------------------
-                if choice == "1":
-                    while True:
-                        target_choice = input("选择攻击目标编号: ")
-                        try:
-                            idx = int(target_choice) - 1
-                            if 0 <= idx < len(alive_enemies):
-                                target = alive_enemies[idx]
-                                player.attack(target)
+            # ----------------------- 道具 -----------------------
+            elif choice == "2":
+                if not items_list: # [(item,quantity)]
+                    self.log_msg("背包为空，没有可用道具！")
+                    continue
+                while True:
+                    item_choice = output.prompt("选择道具编号使用: ")
+                    try:
+                        idx = int(item_choice) - 1
+                        if 0 <= idx < len(items_list):
+                            item = items_list[idx][0]
+                            if isinstance(item, Consumable):
+                                player.use_item(item)
+                                self.log_msg(f"{player.name} 使用了 {item.name}")
                                 break
                             else:
-                                self.log_msg("无效编号，请重新输入。")
-                        except Exception as e:
-                            self.log_msg(f"输入错误，请输入数字编号。{e}")
-                    break
-
-                # ----------------------- 道具 -----------------------
-                elif choice == "2":
-                    if not items_list: # [(item,quantity)]
-                        self.log_msg("背包为空，没有可用道具！")
-                        continue
-                    while True:
-                        item_choice = input("选择道具编号使用: ")
-                        try:
-                            idx = int(item_choice) - 1
-                            if 0 <= idx < len(items_list):
-                                item = items_list[idx][0]
-                                if isinstance(item, Consumable):
-                                    player.use_item(item)
-                                    self.log_msg(f"{player.name} 使用了 {item.name}")
-                                    break
-                                else:
-                                    self.log_msg("该物品不可使用，请重新选择。")
-                            else:
-                                self.log_msg("无效编号，请重新输入。")
-                        except Exception as e:
-                            self.log_msg(f"输入错误，请输入数字编号, {e}")
-                    break
-
-                # ----------------------- 技能 -----------------------
-                elif choice == "3":
-                    if not player.skills:
-                        self.log_msg("没有可用技能！")
-                        continue  # 回到动作选择
-
-                    while True:
-                        self.log_msg("技能列表：")
-                        for i, sk in enumerate(player.skills):
-                            uses_left = sk.remaining_uses if not math.isinf(sk.remaining_uses) else "∞"
-                            self.log_msg(f"{i + 1}. {sk.name} - {sk.description} (剩余次数 {uses_left})")
-
-                        try:
-                            idx = int(input("选择技能编号: ")) - 1
-                            if 0 <= idx < len(player.skills):
-                                skill = player.skills[idx]
-
-                                # 🚨 如果次数为 0，则提示并重新选择动作
-                                if skill.remaining_uses == 0:
-                                    self.log_msg(f"{player.name} 尝试使用 {skill.name}，但是已经没有使用次数了！")
-                                    break  # 跳出技能选择，返回动作菜单（不结束回合）
-
-                                # ----------------- 单体技能 -----------------
-                                if skill.target_type == "single":
-                                    while True:
-                                        for j, e in enumerate(alive_enemies):
-                                            self.log_msg(f"{j + 1}. {e.name} (HP {e.HP}/{e.MAX_HP})")
-                                        try:
-                                            target_idx = int(input("选择技能目标编号: ")) - 1
-                                            if 0 <= target_idx < len(alive_enemies):
-                                                target = alive_enemies[target_idx]
-                                                player.use_skill(skill, target)
-                                                action_done = True
-                                                break
-                                            else:
-                                                self.log_msg("无效目标编号")
-                                        except Exception as e:
-                                            self.log_msg(f"输入错误，请输入数字编号, {e}")
-                                    break  # 技能成功释放，结束回合
-
-                                # ----------------- 群体技能 -----------------
-                                else:
-                                    player.use_skill(skill, alive_enemies)
-                                    action_done = True
-                                    break  # 技能成功释放，结束回合
-                            else:
-                                self.log_msg("无效技能编号")
-                        except Exception as e:
-                            self.log_msg(f"输入错误，请输入数字编号, {e}")
-                    # 这里不要 break，让动作选择循环重新开始
-
-                # ----------------------- 逃跑 -----------------------
-                elif choice == "4":
-                    alive_enemies = self.all_alive(self.enemies)
-                    if not alive_enemies:
-                        self.log_msg("没有敌人可以逃跑！")
-                        continue
-                    # TODO:优劣势检定
-                    enemy_DEX_avg = sum(e.DEX for e in alive_enemies) // len(alive_enemies)
-                    dice_result = roll_detail("1d20")
-                    escape_roll = dice_result.total + (player.DEX - 10)//2
-                    self.log_msg(
-                        f"{player.name} 尝试逃跑：{dice_result.total}{("大成功") if dice_result.total == 20 else ""} + 敏捷修正({(player.DEX - 10)//2}) = {escape_roll} vs 敌方敏捷平均 {enemy_DEX_avg}")
-                    if escape_roll >= enemy_DEX_avg or dice_result.total == 20:
-                        self.log_msg(f"🏃 {player.name} 成功逃脱战斗！")
-                        escaped_players.append(player)
-                    else:
-                        self.log_msg(f"❌ {player.name} 逃跑失败！")
-                    break
+                                self.log_msg("该物品不可使用，请重新选择。")
+                        else:
+                            self.log_msg("无效编号，请重新输入。")
+                    except Exception as e:
+                        self.log_msg(f"输入错误，请输入数字编号, {e}")
+                break
 
-                else:
-                    self.log_msg("无效选择，请重新输入。")
+            # ----------------------- 技能 -----------------------
+            elif choice == "3":
+                if not player.skills:
+                    self.log_msg("没有可用技能！")
+                    continue  # 回到动作选择
+
+                while True:
+                    self.log_msg("技能列表：")
+                    for i, sk in enumerate(player.skills):
+                        uses_left = sk.remaining_uses if not math.isinf(sk.remaining_uses) else "∞"
+                        self.log_msg(f"{i + 1}. {sk.name} - {sk.description} (剩余次数 {uses_left})")
+
+                    try:
+                        idx = int(output.prompt("选择技能编号: ")) - 1
+                        if 0 <= idx < len(player.skills):
+                            skill = player.skills[idx]
+
+                            # 🚨 如果次数为 0，则提示并重新选择动作
+                            if skill.remaining_uses == 0:
+                                self.log_msg(f"{player.name} 尝试使用 {skill.name}，但是已经没有使用次数了！")
+                                break  # 跳出技能选择，返回动作菜单（不结束回合）
+
+                            # ----------------- 单体技能 -----------------
+                            if skill.target_type == "single":
+                                while True:
+                                    for j, e in enumerate(alive_enemies):
+                                        self.log_msg(f"{j + 1}. {e.name} (HP {e.HP}/{e.MAX_HP})")
+                                    try:
+                                        target_idx = int(output.prompt("选择技能目标编号: ")) - 1
+                                        if 0 <= target_idx < len(alive_enemies):
+                                            target = alive_enemies[target_idx]
+                                            player.use_skill(skill, target, rng=self.rng)
+                                            action_done = True
+                                            break
+                                        else:
+                                            self.log_msg("无效目标编号")
+                                    except Exception as e:
+                                        self.log_msg(f"输入错误，请输入数字编号, {e}")
+                                break  # 技能成功释放，结束回合
+
+                            # ----------------- 群体技能 -----------------
+                            else:
+                                player.use_skill(skill, alive_enemies, rng=self.rng)
+                                action_done = True
+                                break  # 技能成功释放，结束回合
+                        else:
+                            self.log_msg("无效技能编号")
+                    except Exception as e:
+                        self.log_msg(f"输入错误，请输入数字编号, {e}")
+                # 这里不要 break，让动作选择循环重新开始
+
+            # ----------------------- 逃跑 -----------------------
+            elif choice == "4":
+                alive_enemies = self.all_alive(self.enemies)
+                if not alive_enemies:
+                    self.log_msg("没有敌人可以逃跑！")
+                    continue
+                if self.attempt_escape(player, alive_enemies):
+                    escaped = True
+                break
 
-        # 回合结束后移除逃跑玩家
-        for player in escaped_players:
-            if player in self.players:
-                self.players.remove(player)
+            else:
+                self.log_msg("无效选择，请重新输入。")
+        return escaped
+
+    @profiled("battle.escape")
+    def attempt_escape(self, player, alive_enemies) -> bool:
+        """逃跑检定：d20 + 敏捷修正 vs 存活敌人的平均敏捷，天然 20 必定成功"""
+        # TODO:优劣势检定
+        enemy_DEX_avg = sum(e.DEX for e in alive_enemies) // len(alive_enemies)
+        natural_roll = ATTACK_DICE.roll_total(rng=self.rng)
+        escape_roll = natural_roll + player.DEX_MOD
+        self.logger.info("escape_roll", "{name} 尝试逃跑：{roll}{crit} + 敏捷修正({mod}) = {total} vs 敌方敏捷平均 {dex_avg}",
+                         name=player.name, roll=natural_roll, crit="大成功" if natural_roll == 20 else "",
+                         mod=player.DEX_MOD, total=escape_roll, dex_avg=enemy_DEX_avg)
+        if escape_roll >= enemy_DEX_avg or natural_roll == 20:
+            self.logger.info("escape", "🏃 {name} 成功逃脱战斗！", name=player.name, success=True)
+            return True
+        self.logger.info("escape", "❌ {name} 逃跑失败！", name=player.name, success=False)
+        return False
 
     # ------------------
     # 敌人回合
     # ------------------
+    @profiled("battle.enemy_turn")
     def enemy_turn(self):
         for enemy in self.all_alive(self.enemies):
-            alive_players = self.all_alive(self.players)
-            if not alive_players:
+            if not self.alive_players:
                 break
-            target = random.choice(alive_players)
-            enemy.attack(target)
+            if self.skip_turn(enemy):
+                continue
+            self.enemy_action(enemy, self.alive_players)
+
+    @profiled("battle.target")
+    def choose_target(self, candidates):
+        """从候选目标中随机选一个"""
+        return self.rng.choice(candidates)
+
+    def enemy_action(self, enemy, alive_players):
+        """单个敌人的一次行动：交给 enemy_policy，默认攻击随机存活玩家"""
+        if self.enemy_policy is not None:
+            self.enemy_policy.act(self, enemy)
+            return
+        target = self.choose_target(alive_players)
+        self.emit_attack(enemy, target, enemy.attack(target, rng=self.rng))
 
     # ------------------
     # 当前状态
     # ------------------
+    @profiled("battle.print_status")
     def print_status(self):
-        self.log_msg("\n当前状态：")
+        logger = self.logger
+        if not logger.enabled_for(INFO):
+            return
+        logger.info("status", "\n当前状态：")
         for p in self.players:
-            self.log_msg(f"玩家 {p.name}: {p.HP}/{p.MAX_HP} HP, {p.MP}/{p.MAX_MP} MP")
+            logger.info("status", "玩家 {name}: {hp}/{max_hp} HP, {mp}/{max_mp} MP",
+                        name=p.name, hp=p.HP, max_hp=p.MAX_HP, mp=p.MP, max_mp=p.MAX_MP)
         for e in self.enemies:
-            self.log_msg(f"敌人 {e.name}: {e.HP}/{e.MAX_HP} HP")
+            logger.info("status", "敌人 {name}: {hp}/{max_hp} HP", name=e.name, hp=e.HP, max_hp=e.MAX_HP)
@@ -1,6 +1,7 @@
 # === 事件系统 ===
 from game.Map.map import Tile
 from game.Team.team import Team
+from utils import output
 
 
 class Event:
@@ -10,4 +11,4 @@ class Event:
         self.triggered = False
 
     def trigger(self, team: Team, tile: Tile):
-        print(f"事件触发: {self.description}")
+        output.emit(f"事件触发: {self.description}")
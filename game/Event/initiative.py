@@ -0,0 +1,107 @@
+# ======================
+# 先攻 / 时间轴调度器
+# ======================
+import heapq
+import random
+from fractions import Fraction
+from typing import Iterable, List, Optional, Tuple
+
+from game.Entity.entity import ATTACK_DICE
+
+# 速度为 BASE_SPEED 的单位每回合行动一次，速度翻倍则行动间隔减半
+BASE_SPEED = 10
+
+
+class InitiativeScheduler:
+    """
+    基于速度与先攻的行动时间轴
+
+    每个单位在堆中保存 (下次行动时间, -先攻值, 入场序号, 单位)：
+    - 时间轴以“回合”为单位，行动间隔 = BASE_SPEED / Speed，用 Fraction 精确累加，不产生浮点误差
+    - 战斗开始时每个单位掷一次先攻 d20 + 敏捷修正，所有单位在时间 0 按先攻从高到低行动，
+      之后同一时刻行动的单位也按先攻排序
+    - 死亡或离场的单位不立即从堆中删除，而是在轮到它时跳过（惰性删除）
+
+    add / next / remove 都是 O(log n)（均摊），适合数百个单位的大规模混战。
+
+    用法：
+        scheduler = InitiativeScheduler(players + enemies, rng=battle.rng)
+        while ...:
+            time, unit = scheduler.next()
+            ...  # 单位行动
+    """
+
+    def __init__(self, units: Iterable = (), rng=random.randint, base_speed: int = BASE_SPEED):
+        self.rng = rng
+        self.base_speed = base_speed
+        self.now = Fraction(0)       # 当前时间（回合数 - 1，可为分数）
+        self.initiative = {}         # {id(单位): 先攻值}
+        self._heap: List[Tuple[Fraction, int, int, object]] = []
+        self._active = {}            # {id(单位): 入场序号}，不在其中或序号不符的堆元素已失效
+        self._counter = 0            # 入场序号，保证堆元素可比较且顺序稳定
+        self._started = False
+        for unit in units:
+            self.add(unit)
+
+    def __len__(self):
+        return len(self._active)
+
+    def __contains__(self, unit):
+        return id(unit) in self._active
+
+    def roll_initiative(self, unit) -> int:
+        """先攻检定：d20 + 敏捷修正"""
+        return ATTACK_DICE.roll_total(rng=self.rng) + unit.DEX_MOD
+
+    def interval(self, unit) -> Fraction:
+        """两次行动之间的时间间隔（回合）"""
+        return Fraction(self.base_speed, max(unit.Speed, 1))
+
+    def add(self, unit, initiative: int = None, time: Fraction = None):
+        """
+        加入一个单位（中途加入的单位默认在当前时刻之后一个行动间隔行动）
+        """
+        if initiative is None:
+            initiative = self.roll_initiative(unit)
+        if time is None:
+            time = self.now + self.interval(unit) if self._started else self.now
+        self.initiative[id(unit)] = initiative
+        self._active[id(unit)] = self._counter
+        heapq.heappush(self._heap, (Fraction(time), -initiative, self._counter, unit))
+        self._counter += 1
+
+    def remove(self, unit):
+        """单位离场（死亡、逃跑），下次轮到它时跳过"""
+        self._active.pop(id(unit), None)
+
+    def peek(self) -> Optional[Tuple[Fraction, object]]:
+        """下一个行动的 (时间, 单位)，不修改时间轴"""
+        self._discard_removed()
+        if not self._heap:
+            return None
+        time, _, _, unit = self._heap[0]
+        return time, unit
+
+    def next(self) -> Optional[Tuple[Fraction, object]]:
+        """
+        取出下一个行动的单位，并把它的下次行动排到一个间隔之后
+
+        返回 (行动时间, 单位)，时间轴为空时返回 None
+        """
+        self._discard_removed()
+        if not self._heap:
+            return None
+        time, neg_initiative, order, unit = self._heap[0]
+        heapq.heapreplace(self._heap, (time + self.interval(unit), neg_initiative, order, unit))
+        self.now = time
+        self._started = True
+        return time, unit
+
+    def round_of(self, time: Fraction) -> int:
+        """时间所在的回合数（从 1 开始）"""
+        return int(time) + 1
+
+    def _discard_removed(self):
+        heap, active = self._heap, self._active
+        while heap and active.get(id(heap[0][3])) != heap[0][2]:
+            heapq.heappop(heap)
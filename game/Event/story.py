@@ -1,8 +1,9 @@
 from game.Event.event import Event
 from game.Map.map import Tile
 from game.Team.team import Team
+from utils import output
 
 
 class StoryEvent(Event):
     def trigger(self, team: Team, tile: Tile):
-        print(f"📖 剧情事件: {self.description}")
\ No newline at end of file
+        output.emit(f"📖 剧情事件: {self.description}")
\ No newline at end of file
@@ -1,4 +1,7 @@
-from utils.dice import roll_detail
+import random
+
+from utils.dice import compile_dice, dice_distribution, DiceDistribution
+from utils import output
 from typing import Dict, List, Optional, Any, Callable
 from enum import Enum
 import json
@@ -151,17 +154,17 @@ class Equipment(BaseItem):
         """装备到角色"""
         can_equip, msg = self.can_equip(character)
         if not can_equip:
-            print(f"❌ {character.name} 无法装备 {self.name}：{msg}")
+            output.emit(f"❌ {character.name} 无法装备 {self.name}：{msg}")
             return False
 
         current_eq = character.equipment.get(self.slot)
         if current_eq:
-            print(f"⚠️ {character.name} 已经装备了 {current_eq.name} 在 {self.slot.value} 槽，先卸下它。")
+            output.emit(f"⚠️ {character.name} 已经装备了 {current_eq.name} 在 {self.slot.value} 槽，先卸下它。")
             current_eq.unequip_from(character)
 
-        character.equipment[self.slot] = self
+        character.equipment = {**character.equipment, self.slot: self}  # 整体替换，见 Entity.equipment
         self.apply_effects(character)
-        print(f"✅ {character.name} 装备了 {self.name} 到 {self.slot.value} 槽")
+        output.emit(f"✅ {character.name} 装备了 {self.name} 到 {self.slot.value} 槽")
         return True
 
     def unequip_from(self, character) -> bool:
@@ -169,36 +172,55 @@ class Equipment(BaseItem):
         for slot, eq in character.equipment.items():
             if eq == self:
                 self.remove_effects(character)
-                character.equipment[slot] = None
-                print(f"✅ {character.name} 卸下了 {self.name} 从 {slot.value} 槽")
+                character.equipment = {s: e for s, e in character.equipment.items() if s != slot}
+                output.emit(f"✅ {character.name} 卸下了 {self.name} 从 {slot.value} 槽")
                 return True
-        print(f"❌ {self.name} 未装备在 {character.name} 上")
+        output.emit(f"❌ {self.name} 未装备在 {character.name} 上")
         return False
 
+    def modifiers(self) -> Dict[str, int]:
+        """装备提供的加值，如 {"STR": 1, "AC": 2}；盾牌槽位的物品带 armor_class 时计入 AC"""
+        modifiers = dict(self.effects)
+        if self.slot == EquipmentSlot.SHIELD:
+            armor_class = getattr(self, "armor_class", 0)
+            if armor_class:
+                modifiers["AC"] = modifiers.get("AC", 0) + armor_class
+        return modifiers
+
     def apply_effects(self, character):
-        """应用装备效果到角色"""
-        for effect_name, effect_value in self.effects.items():
-            if hasattr(character, effect_name):
-                current_value = getattr(character, effect_name)
-                setattr(character, effect_name, current_value + effect_value)
+        """把装备加值写入角色的修正栈（不修改基础属性）"""
+        character.set_modifier(("equipment", self.slot), self.modifiers())
 
     def remove_effects(self, character):
-        """移除装备效果"""
-        for effect_name, effect_value in self.effects.items():
-            if hasattr(character, effect_name):
-                current_value = getattr(character, effect_name)
-                setattr(character, effect_name, current_value - effect_value)
+        """从角色的修正栈中移除装备加值"""
+        character.remove_modifier(("equipment", self.slot))
 
     def take_damage(self, amount: int):
         """装备受到伤害（降低耐久度）"""
         self.durability = max(0, self.durability - amount)
         if self.durability <= 0:
-            print(f"⚠️ {self.name} 已经损坏！")
+            output.emit(f"⚠️ {self.name} 已经损坏！")
 
     def repair(self, amount: int = 100):
         """修复装备"""
         self.durability = min(self.max_durability, self.durability + amount)
-        print(f"🔧 {self.name} 被修复了 {amount} 点耐久度")
+        output.emit(f"🔧 {self.name} 被修复了 {amount} 点耐久度")
+
+    def to_dict(self) -> Dict:
+        """转换为字典，可由 ItemFactory.create_from_template 还原"""
+        data = super().to_dict()
+        del data["item_type"]  # 由槽位决定
+        data.update({
+            "type": "equipment",
+            "slot": self.slot.value,
+            "level_requirement": self.level_requirement,
+            "effects": dict(self.effects),
+            "durability": self.durability,
+            "max_durability": self.max_durability,
+        })
+        if hasattr(self, "armor_class"):  # 盾牌等直接设置了 armor_class 的装备（计入 AC，见 modifiers）
+            data["armor_class"] = self.armor_class
+        return data
 
     def info(self) -> str:
         desc = super().get_full_description()
@@ -223,21 +245,56 @@ class Weapon(Equipment):
                  critical_multiplier: int = 2,
                  **kwargs):
         super().__init__(name, slot=EquipmentSlot.WEAPON, **kwargs)
-        self.damage_dice = damage_dice
+        self.damage_dice = damage_dice  # 同时编译伤害骰，见 damage_dice.setter
         self.damage_type = damage_type
         self.weapon_type = weapon_type
         self.attack_bonus = attack_bonus
         self.critical_range = critical_range
         self.critical_multiplier = critical_multiplier
 
-    def get_damage(self, strength: int, crit: bool = False) -> int:
-        """计算伤害"""
+    @property
+    def damage_dice(self) -> str:
+        """伤害骰表达式"""
+        return self._damage_dice
+
+    @damage_dice.setter
+    def damage_dice(self, value: str):
+        # 修改表达式时重新编译，get_damage 直接复用编译结果
+        self._damage_dice = value
+        self.damage_plan = compile_dice(value)
+
+    def get_damage(self, strength: int, crit: bool = False, rng: Callable[[int, int], int] = random.randint) -> int:
+        """计算伤害，rng 为掷骰用的随机数函数（可传入 RNGStream）"""
         # TODO:优劣势检定
-        dmg_res = roll_detail(self.damage_dice, crit=crit)
-        damage = dmg_res.total + (strength - 10)//2
-        print(f"{self.name} 伤害: {dmg_res.rolls} + 力量({(strength - 10)//2}) → {damage}")
+        dmg_res = self.damage_plan.roll(crit=crit, rng=rng)
+        modifier = (strength - 10)//2
+        damage = dmg_res.total + modifier
+        if output.enabled:
+            output.emit(f"{self.name} 伤害: {dmg_res.rolls} + 力量({modifier}) → {damage}")
         return damage
 
+    def damage_distribution(self, strength: int, crit: bool = False) -> DiceDistribution:
+        """get_damage 结果的精确分布（不掷骰）"""
+        return dice_distribution(self.damage_plan, crit=crit).shift((strength - 10)//2)
+
+    def expected_damage(self, strength: int, crit: bool = False) -> float:
+        """get_damage 的期望伤害"""
+        return self.damage_distribution(strength, crit).mean
+
+    def to_dict(self) -> Dict:
+        data = super().to_dict()
+        del data["slot"]
+        data.update({
+            "type": "weapon",
+            "damage_dice": self.damage_dice,
+            "damage_type": self.damage_type,
+            "weapon_type": self.weapon_type,
+            "attack_bonus": self.attack_bonus,
+            "critical_range": self.critical_range,
+            "critical_multiplier": self.critical_multiplier,
+        })
+        return data
+
     def get_full_description(self) -> str:
         desc = super().get_full_description()
         desc += f"\n伤害: {self.damage_dice} + 力量"
@@ -263,6 +320,22 @@ class Armor(Equipment):
         self.armor_type = armor_type
         self.max_dex_bonus = max_dex_bonus
 
+    def modifiers(self) -> Dict[str, int]:
+        modifiers = super().modifiers()
+        modifiers["AC"] = modifiers.get("AC", 0) + self.armor_class
+        return modifiers
+
+    def to_dict(self) -> Dict:
+        data = super().to_dict()
+        del data["slot"]
+        data.update({
+            "type": "armor",
+            "armor_class": self.armor_class,
+            "armor_type": self.armor_type,
+            "max_dex_bonus": self.max_dex_bonus,
+        })
+        return data
+
     def get_full_description(self) -> str:
         desc = super().get_full_description()
         desc += f"\n护甲等级: {self.armor_class}"
@@ -290,6 +363,13 @@ class Consumable(BaseItem):
             return self.use_effect(character, self)
         return False
 
+    def to_dict(self) -> Dict:
+        """use_effect 是函数，无法保存；HPPotion / MPPotion 由各自的数值重建效果"""
+        data = super().to_dict()
+        del data["item_type"], data["stackable"]  # 由 Consumable 固定
+        data.update({"type": "consumable", "charges": self.charges})
+        return data
+
     def get_full_description(self) -> str:
         desc = super().get_full_description()
         desc += f"\n使用次数: {self.charges}"
@@ -305,13 +385,19 @@ class HPPotion(Consumable):
                  **kwargs):
         def heal_effect(character, item):
             character.heal(heal_amount)
-            print(
-                f"💚 {character.name} 使用了 {item.name}，恢复了 {heal_amount} 点生命！（{character.HP}/{character.MAX_HP} HP）")
+            if output.enabled:
+                output.emit(
+                    f"💚 {character.name} 使用了 {item.name}，恢复了 {heal_amount} 点生命！（{character.HP}/{character.MAX_HP} HP）")
             return True
 
         super().__init__(name, use_effect=heal_effect, **kwargs)
         self.heal_amount = heal_amount
 
+    def to_dict(self) -> Dict:
+        data = super().to_dict()
+        data.update({"type": "hp_potion", "heal_amount": self.heal_amount})
+        return data
+
     def get_full_description(self) -> str:
         desc = super().get_full_description()
         desc += f"\n治疗效果: 恢复 {self.heal_amount} 点生命值"
@@ -326,14 +412,20 @@ class MPPotion(Consumable):
                  mana_amount: int = 10,
                  **kwargs):
         def mana_effect(character, item):
-            character.mp = min(character.MAX_MP, character.MP + mana_amount)
-            print(
-                f"🔮 {character.name} 使用了 {item.name}，恢复了 {mana_amount} 点魔法！（{character.MP}/{character.MAX_MP} MP）")
+            character.MP = min(character.MAX_MP, character.MP + mana_amount)
+            if output.enabled:
+                output.emit(
+                    f"🔮 {character.name} 使用了 {item.name}，恢复了 {mana_amount} 点魔法！（{character.MP}/{character.MAX_MP} MP）")
             return True
 
         super().__init__(name, use_effect=mana_effect, **kwargs)
         self.mana_amount = mana_amount
 
+    def to_dict(self) -> Dict:
+        data = super().to_dict()
+        data.update({"type": "mp_potion", "mana_amount": self.mana_amount})
+        return data
+
     def get_full_description(self) -> str:
         desc = super().get_full_description()
         desc += f"\n治疗效果: 恢复 {self.mana_amount} 点魔法值"
@@ -388,10 +480,14 @@ class ItemFactory:
             except Exception:
                 pass
 
+        # 耐久度不是构造参数，创建后再写回（to_dict 保存的装备）
+        durability = t.pop("durability", None)
+        max_durability = t.pop("max_durability", None)
+
         # 类型分支优先用 type 字段（字符串）
         type_str = t.get("type")
         if type_str == "weapon":
-            return Weapon(
+            item = Weapon(
                 name=t["name"],
                 damage_dice=t["damage_dice"],
                 damage_type=t.get("damage_type", "物理"),
@@ -401,27 +497,46 @@ class ItemFactory:
                    k not in ["type", "item_type", "name", "damage_dice", "damage_type", "weapon_type", "attack_bonus"]}
             )
         elif type_str == "armor":
-            return Armor(
+            item = Armor(
                 name=t["name"],
                 armor_class=t["armor_class"],
                 armor_type=t.get("armor_type", "轻甲"),
                 **{k: v for k, v in t.items() if k not in ["type", "item_type", "name", "armor_class", "armor_type"]}
             )
         elif type_str == "hp_potion":
-            return HPPotion(
+            item = HPPotion(
                 name=t["name"],
                 heal_amount=t.get("heal_amount", 10),
                 **{k: v for k, v in t.items() if k not in ["type", "item_type", "name", "heal_amount"]}
             )
         elif type_str == "mp_potion":
-            return MPPotion(
+            item = MPPotion(
                 name=t["name"],
                 mana_amount=t.get("mana_amount", 10),
                 **{k: v for k, v in t.items() if k not in ["type", "item_type", "name", "mana_amount"]}
             )
-        # 其它类型
-        t.pop("type", None)
-        return BaseItem(**t)
+        elif type_str == "equipment":
+            item = Equipment(
+                name=t["name"],
+                slot=t["slot"],
+                **{k: v for k, v in t.items() if k not in ["type", "item_type", "name", "slot", "armor_class"]}
+            )
+            if "armor_class" in t:
+                item.armor_class = t["armor_class"]
+        elif type_str == "consumable":
+            item = Consumable(
+                name=t["name"],
+                **{k: v for k, v in t.items() if k not in ["type", "item_type", "name", "stackable"]}
+            )
+        else:
+            # 其它类型
+            t.pop("type", None)
+            item = BaseItem(**t)
+        if durability is not None:
+            item.durability = durability
+        if max_durability is not None:
+            item.max_durability = max_durability
+        return item
 
 
 # 预设物品模板
@@ -531,10 +646,10 @@ def load_items_from_json(file_path: str) -> Dict[str, BaseItem]:
 
         return items
     except FileNotFoundError:
-        print(f"物品文件未找到: {file_path}")
+        output.emit(f"物品文件未找到: {file_path}")
         return {}
     except json.JSONDecodeError as e:
-        print(f"物品文件格式错误: {e}")
+        output.emit(f"物品文件格式错误: {e}")
         return {}
 
 
@@ -1,5 +1,6 @@
 # === 地图系统 ===
 from game.Inventory.inventory import Inventory
+from utils import output
 
 
 class Tile:
@@ -34,4 +35,4 @@ class Map:
                         row += tile.tile_type + " "
                 else:
                     row += "? " if not tile.explored else ". "
-            print(row)
+            output.emit(row)
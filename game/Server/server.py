@@ -0,0 +1,359 @@
+# ======================
+# 本地战斗会话服务器（JSON Lines 协议）
+# ======================
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import math
+import sys
+from typing import Dict, Optional
+
+from game.Entity.entityfactory import EntityFactory
+from game.Event.async_battle import AsyncBattleManager, BattleAction, QueueActionProvider
+from game.Simulation.montecarlo import create_units
+from utils import output
+from utils.logger import INFO, OFF
+
+# 协议（每行一个 JSON 对象，UTF-8）
+# 客户端 → 服务器：
+#   {"op": "new", "party": ["战士"], "monsters": ["哥布林"], "seed": 1, "timeout": 30, "logs": true,
+#    "initiative": false}
+#   {"op": "action", "session": 1, "kind": "attack", "target": 0, "round": 1, "player": 0}
+#       round / player 取自 prompt；与当前回合或当前玩家不符的行动（如超时后才到达）会被丢弃
+#   {"op": "close", "session": 1}
+# 服务器 → 客户端：
+#   {"event": "created", "session": 1, "units": [...]}
+#   {"event": "prompt", "session": 1, "round": 1, "player": 0, "enemies": [...], "items": [...], "skills": [...]}
+#   {"event": "attack", "session": 1, "round": 1, "attacker": 0, "target": 2, "roll": 15, ...}
+#   {"event": "log", "session": 1, "msg": "..."}
+#   {"event": "end", "session": 1, "winner": "players", "rounds": 3, "reward": {...}}
+#   {"event": "error", "session": 1, "msg": "..."}
+
+HIGH_WATER = 64 * 1024  # 单个连接待发送数据超过该字节数时，暂停该连接上的战斗推进
+
+
+class Connection:
+    """
+    一个客户端连接的输出端
+
+    send() 只把编码好的行放进待发送列表；后台的 flush 任务把积攒的所有行一次 writelines，
+    再 await drain()。待发送数据超过 high_water 时 writable 被清除，
+    会话在请求下一个行动前（回合计时开始之前）等待它，从而把 TCP 背压传递到战斗循环。
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter, high_water: int = HIGH_WATER):
+        self.writer = writer
+        self.high_water = high_water
+        self._pending = []
+        self._pending_size = 0
+        self._wake = asyncio.Event()
+        self.writable = asyncio.Event()
+        self.writable.set()
+        self.closed = False
+
+    def send(self, message: Dict):
+        if self.closed:
+            return
+        line = (json.dumps(message, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        self._pending.append(line)
+        self._pending_size += len(line)
+        if self._pending_size >= self.high_water:
+            self.writable.clear()
+        self._wake.set()
+
+    async def flush_loop(self):
+        """把待发送的行批量写出，直到连接关闭"""
+        try:
+            while True:
+                await self._wake.wait()
+                self._wake.clear()
+                batch, self._pending, self._pending_size = self._pending, [], 0
+                self.writer.writelines(batch)
+                await self.writer.drain()
+                if self._pending_size < self.high_water:
+                    self.writable.set()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.closed = True
+            self.writable.set()  # 不再阻塞会话，让它们尽快结束
+
+
+class SessionProvider(QueueActionProvider):
+    """
+    会话的行动提供者：先等待连接可写，再推送 prompt，然后等客户端的 action
+
+    等待可写放在 ready 中，不计入回合超时：读得慢的客户端会让它的战斗暂停，而不是被自动行动接管
+    """
+
+    def __init__(self, session: "Session"):
+        super().__init__()
+        self.session = session
+
+    async def ready(self, battle, player):
+        await self.session.connection.writable.wait()
+
+    async def choose(self, battle, player, alive_enemies):
+        self.session.send_prompt(player, alive_enemies)
+        return await super().choose(battle, player, alive_enemies)
+
+
+class Session:
+    """服务器上的一场战斗"""
+
+    def __init__(self, session_id: int, connection: Connection, party, monsters, seed=None,
+                 timeout: float = 60.0, logs: bool = True, initiative: bool = False, enemy_policy=None):
+        self.id = session_id
+        self.connection = connection
+        self.provider = SessionProvider(self)
+        players, enemies = create_units(party, monsters)
+        self.battle = AsyncBattleManager(
+            players, enemies,
+            default_provider=self.provider,
+            turn_timeout=timeout,
+            log_callback=self._send_log,
+            log_level=INFO if logs else OFF,
+            rng=seed,
+            sink=self._send_attack,
+            initiative=initiative,
+            enemy_policy=enemy_policy,
+        )
+        self.task: Optional[asyncio.Task] = None
+
+    def _send_log(self, msg: str):
+        self.connection.send({"event": "log", "session": self.id, "msg": msg})
+
+    def _send_attack(self, event):
+        self.connection.send({"event": "attack", "session": self.id, **event._asdict()})
+
+    def describe_units(self):
+        return [{"unit": i, "name": u.name, "side": "player" if i < self.battle.num_players else "enemy",
+                 "hp": u.HP, "max_hp": u.MAX_HP} for i, u in enumerate(self.battle.units)]
+
+    def send_prompt(self, player, alive_enemies):
+        battle = self.battle
+        self.connection.send({
+            "event": "prompt",
+            "session": self.id,
+            "round": battle.round_num,
+            "player": battle.unit_id(player),
+            "hp": player.HP,
+            "mp": player.MP,
+            "enemies": [{"target": i, "unit": battle.unit_id(e), "name": e.name, "hp": e.HP, "max_hp": e.MAX_HP}
+                        for i, e in enumerate(alive_enemies)],
+            "items": [{"item": j, "name": item.name, "quantity": quantity}
+                      for j, (item, quantity) in enumerate(player.inventory.list_items())],
+            "skills": [{"skill": k, "name": sk.name, "target_type": sk.target_type,
+                        "remaining_uses": None if sk.remaining_uses == float("inf") else sk.remaining_uses}
+                       for k, sk in enumerate(player.skills)],
+        })
+
+    async def run(self):
+        battle = self.battle
+        try:
+            await battle.start_battle()
+        except asyncio.CancelledError:
+            return
+        reward = battle.reward or {}
+        self.connection.send({
+            "event": "end",
+            "session": self.id,
+            "winner": "players" if battle.alive_players else "enemies",
+            "rounds": battle.round_num - 1,
+            "reward": {"exp": reward.get("exp", 0), "currency": reward.get("currency", 0),
+                       "items": [item.name for item in reward.get("items", []) if item]},
+        })
+
+
+def _optional_int(message: Dict, key: str) -> Optional[int]:
+    """消息中可省略的整数字段"""
+    value = message.get(key)
+    if value is not None and (not isinstance(value, int) or isinstance(value, bool)):
+        raise ValueError(f"{key} 必须是整数")
+    return value
+
+
+class BattleServer:
+    """
+    承载多个战斗会话的服务器
+
+    所有会话共享一个事件循环；每个连接可以开多个会话，会话随连接关闭而取消。
+    enemy_policy 为所有会话共用的敌人策略（如 MCTSPolicy），None 表示随机攻击。
+    """
+
+    def __init__(self, high_water: int = HIGH_WATER, enemy_policy=None):
+        self.high_water = high_water
+        self.enemy_policy = enemy_policy
+        self.sessions: Dict[int, Session] = {}
+        self._ids = itertools.count(1)
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connection = Connection(writer, self.high_water)
+        flusher = asyncio.create_task(connection.flush_loop())
+        owned = set()
+        try:
+            while not connection.closed:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                    if not isinstance(message, dict):
+                        raise ValueError("消息必须是 JSON 对象")
+                    self.dispatch(connection, message, owned)
+                except (ValueError, KeyError, TypeError) as e:
+                    connection.send({"event": "error", "msg": str(e)})
+        except (ConnectionError, asyncio.CancelledError):
+            # 客户端断开或服务器关闭
+            pass
+        finally:
+            for session_id in owned:
+                self.close_session(session_id)
+            flusher.cancel()
+            writer.close()
+            with contextlib.suppress(Exception):
+                await writer.wait_closed()
+
+    def dispatch(self, connection: Connection, message: Dict, owned: set):
+        op = message.get("op")
+        if op == "new":
+            party, monsters = list(message["party"]), list(message["monsters"])
+            for name in party:
+                if name not in EntityFactory.CHARACTER_TEMPLATES:
+                    raise ValueError(f"未知角色模板: {name}")
+            for name in monsters:
+                if name not in EntityFactory.MONSTER_TEMPLATES:
+                    raise ValueError(f"未知怪物模板: {name}")
+            seed = _optional_int(message, "seed")
+            timeout = message.get("timeout", 60.0)
+            if (not isinstance(timeout, (int, float)) or isinstance(timeout, bool)
+                    or not math.isfinite(timeout) or timeout <= 0):
+                raise ValueError("timeout 必须是正数（秒）")
+            session = Session(next(self._ids), connection, party, monsters, seed, timeout,
+                              bool(message.get("logs", True)), bool(message.get("initiative", False)),
+                              self.enemy_policy)
+            self.sessions[session.id] = session
+            owned.add(session.id)
+            connection.send({"event": "created", "session": session.id, "seed": session.battle.rng.seed,
+                             "units": session.describe_units()})
+            session.task = asyncio.create_task(session.run())
+            session.task.add_done_callback(lambda task, s=session: self._finished(s, owned, task))
+        elif op == "action":
+            session = self._owned_session(message, owned)
+            session.provider.submit(BattleAction(
+                kind=message.get("kind", "attack"),
+                target=int(message.get("target", 0)),
+                item=int(message.get("item", 0)),
+                skill=int(message.get("skill", 0)),
+                round=_optional_int(message, "round"),
+                player=_optional_int(message, "player"),
+            ))
+        elif op == "close":
+            self._owned_session(message, owned)
+            self.close_session(message["session"])
+        else:
+            raise ValueError(f"未知操作: {op}")
+
+    def _owned_session(self, message: Dict, owned: set) -> Session:
+        session_id = message["session"]
+        if session_id not in owned or session_id not in self.sessions:
+            raise ValueError(f"会话不存在: {session_id}")
+        return self.sessions[session_id]
+
+    def _finished(self, session: Session, owned: set, task: asyncio.Task):
+        self.sessions.pop(session.id, None)
+        owned.discard(session.id)
+        # 会话异常结束时告知客户端，否则客户端会一直等待 prompt / end
+        if not task.cancelled() and task.exception() is not None:
+            error = task.exception()
+            session.connection.send({"event": "error", "session": session.id,
+                                     "msg": f"会话异常结束: {type(error).__name__}: {error}"})
+
+    def close_session(self, session_id: int):
+        session = self.sessions.pop(session_id, None)
+        if session is not None and session.task is not None:
+            session.task.cancel()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765, unix: str = None):
+        if unix:
+            server = await asyncio.start_unix_server(self.handle_client, path=unix, backlog=1024)
+            where = unix
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port, backlog=1024)
+            where = f"{host}:{port}"
+        print(f"⚔️ 战斗服务器已启动: {where}", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+
+# -----------------------------
+# 压测客户端
+# -----------------------------
+async def demo_client(connect, party, monsters, seed: int) -> str:
+    """一个总是攻击第一个存活敌人的客户端，返回胜方"""
+    reader, writer = await connect()
+    writer.write((json.dumps({"op": "new", "party": party, "monsters": monsters, "seed": seed,
+                              "logs": False}) + "\n").encode())
+    winner = None
+    while winner is None:
+        line = await reader.readline()
+        if not line:
+            break
+        message = json.loads(line)
+        if message["event"] == "prompt":
+            writer.write((json.dumps({"op": "action", "session": message["session"], "kind": "attack",
+                                      "target": 0, "round": message["round"],
+                                      "player": message["player"]}) + "\n").encode())
+        elif message["event"] == "end":
+            winner = message["winner"]
+    writer.close()
+    return winner
+
+
+async def run_demo(clients: int, unix: str = None, port: int = 0) -> str:
+    """在同一进程内启动服务器并用 clients 个并发客户端压测，返回结果摘要"""
+    import time
+
+    server = BattleServer()
+    if unix:
+        listener = await asyncio.start_unix_server(server.handle_client, path=unix, backlog=1024)
+        connect = lambda: asyncio.open_unix_connection(unix)
+    else:
+        listener = await asyncio.start_server(server.handle_client, "127.0.0.1", port, backlog=1024)
+        bound = listener.sockets[0].getsockname()[1]
+        connect = lambda: asyncio.open_connection("127.0.0.1", bound)
+
+    start = time.perf_counter()
+    async with listener:
+        winners = await asyncio.gather(*(demo_client(connect, ["战士", "法师"], ["哥布林", "兽人"], seed)
+                                         for seed in range(clients)))
+    return (f"{clients} 个并发客户端完成战斗: {time.perf_counter() - start:.2f}s，"
+            f"玩家胜 {winners.count('players')} 场")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON Lines 战斗会话服务器")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址（仅本机）")
+    parser.add_argument("--port", type=int, default=8765, help="TCP 端口")
+    parser.add_argument("--unix", default=None, help="Unix socket 路径，指定后不监听 TCP")
+    parser.add_argument("--demo-clients", type=int, default=0, help="不对外服务，启动 N 个内置客户端压测后退出")
+    parser.add_argument("--verbose", action="store_true", help="在控制台显示实体的提示信息")
+    args = parser.parse_args(argv)
+
+    # 实体的提示信息（攻击明细、装备等）服务器进程默认丢弃，战斗日志经会话发送给客户端
+    result = None
+    with output.redirect(output.ConsoleOutput() if args.verbose else output.NullOutput()):
+        if args.demo_clients:
+            coro = run_demo(args.demo_clients, args.unix, 0)
+        else:
+            coro = BattleServer().serve(args.host, args.port, args.unix)
+        with contextlib.suppress(KeyboardInterrupt):
+            result = asyncio.run(coro)
+    if result:
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# ======================
+# 无界面自动战斗引擎
+# ======================
+from typing import Callable, List, NamedTuple, Optional
+
+from game.Entity.condition import CONDITIONS, tick_conditions
+from game.Event.alive_index import AliveIndex
+from utils.rng import RNGStream
+
+
+class CombatEvent(NamedTuple):
+    """
+    一次攻击的结构化事件
+
+    attacker / target 为单位编号：玩家 0..P-1，敌人 P..P+E-1（与 HeadlessBattle.units 对应）
+    """
+    round: int        # 回合数（从 1 开始）
+    attacker: int     # 攻击者编号
+    target: int       # 目标编号
+    roll: int         # d20 原始点数
+    hit: bool         # 是否命中
+    crit: bool        # 是否暴击
+    damage: int       # 造成的伤害（未命中为 0）
+    target_hp: int    # 结算后目标剩余 HP
+
+
+class BattleOutcome(NamedTuple):
+    """一场战斗的结果"""
+    winner: str           # "players" / "enemies" / "draw"（超过回合上限）
+    rounds: int           # 实际进行的回合数
+    hp: List[int]         # 战斗结束时各单位 HP，顺序同 HeadlessBattle.units
+    seed: int             # 本场使用的随机种子，可用于重放
+
+
+class HeadlessBattle:
+    """
+    无输出的自动战斗引擎
+
+    规则与 BattleManager 在 auto 模式下完全一致：每回合玩家按顺序攻击随机存活敌人，
+    然后敌人按顺序攻击随机存活玩家；但不调用 print / input，也不拼接日志字符串。
+    传入相同的 rng（或种子）时，与 BattleManager(mode="auto") 的结果逐位相同。
+
+    参数：
+    - players / enemies: 参战单位（会直接修改它们的 HP）
+    - rng: RNGStream / BlockRNG 或整数种子，None 表示随机种子
+    - sink: 可选的事件接收函数 sink(CombatEvent)；为 None 时不构造任何事件对象
+    - max_rounds: 回合上限，超过后判定为平局（防止双方都无法造成伤害时死循环）
+    """
+
+    def __init__(self, players, enemies, rng=None, sink: Optional[Callable[[CombatEvent], None]] = None,
+                 max_rounds: int = 1000):
+        self.players = list(players)
+        self.enemies = list(enemies)
+        self.units = self.players + self.enemies
+        self.rng = RNGStream(rng) if rng is None or isinstance(rng, int) else rng
+        self.sink = sink
+        self.max_rounds = max_rounds
+        self.round_num = 0
+
+    def run(self) -> BattleOutcome:
+        """进行整场战斗，返回 BattleOutcome"""
+        players, enemies = self.players, self.enemies
+        rng, sink = self.rng, self.sink
+        choice = rng.choice
+        index = {id(unit): i for i, unit in enumerate(self.units)}
+
+        # 与 BattleManager 相同：行动者按原顺序，目标从 AliveIndex 中选取，死亡时立即移出
+        alive_players = AliveIndex(players)
+        alive_enemies = AliveIndex(enemies)
+        skip = CONDITIONS.skip_turn_mask
+        while self.round_num < self.max_rounds:
+            if not alive_players or not alive_enemies:
+                break
+            self.round_num += 1
+
+            # 玩家回合
+            for player in [p for p in players if p.HP > 0 and not p.condition_mask & skip]:
+                if not alive_enemies:
+                    break
+                target = choice(alive_enemies)
+                result = player.resolve_attack(target, rng=rng)
+                if sink is not None:
+                    sink(CombatEvent(self.round_num, index[id(player)], index[id(target)], result.natural_roll,
+                                     result.hit, result.crit, result.damage, target.HP))
+                if target.HP <= 0:
+                    alive_enemies.discard(target)
+
+            # 敌人回合
+            for enemy in [e for e in enemies if e.HP > 0 and not e.condition_mask & skip]:
+                if not alive_players:
+                    break
+                target = choice(alive_players)
+                result = enemy.resolve_attack(target, rng=rng)
+                if sink is not None:
+                    sink(CombatEvent(self.round_num, index[id(enemy)], index[id(target)], result.natural_roll,
+                                     result.hit, result.crit, result.damage, target.HP))
+                if target.HP <= 0:
+                    alive_players.discard(target)
+
+            # 回合结束：状态结算（没有状态的单位只做一次整数判断）
+            for unit in tick_conditions(self.units):
+                alive_players.discard(unit)
+                alive_enemies.discard(unit)
+
+        if any(p.HP > 0 for p in players) and not any(e.HP > 0 for e in enemies):
+            winner = "players"
+        elif not any(p.HP > 0 for p in players):
+            winner = "enemies"
+        else:
+            winner = "draw"
+        return BattleOutcome(winner, self.round_num, [u.HP for u in self.units], self.rng.seed)
+
+
+def run_headless(players, enemies, rng=None, sink=None, max_rounds: int = 1000) -> BattleOutcome:
+    """便捷函数：创建 HeadlessBattle 并运行"""
+    return HeadlessBattle(players, enemies, rng, sink, max_rounds).run()
@@ -0,0 +1,226 @@
+# ======================
+# 遭遇战难度的精确解（HP 状态上的马尔可夫链）
+# ======================
+import math
+import sys
+from typing import List, NamedTuple, Sequence, Tuple
+
+from game.Entity.entity import UNARMED_DICE
+from game.Item.item import EquipmentSlot
+from game.Simulation.montecarlo import create_units
+from utils.dice import dice_distribution
+
+
+class EncounterSolution(NamedTuple):
+    """精确求解结果"""
+    win_probability: float    # 玩家获胜概率
+    loss_probability: float   # 敌人获胜概率
+    draw_probability: float   # 永远无法分出胜负的概率（双方都无法造成伤害）
+    expected_rounds: float    # 期望回合数（存在平局可能时为 inf）
+    states: int               # 求解过程中访问的状态数
+
+
+def hit_probability(attacker, target) -> Tuple[float, float]:
+    """
+    attacker 普通攻击 target 的命中概率
+
+    规则与 Entity.resolve_attack 相同：d20 + 命中加值 >= AC 命中，天然 20 必定命中并暴击
+
+    返回:
+        (普通命中概率, 暴击概率)
+    """
+    target_ac = target.armor_class
+    normal_hits = sum(1 for natural in range(1, 20) if natural + attacker.to_hit >= target_ac)
+    return normal_hits / 20, 1 / 20
+
+
+def damage_kernel(attacker, target) -> List[Tuple[int, float]]:
+    """
+    attacker 对 target 一次普通攻击造成伤害的精确分布（含未命中）
+
+    伤害 <= 0 的结果都记为 0 伤害（不计入负伤害“治疗”目标的情况）
+
+    返回:
+        [(伤害, 概率)]，按伤害从小到大
+    """
+    weapon = attacker.equipment.get(EquipmentSlot.WEAPON)
+    plan = weapon.damage_plan if weapon else UNARMED_DICE
+    str_mod = attacker.damage_bonus
+    p_hit, p_crit = hit_probability(attacker, target)
+
+    kernel = {0: 1.0 - p_hit - p_crit}
+    for crit, weight in ((False, p_hit), (True, p_crit)):
+        if weight == 0:
+            continue
+        for total, p in dice_distribution(plan, crit=crit).items():
+            damage = max(total + str_mod, 0)
+            kernel[damage] = kernel.get(damage, 0.0) + weight * p
+    return sorted(kernel.items())
+
+
+class EncounterSolver:
+    """
+    小规模遭遇战的精确求解器
+
+    以“所有单位的 HP + 当前行动者”为状态，按 BattleManager auto 模式的顺序
+    （玩家依次攻击随机存活敌人，然后敌人依次攻击随机存活玩家）做带记忆化的动态规划，
+    直接得到玩家胜率与期望回合数，不做任何随机抽样。
+
+    HP 只会减少，所以除了“整回合都没造成伤害”的自环之外状态图无环；
+    自环在回合开始处用 V = acc / (1 - p_self) 解析消去。
+    状态数约为各单位 (HP + 1) 的乘积，适合 1v1 ~ 2v2 规模的遭遇战。
+    """
+
+    def __init__(self, players, enemies):
+        self.units = list(players) + list(enemies)
+        self.num_players = len(players)
+        self.start = tuple(max(u.HP, 0) for u in self.units)
+        count = len(self.units)
+        # kernels[a][t] = a 攻击 t 的伤害分布
+        self.kernels = [[damage_kernel(self.units[a], self.units[t]) for t in range(count)] for a in range(count)]
+        self._transition_cache = {}
+        self._memo = {}
+        self._round_start = {}
+
+    def _transitions(self, attacker: int, target: int, hp: int) -> Tuple[Tuple[int, float], ...]:
+        """目标当前 HP 为 hp 时，一次攻击后目标 HP 的分布（致死的结果合并为 0）"""
+        key = (attacker, target, hp)
+        cached = self._transition_cache.get(key)
+        if cached is None:
+            outcome = {}
+            for damage, p in self.kernels[attacker][target]:
+                new_hp = max(hp - damage, 0)
+                outcome[new_hp] = outcome.get(new_hp, 0.0) + p
+            cached = self._transition_cache[key] = tuple(outcome.items())
+        return cached
+
+    def _alive(self, state, low: int, high: int):
+        return [i for i in range(low, high) if state[i] > 0]
+
+    def _terminal(self, state):
+        """返回 (玩家胜, 敌人胜) 概率，None 表示战斗未结束"""
+        if not any(state[:self.num_players]):
+            return 0.0, 1.0
+        if not any(state[self.num_players:]):
+            return 1.0, 0.0
+        return None
+
+    def _targets(self, state, actor: int):
+        """actor 能否行动，以及可选目标"""
+        if state[actor] <= 0:
+            return []
+        if actor < self.num_players:
+            return self._alive(state, self.num_players, len(state))
+        return self._alive(state, 0, self.num_players)
+
+    def _value(self, state, actor: int) -> Tuple[float, float, float]:
+        """
+        第 actor 个单位行动前的 (玩家胜率, 敌人胜率, 本回合之后还会开始的回合数期望)
+        """
+        key = (state, actor)
+        if key in self._memo:
+            return self._memo[key]
+
+        if actor == len(self.units):
+            # 回合结束
+            terminal = self._terminal(state)
+            if terminal is not None:
+                value = (terminal[0], terminal[1], 0.0)
+            else:
+                value = self._start_value(state)
+        else:
+            targets = self._targets(state, actor)
+            if not targets:
+                value = self._value(state, actor + 1)
+            else:
+                win = loss = rest = 0.0
+                share = 1.0 / len(targets)
+                for target in targets:
+                    for new_hp, p in self._transitions(actor, target, state[target]):
+                        next_state = state[:target] + (new_hp,) + state[target + 1:]
+                        w, l, r = self._value(next_state, actor + 1)
+                        win += share * p * w
+                        loss += share * p * l
+                        rest += share * p * r
+                value = (win, loss, rest)
+
+        self._memo[key] = value
+        return value
+
+    def _start_value(self, state) -> Tuple[float, float, float]:
+        """
+        回合开始时（战斗未结束）的 (玩家胜率, 敌人胜率, 从本回合起的总回合数期望)
+
+        沿“尚未造成任何伤害”的路径推进，p_same 为整回合状态不变的概率
+        """
+        if state in self._round_start:
+            return self._round_start[state]
+
+        win = loss = rest = 0.0
+        p_same = 1.0
+        for actor in range(len(self.units)):
+            targets = self._targets(state, actor)
+            if not targets:
+                continue
+            share = 1.0 / len(targets)
+            stay = 0.0
+            for target in targets:
+                for new_hp, p in self._transitions(actor, target, state[target]):
+                    if new_hp == state[target]:
+                        stay += share * p
+                        continue
+                    next_state = state[:target] + (new_hp,) + state[target + 1:]
+                    w, l, r = self._value(next_state, actor + 1)
+                    weight = p_same * share * p
+                    win += weight * w
+                    loss += weight * l
+                    rest += weight * r
+            p_same *= stay
+
+        if p_same >= 1.0 - 1e-15:
+            # 双方都无法造成伤害，永远分不出胜负
+            value = (0.0, 0.0, math.inf)
+        else:
+            # W = win + p_same * W；X = rest + p_same * (1 + X)；总回合数 = 1 + X
+            value = (win / (1 - p_same), loss / (1 - p_same), 1 + (rest + p_same) / (1 - p_same))
+        self._round_start[state] = value
+        return value
+
+    def solve(self) -> EncounterSolution:
+        """求解整场遭遇战"""
+        limit = sys.getrecursionlimit()
+        # 递归深度与总 HP × 单位数同阶
+        sys.setrecursionlimit(max(limit, 10 * (sum(self.start) + 10) * len(self.units)))
+        try:
+            terminal = self._terminal(self.start)
+            if terminal is not None:
+                win, loss, rounds = terminal[0], terminal[1], 0.0
+            else:
+                win, loss, rounds = self._start_value(self.start)
+        finally:
+            sys.setrecursionlimit(limit)
+
+        # 概率之和不足 1 的部分来自双方都无法再造成伤害的分支
+        draw = 1.0 - win - loss
+        if draw < 1e-12:  # 浮点误差
+            draw = 0.0
+        return EncounterSolution(win, loss, draw, rounds, len(self._memo) + len(self._round_start))
+
+
+def solve_encounter(party: Sequence[str], monsters: Sequence[str]) -> EncounterSolution:
+    """
+    按模板名精确求解遭遇战，例如 solve_encounter(["战士"], ["哥布林", "兽人"])
+    """
+    players, enemies = create_units(party, monsters)
+    return EncounterSolver(players, enemies).solve()
+
+
+if __name__ == "__main__":
+    import time
+
+    for party, monsters in [(["战士"], ["哥布林"]), (["法师"], ["兽人"]), (["战士"], ["哥布林", "兽人"]),
+                            (["战士", "法师"], ["兽人"])]:
+        start = time.perf_counter()
+        solution = solve_encounter(party, monsters)
+        print(f"{' + '.join(party)} VS {' + '.join(monsters)}: 胜率 {solution.win_probability:.4%}，"
+              f"期望回合 {solution.expected_rounds:.3f}（{solution.states} 个状态，{time.perf_counter() - start:.3f}s）")
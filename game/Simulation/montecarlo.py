@@ -0,0 +1,212 @@
+# ======================
+# 蒙特卡洛遭遇战胜率估计
+# ======================
+import argparse
+import math
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Tuple
+
+from game.Entity.entityfactory import EntityFactory
+from game.Simulation.engine import HeadlessBattle
+from utils import output
+from utils.rng import RNGStream
+
+# 每个任务块的战斗场数：块数与 worker 数无关，
+# 因此同一个种子在不同核数下得到完全相同的结果
+CHUNK_SIZE = 500
+
+
+@dataclass
+class EncounterReport:
+    """
+    遭遇战模拟结果
+    """
+    party: List[str]                  # 玩家模板名
+    monsters: List[str]               # 怪物模板名
+    battles: int = 0                  # 总场数
+    wins: int = 0                     # 玩家胜利场数
+    losses: int = 0                   # 敌人胜利场数
+    draws: int = 0                    # 超过回合上限的场数
+    rounds: Counter = field(default_factory=Counter)  # {回合数: 场数}
+    hp_total: List[int] = field(default_factory=list)  # 各玩家战斗结束时 HP 之和
+    survived: List[int] = field(default_factory=list)  # 各玩家存活场数
+    seed: int = 0                     # 根种子
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.battles if self.battles else 0.0
+
+    def confidence_interval(self, z: float = 1.96) -> Tuple[float, float]:
+        """胜率的 Wilson 置信区间（默认 95%）"""
+        n = self.battles
+        if n == 0:
+            return 0.0, 1.0
+        p = self.wins / n
+        denom = 1 + z * z / n
+        center = (p + z * z / (2 * n)) / denom
+        half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+        return max(0.0, center - half), min(1.0, center + half)
+
+    @property
+    def mean_rounds(self) -> float:
+        return sum(r * c for r, c in self.rounds.items()) / self.battles if self.battles else 0.0
+
+    def rounds_percentile(self, q: float) -> int:
+        """回合数的分位数，q 取 0~1"""
+        target = q * self.battles
+        acc = 0
+        for r in sorted(self.rounds):
+            acc += self.rounds[r]
+            if acc >= target:
+                return r
+        return 0
+
+    def member_stats(self) -> List[Dict]:
+        """各玩家的平均剩余 HP 与存活率"""
+        return [
+            {
+                "name": name,
+                "mean_hp": self.hp_total[i] / self.battles if self.battles else 0.0,
+                "survival_rate": self.survived[i] / self.battles if self.battles else 0.0,
+            }
+            for i, name in enumerate(self.party)
+        ]
+
+    def merge(self, chunk: "EncounterReport"):
+        """合并一个任务块的统计"""
+        self.battles += chunk.battles
+        self.wins += chunk.wins
+        self.losses += chunk.losses
+        self.draws += chunk.draws
+        self.rounds.update(chunk.rounds)
+        if not self.hp_total:
+            self.hp_total = [0] * len(chunk.hp_total)
+            self.survived = [0] * len(chunk.survived)
+        for i, hp in enumerate(chunk.hp_total):
+            self.hp_total[i] += hp
+            self.survived[i] += chunk.survived[i]
+
+    def format(self) -> str:
+        """生成可读的文字报告"""
+        low, high = self.confidence_interval()
+        lines = [
+            f"{' + '.join(self.party)} VS {' + '.join(self.monsters)}（{self.battles} 场，种子 {self.seed}）",
+            f"玩家胜率: {self.win_rate:.2%}  95% 置信区间 [{low:.2%}, {high:.2%}]",
+            f"胜 / 负 / 平: {self.wins} / {self.losses} / {self.draws}",
+            f"回合数: 平均 {self.mean_rounds:.2f}，中位数 {self.rounds_percentile(0.5)}，"
+            f"90% 分位 {self.rounds_percentile(0.9)}，最长 {max(self.rounds, default=0)}",
+        ]
+        for stats in self.member_stats():
+            lines.append(f"  {stats['name']}: 平均剩余 HP {stats['mean_hp']:.2f}，存活率 {stats['survival_rate']:.2%}")
+        return "\n".join(lines)
+
+
+def create_units(party: Sequence[str], monsters: Sequence[str]):
+    """按模板创建参战单位（屏蔽创建角色时的输出）"""
+    with output.redirect(output.NullOutput()):
+        players = [EntityFactory.create_character(name) for name in party]
+        enemies = [EntityFactory.create_monster(name) for name in monsters]
+    return players, enemies
+
+
+def _simulate_chunk(party: Sequence[str], monsters: Sequence[str], battles: int,
+                    rng: RNGStream, max_rounds: int) -> EncounterReport:
+    """
+    在当前进程中模拟一个任务块
+
+    单位只创建一次，每场开始前恢复满 HP / MP，避免重复构造对象
+    """
+    players, enemies = create_units(party, monsters)
+    units = players + enemies
+    report = EncounterReport(list(party), list(monsters), hp_total=[0] * len(players), survived=[0] * len(players))
+
+    for _ in range(battles):
+        for unit in units:
+            unit.HP = unit.MAX_HP
+            unit.MP = unit.MAX_MP
+            if unit.condition_mask:
+                unit.clear_conditions()
+        outcome = HeadlessBattle(players, enemies, rng=rng, max_rounds=max_rounds).run()
+
+        report.battles += 1
+        if outcome.winner == "players":
+            report.wins += 1
+        elif outcome.winner == "enemies":
+            report.losses += 1
+        else:
+            report.draws += 1
+        report.rounds[outcome.rounds] += 1
+        for i, player in enumerate(players):
+            report.hp_total[i] += player.HP
+            if player.HP > 0:
+                report.survived[i] += 1
+    return report
+
+
+def _run_chunk(args) -> EncounterReport:
+    # ProcessPoolExecutor.map 只接受单个参数
+    return _simulate_chunk(*args)
+
+
+def simulate_encounter(party: Sequence[str], monsters: Sequence[str], n: int = 1000, workers: int = None,
+                       seed: int = None, max_rounds: int = 1000) -> EncounterReport:
+    """
+    蒙特卡洛估计遭遇战胜率
+
+    参数：
+    - party: 玩家模板名列表（EntityFactory.CHARACTER_TEMPLATES 的键）
+    - monsters: 怪物模板名列表（EntityFactory.MONSTER_TEMPLATES 的键）
+    - n: 模拟场数
+    - workers: 进程数，None 表示 CPU 核数，1 表示在当前进程中运行
+    - seed: 根种子，相同种子结果完全相同（与 workers 无关）
+    - max_rounds: 单场回合上限
+
+    返回：
+    - EncounterReport
+    """
+    for name in party:
+        if name not in EntityFactory.CHARACTER_TEMPLATES:
+            raise ValueError(f"未知角色模板: {name}")
+    for name in monsters:
+        if name not in EntityFactory.MONSTER_TEMPLATES:
+            raise ValueError(f"未知怪物模板: {name}")
+
+    root = RNGStream(seed)
+    sizes = [min(CHUNK_SIZE, n - start) for start in range(0, n, CHUNK_SIZE)]
+    streams = root.spawn(len(sizes))
+    tasks = [(list(party), list(monsters), size, stream, max_rounds) for size, stream in zip(sizes, streams)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        chunks = map(_run_chunk, tasks)
+        return _merge(party, monsters, root.seed, chunks)
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        return _merge(party, monsters, root.seed, pool.map(_run_chunk, tasks))
+
+
+def _merge(party, monsters, seed, chunks) -> EncounterReport:
+    report = EncounterReport(list(party), list(monsters), seed=seed)
+    for chunk in chunks:
+        report.merge(chunk)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="蒙特卡洛估计遭遇战胜率")
+    parser.add_argument("party", nargs="+", help="玩家模板名，例如 战士 法师")
+    parser.add_argument("--vs", nargs="+", required=True, dest="monsters", help="怪物模板名，例如 哥布林 兽人")
+    parser.add_argument("-n", "--battles", type=int, default=10000, help="模拟场数")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+    parser.add_argument("--max-rounds", type=int, default=1000, help="单场回合上限")
+    args = parser.parse_args(argv)
+
+    report = simulate_encounter(args.party, args.monsters, args.battles, args.workers, args.seed, args.max_rounds)
+    print(report.format())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+# ======================
+# 紧凑的二进制战斗回放（事件溯源）
+# ======================
+import struct
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, Sequence, Union
+
+from game.Simulation.engine import BattleOutcome, CombatEvent, HeadlessBattle
+from game.Simulation.montecarlo import create_units
+from utils.rng import RNGStream
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖：没有时 damage_taken_per_round 退化为纯 Python 扫描
+    np = None
+
+# -----------------------------
+# 文件格式
+# -----------------------------
+# 文件头: MAGIC + 版本(u8) + 玩家数(u16) + 敌人数(u16)，之后每个单位一个 名字长度(u16) + UTF-8 名字 + 初始 HP(i16)
+# 文件体: 定长 12 字节记录的数组，每场战斗为 BEGIN + 若干 ATTACK + END
+#   BEGIN : kind(u8) seed(u64) 3 字节填充
+#   ATTACK: kind(u8) round(u16) attacker(u16) target(u16) roll(u8) damage(i16) target_hp(i16)
+#   END   : kind(u8) winner(u8) rounds(u32) 6 字节填充
+# kind 低 4 位为记录类型，ATTACK 记录的高位另存命中 / 暴击标志
+MAGIC = b"AGRP"
+VERSION = 1
+
+KIND_BEGIN = 1
+KIND_ATTACK = 2
+KIND_END = 3
+FLAG_HIT = 0x10
+FLAG_CRIT = 0x20
+
+_HEADER = struct.Struct("<4sBHH")
+_UNIT = struct.Struct("<H")
+_UNIT_HP = struct.Struct("<h")
+_BEGIN = struct.Struct("<BQ3x")
+_ATTACK = struct.Struct("<BHHHBhh")
+_END = struct.Struct("<BBI6x")
+RECORD_SIZE = _ATTACK.size  # 三种记录等长，文件体可以按定长数组整体扫描
+
+WINNERS = ("draw", "players", "enemies")
+_WINNER_CODES = {name: code for code, name in enumerate(WINNERS)}
+
+if np is not None:
+    RECORD_DTYPE = np.dtype([("kind", "u1"), ("round", "<u2"), ("attacker", "<u2"), ("target", "<u2"),
+                             ("roll", "u1"), ("damage", "<i2"), ("target_hp", "<i2")])
+
+
+class RecordedBattle(NamedTuple):
+    """从回放文件中读出的一场战斗"""
+    seed: int                   # 本场的随机种子
+    events: List[CombatEvent]   # 按发生顺序的攻击事件
+    winner: str                 # "players" / "enemies" / "draw"
+    rounds: int                 # 实际进行的回合数
+
+
+# -----------------------------
+# 写入
+# -----------------------------
+class ReplayWriter:
+    """
+    流式写入战斗回放
+
+    实例本身可作为 HeadlessBattle 的 sink：每个 CombatEvent 打包成 12 字节追加到缓冲区，
+    缓冲区超过 buffer_size 时整块写盘，因此无论战斗多长、录制多少场，内存占用都是常数。
+    一个文件对应一种阵容，可连续录制多场战斗（每场 begin(seed) ... end(outcome)）。
+
+    用法：
+        with ReplayWriter("fight.rpl", ["战士"], ["哥布林", "兽人"]) as writer:
+            record_battle(writer, seed=42)
+    """
+
+    def __init__(self, file: Union[str, BinaryIO], party: Sequence[str], monsters: Sequence[str],
+                 initial_hp: Sequence[int] = None, buffer_size: int = 64 * 1024):
+        self._owns_file = isinstance(file, str)
+        self.file = open(file, "wb") if self._owns_file else file
+        self.party = list(party)
+        self.monsters = list(monsters)
+        self.buffer_size = buffer_size
+        self._buffer = bytearray()
+        self._pack_attack = _ATTACK.pack
+        self._in_battle = False
+
+        if initial_hp is None:
+            players, enemies = create_units(party, monsters)
+            initial_hp = [u.HP for u in players + enemies]
+        if len(initial_hp) != len(self.party) + len(self.monsters):
+            raise ValueError("initial_hp 的长度必须等于单位数")
+        self.initial_hp = list(initial_hp)
+
+        header = bytearray(_HEADER.pack(MAGIC, VERSION, len(self.party), len(self.monsters)))
+        for name, hp in zip(self.party + self.monsters, self.initial_hp):
+            encoded = name.encode("utf-8")
+            header += _UNIT.pack(len(encoded)) + encoded + _UNIT_HP.pack(hp)
+        self.file.write(header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def begin(self, seed: int):
+        """开始录制一场战斗（seed 为 RNGStream 的根种子，须为 64 位无符号整数）"""
+        if self._in_battle:
+            raise RuntimeError("上一场战斗尚未 end()")
+        if not 0 <= seed < 1 << 64:
+            raise ValueError(f"回放只支持 64 位无符号种子: {seed}")
+        self._buffer += _BEGIN.pack(KIND_BEGIN, seed)
+        self._in_battle = True
+
+    def __call__(self, event: CombatEvent):
+        """HeadlessBattle 的 sink：追加一条攻击事件"""
+        kind = KIND_ATTACK | (FLAG_HIT if event.hit else 0) | (FLAG_CRIT if event.crit else 0)
+        self._buffer += self._pack_attack(kind, event.round, event.attacker, event.target, event.roll,
+                                          event.damage, event.target_hp)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def end(self, outcome: BattleOutcome):
+        """结束当前战斗，写入胜负与回合数"""
+        if not self._in_battle:
+            raise RuntimeError("end() 之前必须先 begin()")
+        self._buffer += _END.pack(KIND_END, _WINNER_CODES[outcome.winner], outcome.rounds)
+        self._in_battle = False
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self.file.write(self._buffer)
+            self._buffer.clear()
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        if self._owns_file:
+            self.file.close()
+
+
+def record_battle(writer: ReplayWriter, seed: int = None, max_rounds: int = 1000) -> BattleOutcome:
+    """
+    按 writer 的阵容创建单位，用 RNGStream(seed) 进行一场自动战斗并录制
+
+    由于 HeadlessBattle 与 BattleManager(mode="auto") 逐位一致，
+    录下的也就是同一种子下 BattleManager 自动战斗的全过程
+    """
+    players, enemies = create_units(writer.party, writer.monsters)
+    for unit, hp in zip(players + enemies, writer.initial_hp):
+        unit.HP = hp
+    rng = RNGStream(seed if seed is not None else RNGStream().randint(0, (1 << 64) - 1))
+    writer.begin(rng.seed)
+    outcome = HeadlessBattle(players, enemies, rng=rng, sink=writer, max_rounds=max_rounds).run()
+    writer.end(outcome)
+    return outcome
+
+
+def record_battles(path: str, party: Sequence[str], monsters: Sequence[str], n: int, seed: int = None,
+                   max_rounds: int = 1000) -> int:
+    """
+    连续录制 n 场战斗到 path，各场种子由根种子 seed 确定性派生
+
+    返回根种子
+    """
+    root = RNGStream(seed)
+    with ReplayWriter(path, party, monsters) as writer:
+        for _ in range(n):
+            record_battle(writer, root.randint(0, (1 << 64) - 1), max_rounds)
+    return root.seed
+
+
+# -----------------------------
+# 读取
+# -----------------------------
+class ReplayReader:
+    """
+    流式读取战斗回放
+
+    - battles(): 逐场产出 RecordedBattle，同一时刻只在内存中保留一场
+    - records(): 逐条产出原始记录元组，供自定义扫描
+    - replay() / verify(): 用记录的种子通过引擎重新进行战斗，检查是否与记录一致
+    """
+
+    def __init__(self, file: Union[str, BinaryIO], chunk_records: int = 4096):
+        self._owns_file = isinstance(file, str)
+        self.file = open(file, "rb") if self._owns_file else file
+        self.chunk_records = chunk_records
+
+        magic, self.version, num_players, num_enemies = _HEADER.unpack(self._read_exact(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("不是战斗回放文件")
+        if self.version != VERSION:
+            raise ValueError(f"不支持的回放版本: {self.version}")
+
+        names, self.initial_hp = [], []
+        for _ in range(num_players + num_enemies):
+            (length,) = _UNIT.unpack(self._read_exact(_UNIT.size))
+            names.append(self._read_exact(length).decode("utf-8"))
+            self.initial_hp.append(_UNIT_HP.unpack(self._read_exact(_UNIT_HP.size))[0])
+        self.party = names[:num_players]
+        self.monsters = names[num_players:]
+        self.body_offset = self.file.tell()  # 定长记录区的起始位置
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._owns_file:
+            self.file.close()
+
+    def _read_exact(self, size: int) -> bytes:
+        data = self.file.read(size)
+        if len(data) != size:
+            raise ValueError("回放文件不完整")
+        return data
+
+    def _chunks(self) -> Iterator[bytes]:
+        """从记录区开头起，按块读出整数条记录"""
+        self.file.seek(self.body_offset)
+        size = self.chunk_records * RECORD_SIZE
+        while True:
+            chunk = self.file.read(size)
+            if not chunk:
+                return
+            if len(chunk) % RECORD_SIZE:
+                raise ValueError("回放文件不完整")
+            yield chunk
+
+    def records(self) -> Iterator[tuple]:
+        """逐条产出按 ATTACK 布局解包的原始记录 (kind, round, attacker, target, roll, damage, target_hp)"""
+        for chunk in self._chunks():
+            yield from _ATTACK.iter_unpack(chunk)
+
+    def battles(self) -> Iterator[RecordedBattle]:
+        """逐场产出 RecordedBattle"""
+        seed, events = None, []
+        for chunk in self._chunks():
+            view = memoryview(chunk)
+            for offset in range(0, len(chunk), RECORD_SIZE):
+                kind = chunk[offset] & 0x0F
+                if kind == KIND_ATTACK:
+                    flags, rnd, attacker, target, roll, damage, target_hp = _ATTACK.unpack_from(view, offset)
+                    events.append(CombatEvent(rnd, attacker, target, roll, bool(flags & FLAG_HIT),
+                                              bool(flags & FLAG_CRIT), damage, target_hp))
+                elif kind == KIND_BEGIN:
+                    seed, events = _BEGIN.unpack_from(view, offset)[1], []
+                elif kind == KIND_END:
+                    _, winner, rounds = _END.unpack_from(view, offset)
+                    yield RecordedBattle(seed, events, WINNERS[winner], rounds)
+                    seed, events = None, []
+                else:
+                    raise ValueError(f"未知的记录类型: {kind}")
+
+    def replay(self, battle: RecordedBattle, sink=None, max_rounds: int = 1000) -> BattleOutcome:
+        """
+        用记录的种子重新进行这场战斗
+
+        sink 会收到重放产生的 CombatEvent，可用于驱动动画或逐步展示
+        """
+        players, enemies = create_units(self.party, self.monsters)
+        for unit, hp in zip(players + enemies, self.initial_hp):
+            unit.HP = hp
+        return HeadlessBattle(players, enemies, rng=RNGStream(battle.seed), sink=sink, max_rounds=max_rounds).run()
+
+    def verify(self, battle: RecordedBattle, max_rounds: int = 1000) -> bool:
+        """重放并检查事件序列和结果是否与记录完全一致"""
+        events = []
+        outcome = self.replay(battle, events.append, max_rounds)
+        return events == battle.events and outcome.winner == battle.winner and outcome.rounds == battle.rounds
+
+
+# -----------------------------
+# 分析
+# -----------------------------
+def damage_taken_per_round(reader: ReplayReader) -> List[List[int]]:
+    """
+    统计文件中所有战斗里每个单位在每个回合受到的总伤害
+
+    返回 table[round - 1][unit]；只读记录区，不构造事件对象，
+    有 numpy 时整块按结构化数组扫描
+    """
+    num_units = len(reader.party) + len(reader.monsters)
+    if np is not None:
+        totals = np.zeros((0, num_units), dtype=np.int64)
+        for chunk in reader._chunks():
+            records = np.frombuffer(chunk, dtype=RECORD_DTYPE)
+            records = records[(records["kind"] & 0x0F == KIND_ATTACK) & (records["damage"] > 0)]
+            if records.size == 0:
+                continue
+            rounds = records["round"].astype(np.int64)
+            if rounds.max() > totals.shape[0]:
+                grown = np.zeros((int(rounds.max()), num_units), dtype=np.int64)
+                grown[:totals.shape[0]] = totals
+                totals = grown
+            np.add.at(totals, (rounds - 1, records["target"].astype(np.int64)), records["damage"])
+        return totals.tolist()
+
+    table: List[List[int]] = []
+    for kind, rnd, _, target, _, damage, _ in reader.records():
+        if kind & 0x0F != KIND_ATTACK or damage <= 0:
+            continue
+        while len(table) < rnd:
+            table.append([0] * num_units)
+        table[rnd - 1][target] += damage
+    return table
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+    import time
+
+    path = os.path.join(tempfile.gettempdir(), "aigame_replay.rpl")
+    start = time.perf_counter()
+    record_battles(path, ["战士", "法师"], ["哥布林", "兽人"], n=10000, seed=7)
+    print(f"录制 10000 场: {time.perf_counter() - start:.2f}s，文件 {os.path.getsize(path) / 1024:.1f} KB")
+
+    with ReplayReader(path) as reader:
+        first: Optional[RecordedBattle] = next(reader.battles())
+        print(f"第一场: 种子 {first.seed}，{len(first.events)} 次攻击，{first.winner} 胜，{first.rounds} 回合")
+        print("重放一致:", reader.verify(first))
+
+        start = time.perf_counter()
+        table = damage_taken_per_round(reader)
+        print(f"每回合受到伤害统计: {time.perf_counter() - start:.3f}s")
+        names = reader.party + reader.monsters
+        for rnd, row in enumerate(table[:5], 1):
+            print(f"  回合 {rnd}: " + "，".join(f"{n} {d}" for n, d in zip(names, row)))
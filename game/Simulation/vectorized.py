@@ -0,0 +1,156 @@
+# ======================
+# 结构数组（SoA）向量化战斗模拟
+# ======================
+from collections import Counter
+from typing import NamedTuple, Sequence
+
+import numpy as np
+
+from game.Entity.entity import UNARMED_DICE
+from game.Item.item import EquipmentSlot
+from game.Simulation.montecarlo import EncounterReport, create_units
+from utils.dice import roll_many
+from utils.rng import RNGStream
+
+
+class VectorizedOutcome(NamedTuple):
+    """批量战斗结果，每个数组的第一维是战斗编号"""
+    winner: np.ndarray    # 0 = 平局（超过回合上限），1 = 玩家胜，2 = 敌人胜
+    rounds: np.ndarray    # 各场实际进行的回合数
+    hp: np.ndarray        # 形状 (战斗数, 单位数) 的最终 HP，单位顺序为 玩家 + 敌人
+
+
+class VectorizedBattle:
+    """
+    同时推进成千上万场相同阵容战斗的向量化引擎
+
+    把所有单位的 HP、AC、命中加值、力量修正和伤害骰打包成 NumPy 数组，
+    每一步对所有仍在进行的战斗同时结算“某个单位的一次攻击”
+    （命中骰、暴击、伤害、死亡）。行动顺序和目标选择规则与
+    BattleManager 的 auto 模式 / HeadlessBattle 相同，因此胜率、回合数分布等
+    统计量一致（随机序列不同，结果不逐场相同）。
+
+    参数：
+    - players / enemies: 阵容原型（只读取属性，不会被修改）
+    - battles: 同时模拟的战斗场数
+    - rng: numpy.random.Generator / RNGStream / 整数种子
+    - max_rounds: 回合上限
+    """
+
+    def __init__(self, players, enemies, battles: int, rng=None, max_rounds: int = 1000):
+        units = list(players) + list(enemies)
+        self.num_players = len(players)
+        self.num_units = len(units)
+        self.battles = battles
+        self.max_rounds = max_rounds
+        if isinstance(rng, np.random.Generator):
+            self.gen = rng
+        else:
+            self.gen = (rng if isinstance(rng, RNGStream) else RNGStream(rng)).numpy()
+
+        # 单位静态属性（与 Entity.resolve_attack 的计算方式相同）
+        self.to_hit = np.array([u.to_hit for u in units], dtype=np.int64)
+        self.ac = np.array([u.armor_class for u in units], dtype=np.int64)
+        self.str_mod = np.array([u.damage_bonus for u in units], dtype=np.int64)
+        self.damage_plans = [self._damage_plan(u) for u in units]
+
+        # 可变状态：每场战斗一行
+        self.hp = np.tile(np.array([u.HP for u in units], dtype=np.int64), (battles, 1))
+
+    @staticmethod
+    def _damage_plan(unit):
+        weapon = unit.equipment.get(EquipmentSlot.WEAPON)
+        return weapon.damage_plan if weapon else UNARMED_DICE
+
+    def _attack(self, attacker: int, rows: np.ndarray, low: int, high: int):
+        """
+        rows 中的每场战斗里，attacker 攻击 [low, high) 范围内随机一个存活单位
+        """
+        if rows.size == 0:
+            return
+        hp, gen = self.hp, self.gen
+
+        # 随机目标：给存活单位随机打分，取最大者（等价于在存活单位中均匀选取）
+        keys = gen.random((rows.size, high - low))
+        keys[hp[rows, low:high] <= 0] = -1.0
+        targets = keys.argmax(axis=1) + low
+
+        # 命中骰：d20 + 敏捷 >= AC，或天然 20 暴击
+        d20 = gen.integers(1, 21, size=rows.size)
+        crit = d20 == 20
+        hit = (d20 + self.to_hit[attacker] >= self.ac[targets]) | crit
+        if not hit.any():
+            return
+
+        hit_rows, hit_targets = rows[hit], targets[hit]
+        damage = roll_many(self.damage_plans[attacker], hit_rows.size, crit=crit[hit], rng=gen)
+        damage += self.str_mod[attacker]
+        np.maximum(damage, 0, out=damage)  # 与 Entity.resolve_attack 相同：伤害最低为 0
+        hp[hit_rows, hit_targets] = np.maximum(hp[hit_rows, hit_targets] - damage, 0)
+
+    def run(self) -> VectorizedOutcome:
+        """推进所有战斗直到结束或达到回合上限"""
+        hp = self.hp
+        split = self.num_players
+        rounds = np.zeros(self.battles, dtype=np.int64)
+
+        for _ in range(self.max_rounds):
+            ongoing = (hp[:, :split] > 0).any(axis=1) & (hp[:, split:] > 0).any(axis=1)
+            if not ongoing.any():
+                break
+            rounds += ongoing
+
+            # 玩家回合：存活玩家依次攻击存活敌人
+            for j in range(split):
+                active = ongoing & (hp[:, j] > 0) & (hp[:, split:] > 0).any(axis=1)
+                self._attack(j, np.flatnonzero(active), split, self.num_units)
+
+            # 敌人回合：存活敌人依次攻击存活玩家
+            for k in range(split, self.num_units):
+                active = ongoing & (hp[:, k] > 0) & (hp[:, :split] > 0).any(axis=1)
+                self._attack(k, np.flatnonzero(active), 0, split)
+
+        players_alive = (hp[:, :split] > 0).any(axis=1)
+        enemies_alive = (hp[:, split:] > 0).any(axis=1)
+        winner = np.where(players_alive & ~enemies_alive, 1, np.where(~players_alive, 2, 0))
+        return VectorizedOutcome(winner, rounds, hp)
+
+
+def simulate_encounter_vectorized(party: Sequence[str], monsters: Sequence[str], n: int = 100000,
+                                  seed: int = None, max_rounds: int = 1000,
+                                  batch_size: int = 100000) -> EncounterReport:
+    """
+    用向量化引擎估计遭遇战胜率，参数与返回值同 montecarlo.simulate_encounter
+
+    batch_size 控制每批同时模拟的场数（限制内存占用）
+    """
+    players, enemies = create_units(party, monsters)
+    root = RNGStream(seed)
+    gen = root.numpy()
+
+    report = EncounterReport(list(party), list(monsters), seed=root.seed)
+    for start in range(0, n, batch_size):
+        size = min(batch_size, n - start)
+        outcome = VectorizedBattle(players, enemies, size, gen, max_rounds).run()
+
+        player_hp = outcome.hp[:, :len(players)]
+        report.merge(EncounterReport(
+            list(party), list(monsters),
+            battles=size,
+            wins=int((outcome.winner == 1).sum()),
+            losses=int((outcome.winner == 2).sum()),
+            draws=int((outcome.winner == 0).sum()),
+            rounds=Counter(dict(zip(*(v.tolist() for v in np.unique(outcome.rounds, return_counts=True))))),
+            hp_total=player_hp.sum(axis=0).tolist(),
+            survived=(player_hp > 0).sum(axis=0).tolist(),
+        ))
+    return report
+
+
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    result = simulate_encounter_vectorized(["战士", "法师"], ["哥布林", "兽人"], n=200000, seed=1)
+    print(result.format())
+    print(f"耗时 {time.perf_counter() - start:.2f}s")
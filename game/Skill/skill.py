@@ -1,5 +1,9 @@
+import inspect
 import math
 
+from game.Entity.condition import CONDITIONS
+from utils.profiler import profiled
+
 class Skill:
     """
     技能类 Skill
@@ -14,27 +18,31 @@ class Skill:
     """
 
     def __init__(self, name, effect_func=None, mp_cost=0, target_type="single",
-                 description="", uses_per_battle=None, effect_type="damage"):
+                 description="", uses_per_battle=None, effect_type="damage", blocked_by=()):
         """
         初始化技能
 
         参数：
         - name: 技能名称
-        - effect_func: 技能效果函数，函数签名 effect_func(user, targets)
+        - effect_func: 技能效果函数，函数签名 effect_func(user, targets)，
+                       若额外接受 rng 参数，战斗中会传入 BattleManager 的随机数流
         - mp_cost: 消耗魔力值
         - target_type: 技能目标类型 "single" 或 "all"
         - description: 技能描述，用于 UI / 日志
         - uses_per_battle: 每战可用次数，如果 None 表示无限次
         - effect_type: 技能类型标签，用于 UI / AI 判断，"damage"/"heal"/"buff"/"debuff"
+        - blocked_by: 施法者处于其中任一状态时无法使用，如 ("眩晕", "沉默")
         """
         self.name = name
         self.effect_func = effect_func
+        self._effect_takes_rng = self._accepts_rng(effect_func)
         self.mp_cost = mp_cost
         self.target_type = target_type
         self.description = description
         self.uses_per_battle = uses_per_battle
         self.remaining_uses = None  # 战斗中剩余使用次数
         self.effect_type = effect_type
+        self.blocked_by = CONDITIONS.mask(*(CONDITIONS.flag(c) for c in blocked_by))  # 位掩码
         self.reset_uses()  # 初始化剩余次数
 
     def reset_uses(self):
@@ -45,18 +53,34 @@ class Skill:
         """
         self.remaining_uses = self.uses_per_battle if self.uses_per_battle is not None else float("inf")
 
-    def use(self, user, targets):
+    @staticmethod
+    def _accepts_rng(func):
+        """判断效果函数是否接受 rng 参数（兼容旧的 effect_func(user, targets) 写法）"""
+        if func is None:
+            return False
+        try:
+            params = inspect.signature(func).parameters.values()
+        except (TypeError, ValueError):
+            return False
+        return any(p.name == "rng" or p.kind == p.VAR_KEYWORD for p in params)
+
+    @profiled("skill.use")
+    def use(self, user, targets, rng=None):
         """
         使用技能
 
         参数：
         - user: 施法者对象
         - targets: 技能目标，可以是单个对象或列表
+        - rng: 随机数流（可选），效果函数接受 rng 参数时传入
 
         返回：
         - dict，包含技能使用结果和信息
         """
-        # ---------------- 使用次数 / MP 检查 ----------------
+        # ---------------- 状态 / 使用次数 / MP 检查 ----------------
+        if self.blocked_by and getattr(user, "condition_mask", 0) & self.blocked_by:
+            names = "、".join(CONDITIONS.names(user.condition_mask & self.blocked_by))
+            return {"success": False, "msg": f"{user.name} 处于{names}状态，无法使用 {self.name}！"}
         if self.remaining_uses <= 0:
             return {"success": False, "msg": f"{user.name} 尝试使用 {self.name}，但是已经没有使用次数了！"}
         if getattr(user, "MP", getattr(user, "mp", 0)) < self.mp_cost:
@@ -74,13 +98,18 @@ class Skill:
             return {"success": False, "msg": f"{self.name} 只能对单一目标使用！"}
 
         # ---------------- 执行技能效果 ----------------
-        result = None
-        if self.effect_func:
-            result = self.effect_func(user, targets)  # 调用外部定义的技能效果函数
+        result = self.apply_effect(user, targets, rng) if self.effect_func else None
 
         # 如果没有 effect_func，默认返回成功消息
         return result or {"success": True, "msg": f"{user.name} 使用了 {self.name}"}
 
+    @profiled("skill.effect")
+    def apply_effect(self, user, targets, rng=None):
+        """调用外部定义的技能效果函数"""
+        if rng is not None and self._effect_takes_rng:
+            return self.effect_func(user, targets, rng=rng)
+        return self.effect_func(user, targets)
+
     def get_info(self):
         """
         获取技能信息
@@ -4,6 +4,7 @@ from typing import List
 from game import Item
 from game.Entity.character import Character
 from game.Inventory.inventory import Inventory
+from utils import output
 
 
 class Team:
@@ -30,13 +31,13 @@ class Team:
     def gain_currency(self, currency: int):
         """取得货币"""
         self.currency += currency
-        print(f"💰 队伍获得 {currency} 金币（总计 {self.currency}）")
+        output.emit(f"💰 队伍获得 {currency} 金币（总计 {self.currency}）")
 
     def gain_experience(self, experience: int):
         """取得经验"""
         for member in self.members:
             member.gain_experience(experience)
-            print(f"{member.name} 获得了 {experience} 经验")
+            output.emit(f"{member.name} 获得了 {experience} 经验")
 
     def gain_item(self, item: Item):
         self.inventory.add(item)
@@ -48,11 +49,11 @@ class Team:
             tile = game_map.grid[new_y][new_x]
             if tile.walkable:
                 self.position = (new_x, new_y)
-                print(f"移动到 {self.position}")
+                output.emit(f"移动到 {self.position}")
                 if tile.event:
-                    print("触发事件！")
+                    output.emit("触发事件！")
                     tile.event.trigger(self, tile)
             else:
-                print("这里不能走。")
+                output.emit("这里不能走。")
         else:
-            print("超出地图边界。")
\ No newline at end of file
+            output.emit("超出地图边界。")
\ No newline at end of file
@@ -1,10 +1,12 @@
+import random
+
 from game.Map.map import Map, Tile
 from game.Skill.skill import Skill
 from game.Event.battle import BattleEvent
 from game.Entity.entityfactory import EntityFactory
 from game.Item.item import Weapon, HPPotion
 from game.Team.team import Team
-from utils.dice import roll_detail
+from utils.dice import compile_dice
 
 if __name__ == "__main__":
     # --------------------------
@@ -17,10 +19,10 @@ if __name__ == "__main__":
     # 创建技能
     # --------------------------
     # 单体技能
-    def fireball_damage(user, target):
-        # TODO:优劣势检定
-        dmg_res = roll_detail("2d6")
-        damage = dmg_res.total + (user.INT - 10)//2
+    FIREBALL_DICE = compile_dice("2d6+INT_MOD")
+
+    def fireball_damage(user, target, rng=random.randint):
+        damage = FIREBALL_DICE.roll_total(rng=rng, stats=user)
         target = target[0] if isinstance(target, list) else target
         target.take_damage(damage)
         return damage
@@ -35,15 +37,15 @@ if __name__ == "__main__":
     )
 
     # 群体技能
-    def whirlwind_damage(user, targets):
+    WHIRLWIND_DICE = compile_dice("1d6+STR_MOD")  # 示例伤害
+
+    def whirlwind_damage(user, targets, rng=random.randint):
         # targets 必须是列表
         if not isinstance(targets, list):
             targets = [targets]
         results = []
         for t in targets:
-            # TODO:优劣势检定
-            dmg_res = roll_detail("1d6")  # 示例伤害
-            damage = dmg_res.total + (user.STR - 10)//2
+            damage = WHIRLWIND_DICE.roll_total(rng=rng, stats=user)
             t.take_damage(damage)
             results.append((t, damage))
         return results
@@ -1,7 +1,17 @@
 import random
 import re
 from dataclasses import dataclass
-from typing import List, Callable
+from functools import lru_cache
+from math import comb
+from collections.abc import Mapping
+from typing import List, Callable, Union
+
+from utils.profiler import profiled
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，只有批量掷骰 roll_many 需要
+    np = None
 
 # -----------------------------
 # 骰子表达式的解析规则
@@ -70,41 +80,471 @@ def _parse_notation(dice: str) -> DiceNotation:
     return DiceNotation(num, sides, modifier, normalized)
 
 
+# -----------------------------
+# 扩展语法：多项表达式
+# -----------------------------
+# 在上面单项 "NdS±M" 的基础上，额外支持：
+#   - "2d6+1d4+3"  -> 多个骰子项与常数相加减
+#   - "2d20kh1"    -> 掷 2 个 d20 取最高 1 个（优势）；"k3" 等价于 "kh3"
+#   - "2d20kl1"    -> 掷 2 个 d20 取最低 1 个（劣势）
+#   - "2d6r2"      -> 点数 <= 2 的骰子重掷一次，保留新结果
+#   - "1d8+STR_MOD"-> 引用属性，掷骰时从 stats 中取值；
+#                     "XXX_MOD" 若 stats 中没有，会按 (XXX - 10) // 2 计算
+#
+# 解析时按顺序尝试以下记号：骰子项、整数、属性名、加减号
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<dice>(?i:(\d*)d(\d+|%)((?:k[hl]?\d+|r\d+)*)))(?![A-Za-z0-9_])
+      | (?P<num>\d+)
+      | (?P<stat>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<op>[+-])
+    )""", re.VERBOSE)
+_DICE_OPTION_RE = re.compile(r'(kh|kl|k|r)(\d+)')
+
+
+class DiceTerm:
+    """
+    表达式中的一个骰子项，例如 "2d20kh1"、"-1d4"、"2d6r2"
+    """
+    __slots__ = ("sign", "num", "sides", "keep", "keep_count", "reroll")
+
+    def __init__(self, num: int, sides: int, sign: int = 1,
+                 keep: str = None, keep_count: int = 0, reroll: int = 0):
+        self.sign = sign              # +1 或 -1
+        self.num = num                # 掷骰数量
+        self.sides = sides            # 骰子面数
+        self.keep = keep              # None / "kh"（取最高）/ "kl"（取最低）
+        self.keep_count = keep_count  # 保留的骰子数
+        self.reroll = reroll          # 点数 <= reroll 时重掷一次，0 表示不重掷
+
+    def __str__(self):
+        text = f"{self.num}d{self.sides}"
+        if self.keep:
+            text += f"{self.keep}{self.keep_count}"
+        if self.reroll:
+            text += f"r{self.reroll}"
+        return text
+
+    @property
+    def plain(self) -> bool:
+        """不带取舍 / 重掷的普通骰子项"""
+        return self.keep is None and not self.reroll
+
+    def roll(self, multiplier: int, rng: Callable[[int, int], int]):
+        """
+        掷这一项，multiplier 为暴击时的骰子数量倍数
+
+        返回:
+            (kept, dropped): 保留的点数和被舍弃的点数（均按掷骰顺序）
+        """
+        count = self.num * multiplier
+        sides = self.sides
+        rolls = [rng(1, sides) for _ in range(count)]
+        if self.reroll:
+            reroll = self.reroll
+            rolls = [rng(1, sides) if v <= reroll else v for v in rolls]
+        if self.keep is None:
+            return rolls, []
+
+        # 按点数排序选出要保留的骰子，结果仍保持掷骰顺序
+        order = sorted(range(count), key=rolls.__getitem__, reverse=(self.keep == "kh"))
+        kept_index = set(order[:self.keep_count * multiplier])
+        kept = [v for i, v in enumerate(rolls) if i in kept_index]
+        dropped = [v for i, v in enumerate(rolls) if i not in kept_index]
+        return kept, dropped
+
+    def roll_batch(self, gen, n: int, multiplier: int):
+        """
+        向量化掷这一项 n 次，返回形状 (n, 保留数) 的点数矩阵（需要 numpy）
+
+        带取舍的项返回排序后的保留点数
+        """
+        count = self.num * multiplier
+        rolls = gen.integers(1, self.sides + 1, size=(n, count), dtype=np.int64)
+        if self.reroll:
+            redo = rolls <= self.reroll
+            rolls = np.where(redo, gen.integers(1, self.sides + 1, size=(n, count), dtype=np.int64), rolls)
+        if self.keep is not None:
+            keep_count = self.keep_count * multiplier
+            rolls = np.sort(rolls, axis=1)
+            rolls = rolls[:, count - keep_count:] if self.keep == "kh" else rolls[:, :keep_count]
+        return rolls
+
+    def die_ways(self):
+        """
+        单颗骰子（含重掷）的点数方案数
+
+        返回:
+            (ways, outcomes): ways[v - 1] 为点数 v 的方案数
+        """
+        sides = self.sides
+        if not self.reroll:
+            return (1,) * sides, sides
+        # 第一次 > reroll 直接保留；否则重掷一次，新结果均匀分布
+        reroll = min(self.reroll, sides)
+        return tuple((sides if v > reroll else 0) + reroll for v in range(1, sides + 1)), sides * sides
+
+
+def _resolve_stat(stats, name: str) -> int:
+    """
+    从 stats（字典或实体对象）中取属性引用的值
+    """
+    if stats is not None:
+        if isinstance(stats, Mapping):
+            if name in stats:
+                return int(stats[name])
+        else:
+            value = getattr(stats, name, None)
+            if value is not None:
+                return int(value)
+        # "STR_MOD" 之类：按 DnD 规则由属性值换算修正值
+        if name.endswith("_MOD"):
+            return (_resolve_stat(stats, name[:-4]) - 10) // 2
+    raise ValueError(f"Unknown stat reference: {name!r}")
+
+
+def _parse_expression(dice: str) -> "CompiledDice":
+    """
+    按扩展语法解析骰子表达式，返回 CompiledDice
+    """
+    text = dice.strip()
+    terms: List[DiceTerm] = []
+    stat_refs = []
+    modifier = 0
+
+    pos = 0
+    sign = None           # 当前操作数前面的符号，None 表示没有显式符号
+    started = False       # 是否已经读到过操作数
+    expect_operand = True
+    while pos < len(text):
+        m = _TOKEN_RE.match(text, pos)
+        if not m or m.end() == pos:
+            raise ValueError(f"Invalid dice notation: {dice!r}")
+        pos = m.end()
+
+        if m.group("op"):
+            # 一元符号只允许出现在表达式开头，其余符号必须位于两个操作数之间
+            if expect_operand and (started or sign is not None):
+                raise ValueError(f"Invalid dice notation: {dice!r}")
+            sign = 1 if m.group("op") == "+" else -1
+            expect_operand = True
+            continue
+
+        if not expect_operand:
+            raise ValueError(f"Invalid dice notation: {dice!r}")
+        term_sign = sign if sign is not None else 1
+        sign = None
+        started = True
+        expect_operand = False
+
+        if m.group("dice"):
+            num_text, sides_text, options = m.group(2), m.group(3), m.group(4).lower()
+            num = int(num_text or "1")
+            sides = 100 if sides_text == "%" else int(sides_text)
+            if num <= 0 or sides <= 0:
+                raise ValueError("Number of dice and sides must be >= 1")
+
+            keep, keep_count, reroll = None, 0, 0
+            for opt, value in _DICE_OPTION_RE.findall(options):
+                value = int(value)
+                if opt == "r":
+                    if reroll or value <= 0:
+                        raise ValueError(f"Invalid reroll option in {dice!r}")
+                    reroll = value
+                else:
+                    if keep or not 1 <= value <= num:
+                        raise ValueError(f"Invalid keep option in {dice!r}")
+                    keep, keep_count = ("kl" if opt == "kl" else "kh"), value
+            terms.append(DiceTerm(num, sides, term_sign, keep, keep_count, reroll))
+        elif m.group("num"):
+            modifier += term_sign * int(m.group("num"))
+        else:
+            stat_refs.append((term_sign, m.group("stat")))
+
+    if expect_operand or not terms:
+        raise ValueError(f"Invalid dice notation: {dice!r}")
+
+    # 标准化表示：骰子项按原顺序，其后是属性引用，常数合并到末尾
+    parts = []
+    for term in terms:
+        parts.append(("-" if term.sign < 0 else "+") + str(term))
+    for ref_sign, name in stat_refs:
+        parts.append(("-" if ref_sign < 0 else "+") + name)
+    if modifier:
+        parts.append(f"{'+' if modifier > 0 else ''}{modifier}")
+    normalized = "".join(parts).lstrip("+")
+
+    return CompiledDice(tuple(terms), modifier, tuple(stat_refs), normalized)
+
+
 # -----------------------------
 # 数据结构：骰子结果
 # -----------------------------
-@dataclass
 class DiceResult:
     """
     保存一次掷骰的完整结果
+
+    使用 __slots__ 减少每次掷骰的内存分配；notation / num / sides 直接读取掷骰计划，
+    breakdown 只在第一次访问时才格式化（战斗热路径通常只读 total 或 rolls[0]）。
+    """
+    __slots__ = ("_plan", "modifier", "crit", "dice_rolled", "rolls", "sum", "total", "_terms", "_breakdown")
+
+    def __init__(self, plan, modifier: int, crit: bool, dice_rolled: int,
+                 rolls: List[int], dice_sum: int, total: int, terms=None):
+        self._plan = plan                 # 掷骰计划（CompiledDice）
+        self.modifier = modifier          # 加值/减值（含属性引用）
+        self.crit = crit                  # 是否触发暴击
+        self.dice_rolled = dice_rolled    # 实际掷骰次数（考虑暴击模式后的次数）
+        self.rolls = rolls                # 每次掷骰的具体结果（带取舍时只含保留的骰子）
+        self.sum = dice_sum               # 骰子结果之和（不含修正值）
+        self.total = total                # 最终结果（含修正值和暴击修正）
+        self._terms = terms               # 多项表达式各项的 (符号, 保留, 舍弃)，用于 breakdown
+        self._breakdown = None
+
+    @property
+    def notation(self) -> str:
+        """标准化的骰子表达式，例如 "2d6+1" """
+        return self._plan.normalized
+
+    @property
+    def num(self) -> int:
+        """掷骰数量（未考虑暴击加倍）"""
+        return self._plan.num
+
+    @property
+    def sides(self) -> int:
+        """骰子面数"""
+        return self._plan.sides
+
+    @property
+    def breakdown(self) -> str:
+        """人类可读的运算过程，例如 "(4 + 5) + 2 = 11" """
+        if self._breakdown is None:
+            self._breakdown = self._format_breakdown()
+        return self._breakdown
+
+    def _format_breakdown(self) -> str:
+        modifier = self.modifier
+        if self._terms is None:
+            rolls_part = " + ".join(map(str, self.rolls)) or "0"
+            if modifier != 0:
+                return f"({rolls_part}) {'+' if modifier > 0 else '-'} {abs(modifier)} = {self.total}"
+            return f"({rolls_part}) = {self.total}"
+
+        parts = []
+        for sign, kept, dropped in self._terms:
+            part = " + ".join(map(str, kept))
+            if dropped:
+                part += f", 舍弃 {' '.join(map(str, dropped))}"
+            if parts:
+                parts.append(f"{'+' if sign > 0 else '-'} ({part})")
+            else:
+                parts.append(f"{'-' if sign < 0 else ''}({part})")
+        if modifier != 0:
+            parts.append(f"{'+' if modifier > 0 else '-'} {abs(modifier)}")
+        return f"{' '.join(parts)} = {self.total}"
+
+    def __repr__(self):
+        return (f"DiceResult(notation={self.notation!r}, crit={self.crit}, rolls={self.rolls}, "
+                f"sum={self.sum}, total={self.total})")
+
+
+# -----------------------------
+# 编译后的掷骰计划
+# -----------------------------
+class CompiledDice:
     """
-    notation: str      # 标准化的骰子表达式，例如 "2d6+1"
-    num: int           # 掷骰数量（未考虑暴击加倍）
-    sides: int         # 骰子面数
-    modifier: int      # 加值/减值
-    crit: bool         # 是否触发暴击
-    dice_rolled: int   # 实际掷骰次数（考虑暴击模式后的次数）
-    rolls: List[int]   # 每次掷骰的具体结果
-    sum: int           # 骰子结果之和（不含修正值）
-    total: int         # 最终结果（含修正值和暴击修正）
-    breakdown: str     # 人类可读的运算过程，例如 "(4 + 5) + 2 = 11"
+    预先解析好的骰子表达式（掷骰计划）
+
+    同一个表达式只解析一次，之后每次掷骰直接复用解析结果，
+    适合 Weapon / Entity / 技能效果长期持有，例如：
+        FIREBALL = compile_dice("2d6+INT_MOD")
+        FIREBALL.roll(stats=user).total
+
+    表达式被编译成一棵求值树：根节点依次累加各骰子项（DiceTerm）、
+    属性引用和合并后的常数修正。
+    """
+    __slots__ = ("terms", "stat_refs", "num", "sides", "modifier", "normalized", "simple")
+
+    def __init__(self, terms, modifier: int = 0, stat_refs=(), normalized: str = ""):
+        self.terms = terms              # (DiceTerm, ...)
+        self.stat_refs = stat_refs      # ((符号, 属性名), ...)
+        self.modifier = modifier        # 常数修正之和
+        self.normalized = normalized    # 标准化表示，例如 "2d6+1d4+3"
+
+        # 兼容单项表达式的字段：总骰子数量、首个骰子项的面数
+        self.num = sum(term.num for term in terms)
+        self.sides = terms[0].sides
+
+        # 单个普通骰子项且无属性引用时走快速路径
+        self.simple = len(terms) == 1 and terms[0].plain and terms[0].sign > 0 and not stat_refs
+
+    @classmethod
+    def from_notation(cls, notation: DiceNotation) -> "CompiledDice":
+        """由单项 "NdS±M" 的解析结果构造"""
+        return cls((DiceTerm(notation.num, notation.sides),), notation.modifier, (), notation.normalized)
+
+    def __repr__(self):
+        return f"CompiledDice({self.normalized!r})"
+
+    def stat_bonus(self, stats=None) -> int:
+        """属性引用部分的加值"""
+        return sum(sign * _resolve_stat(stats, name) for sign, name in self.stat_refs)
+
+    @profiled("dice.roll")
+    def roll(
+        self,
+        crit: bool = False,
+        crit_mode: str = "double_dice",
+        rng: Callable[[int, int], int] = random.randint,
+        stats=None
+    ) -> DiceResult:
+        """
+        按本计划掷骰，参数含义与 roll_detail 相同
+        """
+        if not self.simple:
+            return self._roll_terms(crit, crit_mode, rng, stats)
+
+        # 根据暴击模式决定实际掷骰次数
+        if crit and crit_mode == "double_dice":
+            dice_rolled = self.num * 2
+        else:
+            dice_rolled = self.num
+
+        # 实际掷骰，调用 rng(1, sides) 生成结果
+        sides = self.sides
+        rolls = [rng(1, sides) for _ in range(dice_rolled)]
+
+        # 骰子点数和（不含修正）
+        dice_sum = sum(rolls)
+
+        # 最终结果计算
+        if crit and crit_mode == "double_result":
+            # double_result 模式：骰子和加倍后再加修正
+            total = dice_sum * 2 + self.modifier
+        else:
+            # 普通模式：骰子和 + 修正
+            total = dice_sum + self.modifier
+
+        # breakdown 延迟到访问时才格式化
+        return DiceResult(self, self.modifier, crit, dice_rolled, rolls, dice_sum, total)
+
+    def _roll_terms(self, crit, crit_mode, rng, stats) -> DiceResult:
+        """
+        多项表达式的通用求值：逐项掷骰后累加
+        """
+        multiplier = 2 if crit and crit_mode == "double_dice" else 1
+        modifier = self.modifier + self.stat_bonus(stats)
+
+        rolls: List[int] = []
+        terms = []
+        dice_sum = 0
+        dice_rolled = 0
+        for term in self.terms:
+            kept, dropped = term.roll(multiplier, rng)
+            rolls.extend(kept)
+            terms.append((term.sign, kept, dropped))
+            dice_sum += term.sign * sum(kept)
+            dice_rolled += len(kept) + len(dropped)
+
+        if crit and crit_mode == "double_result":
+            total = dice_sum * 2 + modifier
+        else:
+            total = dice_sum + modifier
+
+        return DiceResult(self, modifier, crit, dice_rolled, rolls, dice_sum, total, terms)
+
+    @profiled("dice.roll_total")
+    def roll_total(
+        self,
+        crit: bool = False,
+        crit_mode: str = "double_dice",
+        rng: Callable[[int, int], int] = random.randint,
+        stats=None
+    ) -> int:
+        """
+        只返回最终结果的快速路径，不构造 DiceResult
+        """
+        multiplier = 2 if crit and crit_mode == "double_dice" else 1
+        if self.simple:
+            sides = self.sides
+            dice_sum = 0
+            for _ in range(self.num * multiplier):
+                dice_sum += rng(1, sides)
+            modifier = self.modifier
+        else:
+            dice_sum = 0
+            for term in self.terms:
+                dice_sum += term.sign * sum(term.roll(multiplier, rng)[0])
+            modifier = self.modifier + self.stat_bonus(stats)
+
+        if crit and crit_mode == "double_result":
+            return dice_sum * 2 + modifier
+        return dice_sum + modifier
+
+
+# -----------------------------
+# 编译缓存（有界 LRU）
+# -----------------------------
+# 游戏内容里常用的表达式只有几十个（"1d20"、"1d4"、武器 damage_dice 等），
+# 缓存上限足够容纳它们，又不会因为临时表达式无限增长。
+DICE_CACHE_SIZE = 256
+
+
+@lru_cache(maxsize=DICE_CACHE_SIZE)
+def _compile_cached(dice: str) -> CompiledDice:
+    # 常见的单项表达式沿用原来的正则解析，其余交给扩展语法
+    if _DICE_RE.fullmatch(dice.strip()):
+        return CompiledDice.from_notation(_parse_notation(dice))
+    return _parse_expression(dice)
+
+
+def compile_dice(dice: Union[str, CompiledDice]) -> CompiledDice:
+    """
+    编译骰子表达式，返回可重复使用的 CompiledDice。
+
+    参数:
+        dice (str | CompiledDice): 骰子表达式，已编译的对象原样返回
+
+    返回:
+        CompiledDice: 掷骰计划（相同字符串命中缓存时返回同一个对象）
+    """
+    if isinstance(dice, CompiledDice):
+        return dice
+    return _compile_cached(dice)
+
+
+def dice_cache_info():
+    """
+    返回编译缓存的命中统计，字段为 hits / misses / maxsize / currsize
+    """
+    return _compile_cached.cache_info()
+
+
+def clear_dice_cache():
+    """
+    清空编译缓存（同时重置命中统计）
+    """
+    _compile_cached.cache_clear()
 
 
 # -----------------------------
 # 掷骰函数
 # -----------------------------
 def roll_detail(
-    dice: str,
+    dice: Union[str, CompiledDice],
     crit: bool = False,
     crit_mode: str = "double_dice",
-    rng: Callable[[int, int], int] = random.randint
+    rng: Callable[[int, int], int] = random.randint,
+    stats=None
 ) -> DiceResult:
     """
     掷骰函数，支持不同的暴击规则。
 
     参数:
-        dice (str):
-            骰子表达式，例如 "1d20+5"
+        dice (str | CompiledDice):
+            骰子表达式，例如 "1d20+5"、"2d20kh1+DEX_MOD"，
+            也可以直接传入 compile_dice 的结果
         crit (bool):
             是否暴击，默认 False
         crit_mode (str):
@@ -116,53 +556,339 @@ def roll_detail(
         rng (callable):
             随机数生成函数，默认 random.randint
             可以替换为可控 RNG 以便测试
+        stats (dict | object):
+            表达式中属性引用（如 "STR_MOD"）的取值来源，可以是字典或实体对象
 
     返回:
         DiceResult: 掷骰结果的详细信息
     """
-    # 解析骰子表达式
-    notation = _parse_notation(dice)
+    # 解析骰子表达式（命中缓存时不再重复解析）
+    return compile_dice(dice).roll(crit, crit_mode, rng, stats)
 
-    # 根据暴击模式决定实际掷骰次数
-    if crit and crit_mode == "double_dice":
-        dice_rolled = notation.num * 2
-    else:
-        dice_rolled = notation.num
+def roll_total(
+    dice: Union[str, CompiledDice],
+    crit: bool = False,
+    crit_mode: str = "double_dice",
+    rng: Callable[[int, int], int] = random.randint,
+    stats=None
+) -> int:
+    """
+    只需要最终结果时使用的快速掷骰，参数与 roll_detail 相同
 
-    # 实际掷骰，调用 rng(1, sides) 生成结果
-    rolls = [rng(1, notation.sides) for _ in range(dice_rolled)]
+    返回:
+        int: 最终结果（含修正值和暴击修正）
+    """
+    return compile_dice(dice).roll_total(crit, crit_mode, rng, stats)
 
-    # 骰子点数和（不含修正）
-    dice_sum = sum(rolls)
 
-    # 最终结果计算
-    if crit and crit_mode == "double_result":
-        # double_result 模式：骰子和加倍后再加修正
-        total = dice_sum * 2 + notation.modifier
+# -----------------------------
+# 批量掷骰（NumPy 向量化）
+# -----------------------------
+def roll_many(
+    dice: Union[str, CompiledDice],
+    n: int,
+    crit=False,
+    crit_mode: str = "double_dice",
+    rng=None,
+    return_rolls: bool = False,
+    stats=None
+):
+    """
+    一次性进行 n 次相互独立的掷骰，用于蒙特卡洛模拟等大批量场景。
+
+    参数:
+        dice (str | CompiledDice):
+            骰子表达式，例如 "1d8+3"
+        n (int):
+            掷骰次数（结果行数）
+        crit (bool | array-like):
+            是否暴击；可以是单个布尔值，也可以是长度为 n 的布尔数组（逐行暴击）
+        crit_mode (str):
+            暴击模式，与 roll_detail 相同（"double_dice" / "double_result"）
+        rng (numpy.random.Generator | RNGStream | int | None):
+            NumPy 随机数生成器、utils.rng.RNGStream 或种子，None 表示使用新的默认生成器
+        return_rolls (bool):
+            是否同时返回每颗骰子的点数
+        stats (dict | object):
+            属性引用的取值来源，与 roll_detail 相同
+
+    返回:
+        numpy.ndarray: 形状 (n,) 的最终结果
+        若 return_rolls=True，返回 (totals, rolls)，rolls 形状为 (n, 最大掷骰数)，
+        double_dice 模式下未暴击的行多出来的列记为 0；带取舍的骰子项只返回保留的点数（已排序）
+    """
+    if np is None:
+        raise ImportError("roll_many 需要 numpy，请先 pip install numpy")
+    if n < 0:
+        raise ValueError("n must be >= 0")
+
+    plan = compile_dice(dice)
+    if isinstance(rng, np.random.Generator):
+        gen = rng
+    elif hasattr(rng, "numpy"):
+        gen = rng.numpy()
     else:
-        # 普通模式：骰子和 + 修正
-        total = dice_sum + notation.modifier
+        gen = np.random.default_rng(rng)
+
+    # 逐行暴击掩码
+    crit_mask = np.broadcast_to(np.asarray(crit, dtype=bool), (n,))
+    any_crit = bool(crit_mask.any())
+    split_crit = any_crit and crit_mode == "double_dice"
 
-    # 构造人类可读的 breakdown 字符串
-    rolls_part = " + ".join(map(str, rolls)) or "0"
-    if notation.modifier != 0:
-        breakdown = f"({rolls_part}) {'+' if notation.modifier > 0 else '-'} {abs(notation.modifier)} = {total}"
+    if plan.simple:
+        # double_dice 模式：有暴击行时多掷一倍的列，未暴击的行清零
+        cols = plan.num
+        if split_crit:
+            cols = plan.num * 2
+        rolls = gen.integers(1, plan.sides + 1, size=(n, cols), dtype=np.int64)
+        if cols > plan.num:
+            rolls[~crit_mask, plan.num:] = 0
+
+        # 骰子点数和（不含修正）
+        sums = rolls.sum(axis=1)
     else:
-        breakdown = f"({rolls_part}) = {total}"
-
-    # 返回结果对象
-    return DiceResult(
-        notation=notation.normalized,
-        num=notation.num,
-        sides=notation.sides,
-        modifier=notation.modifier,
-        crit=crit,
-        dice_rolled=dice_rolled,
-        rolls=rolls,
-        sum=dice_sum,
-        total=total,
-        breakdown=breakdown,
-    )
+        # 多项表达式：逐项向量化求值；double_dice 下暴击行与普通行分开掷
+        crit_rows = np.flatnonzero(crit_mask) if split_crit else None
+        normal_rows = np.flatnonzero(~crit_mask) if split_crit else None
+        sums = np.zeros(n, dtype=np.int64)
+        parts = []
+        for term in plan.terms:
+            if split_crit:
+                normal = term.roll_batch(gen, len(normal_rows), 1)
+                kept = np.zeros((n, normal.shape[1] * 2), dtype=np.int64)
+                kept[normal_rows, :normal.shape[1]] = normal
+                kept[crit_rows] = term.roll_batch(gen, len(crit_rows), 2)
+            else:
+                kept = term.roll_batch(gen, n, 1)
+            sums += term.sign * kept.sum(axis=1)
+            parts.append(kept)
+        rolls = np.concatenate(parts, axis=1)
+
+    # double_result 模式：暴击行的点数和加倍
+    if any_crit and crit_mode == "double_result":
+        sums = np.where(crit_mask, sums * 2, sums)
+
+    totals = sums + plan.modifier
+    if plan.stat_refs:
+        totals += plan.stat_bonus(stats)
+    if return_rolls:
+        return totals, rolls
+    return totals
+
+
+# -----------------------------
+# 精确概率分布
+# -----------------------------
+class DiceDistribution:
+    """
+    骰子结果的精确概率分布
+
+    以整数方案数保存：ways[i] 表示结果为 low + i 的方案数，
+    概率 = ways[i] / outcomes，不做任何随机抽样。
+    """
+    __slots__ = ("low", "ways", "outcomes", "_cumulative")
+
+    def __init__(self, low: int, ways, outcomes: int):
+        self.low = low                # 最小可能结果
+        self.ways = tuple(ways)       # 各结果的方案数（可能含 0，例如加倍后的奇数点）
+        self.outcomes = outcomes      # 总方案数
+        self._cumulative = None       # 累积方案数，首次查询 CDF 时计算
+
+    def __repr__(self):
+        return f"DiceDistribution({self.min}..{self.max}, mean={self.mean:.3f})"
+
+    @property
+    def min(self) -> int:
+        return self.low
+
+    @property
+    def max(self) -> int:
+        return self.low + len(self.ways) - 1
+
+    def pmf(self, k: int) -> float:
+        """P(total == k)"""
+        i = k - self.low
+        if 0 <= i < len(self.ways):
+            return self.ways[i] / self.outcomes
+        return 0.0
+
+    def _ways_at_most(self, k: int) -> int:
+        """结果 <= k 的方案数（整数，保证精确）"""
+        i = k - self.low
+        if i < 0:
+            return 0
+        if i >= len(self.ways):
+            return self.outcomes
+        if self._cumulative is None:
+            acc, cumulative = 0, []
+            for w in self.ways:
+                acc += w
+                cumulative.append(acc)
+            self._cumulative = cumulative
+        return self._cumulative[i]
+
+    def cdf(self, k: int) -> float:
+        """P(total <= k)"""
+        return self._ways_at_most(k) / self.outcomes
+
+    def prob_at_least(self, k: int) -> float:
+        """P(total >= k)，例如命中检定 "d20 + 加值 >= AC" 的概率"""
+        return (self.outcomes - self._ways_at_most(k - 1)) / self.outcomes
+
+    @property
+    def mean(self) -> float:
+        return sum((self.low + i) * w for i, w in enumerate(self.ways)) / self.outcomes
+
+    @property
+    def variance(self) -> float:
+        mean = self.mean
+        return sum(((self.low + i) - mean) ** 2 * w for i, w in enumerate(self.ways)) / self.outcomes
+
+    def items(self):
+        """按结果从小到大返回 [(total, probability)]，跳过概率为 0 的结果"""
+        return [(self.low + i, w / self.outcomes) for i, w in enumerate(self.ways) if w]
+
+    def shift(self, offset: int) -> "DiceDistribution":
+        """整体平移，例如加上属性修正"""
+        return DiceDistribution(self.low + offset, self.ways, self.outcomes)
+
+
+@lru_cache(maxsize=DICE_CACHE_SIZE)
+def _sum_ways(num: int, sides: int):
+    """
+    num 个 sides 面骰子点数和的方案数（下标 0 对应点数和 num）
+
+    逐颗卷积，每一步用前缀和做滑动窗口，复杂度 O(num^2 * sides)
+    """
+    ways = [1]
+    for _ in range(num):
+        prefix = [0]
+        for w in ways:
+            prefix.append(prefix[-1] + w)
+        size = len(ways) + sides - 1
+        ways = [prefix[min(j + 1, len(ways))] - prefix[max(j - sides + 1, 0)] for j in range(size)]
+    return tuple(ways)
+
+
+def _convolve(a, b):
+    """两个方案数序列的卷积（对应两个独立结果相加）"""
+    out = [0] * (len(a) + len(b) - 1)
+    for i, x in enumerate(a):
+        if x:
+            for j, y in enumerate(b):
+                out[i + j] += x * y
+    return out
+
+
+def _keep_ways(die_ways, count: int, keep_count: int, highest: bool):
+    """
+    count 颗骰子取最高 / 最低 keep_count 颗时，保留点数和的方案数
+
+    按点数从高到低（取最低时从低到高）逐个面分配骰子数量，
+    状态为 (已分配骰子数, 保留点数和)，用多项式系数累计方案数。
+
+    返回:
+        {保留点数和: 方案数}
+    """
+    faces = [(v + 1, w) for v, w in enumerate(die_ways) if w]
+    if highest:
+        faces.reverse()
+
+    states = {(0, 0): 1}
+    for value, w in faces:
+        next_states = {}
+        for (assigned, total), ways in states.items():
+            kept_so_far = min(assigned, keep_count)
+            for c in range(count - assigned + 1):
+                key = (assigned + c, total + value * min(c, keep_count - kept_so_far))
+                next_states[key] = next_states.get(key, 0) + ways * comb(count - assigned, c) * w ** c
+        states = next_states
+    return {total: ways for (assigned, total), ways in states.items() if assigned == count}
+
+
+def _term_distribution(term: DiceTerm, multiplier: int):
+    """
+    单个骰子项的分布（不含符号）
+
+    返回:
+        (low, ways, outcomes)
+    """
+    count = term.num * multiplier
+    if term.plain:
+        return count, _sum_ways(count, term.sides), term.sides ** count
+
+    die_ways, die_outcomes = term.die_ways()
+    if term.keep is None:
+        ways = [1]
+        for _ in range(count):
+            ways = _convolve(ways, die_ways)
+        return count, ways, die_outcomes ** count
+
+    by_total = _keep_ways(die_ways, count, term.keep_count * multiplier, term.keep == "kh")
+    low = min(by_total)
+    ways = [0] * (max(by_total) - low + 1)
+    for total, w in by_total.items():
+        ways[total - low] = w
+    return low, ways, die_outcomes ** count
+
+
+@lru_cache(maxsize=DICE_CACHE_SIZE)
+def _distribution_cached(normalized: str, crit: bool, crit_mode: str) -> DiceDistribution:
+    plan = compile_dice(normalized)
+
+    # 暴击模式与 CompiledDice.roll 保持一致
+    multiplier = 2 if crit and crit_mode == "double_dice" else 1
+
+    # 各骰子项的分布逐项卷积（减号项翻转后参与）
+    low, ways, outcomes = 0, [1], 1
+    for term in plan.terms:
+        term_low, term_ways, term_outcomes = _term_distribution(term, multiplier)
+        if term.sign < 0:
+            term_low, term_ways = -(term_low + len(term_ways) - 1), term_ways[::-1]
+        low += term_low
+        ways = _convolve(ways, term_ways) if len(ways) > 1 else [ways[0] * w for w in term_ways]
+        outcomes *= term_outcomes
+
+    if crit and crit_mode == "double_result":
+        # 点数和加倍：结果只落在偶数上，中间补 0
+        doubled = [0] * (len(ways) * 2 - 1)
+        doubled[::2] = ways
+        return DiceDistribution(low * 2 + plan.modifier, doubled, outcomes)
+    return DiceDistribution(low + plan.modifier, ways, outcomes)
+
+
+def dice_distribution(
+    dice: Union[str, CompiledDice],
+    crit: bool = False,
+    crit_mode: str = "double_dice",
+    stats=None
+) -> DiceDistribution:
+    """
+    计算骰子表达式最终结果的精确分布（带缓存）
+
+    参数与 roll_detail 相同，但不掷骰，例如：
+        dice_distribution("1d20+3").prob_at_least(15)  # 1d20+3 达到 AC 15 的概率
+        dice_distribution("2d20kh1+DEX_MOD", stats=hero)  # 优势检定
+    """
+    plan = compile_dice(dice)
+    dist = _distribution_cached(plan.normalized, bool(crit), crit_mode)
+    if plan.stat_refs:
+        # 属性引用只是整体平移，缓存中保存的是不含属性的分布
+        dist = dist.shift(plan.stat_bonus(stats))
+    return dist
+
+
+def expected_value(dice: Union[str, CompiledDice], crit: bool = False, crit_mode: str = "double_dice",
+                   stats=None) -> float:
+    """骰子表达式的期望值"""
+    return dice_distribution(dice, crit, crit_mode, stats).mean
+
+
+def prob_at_least(dice: Union[str, CompiledDice], k: int, crit: bool = False, crit_mode: str = "double_dice",
+                  stats=None) -> float:
+    """P(结果 >= k)"""
+    return dice_distribution(dice, crit, crit_mode, stats).prob_at_least(k)
+
 
 if __name__ == "__main__":
     # 1. 普通掷骰：2d6+3
@@ -207,3 +933,30 @@ if __name__ == "__main__":
     print("点数和:", result4.sum)
     print("最终结果:", result4.total)
     print("过程说明:", result4.breakdown)
+    print()
+
+    # 5. 编译缓存命中统计
+    print("📦 编译缓存:", dice_cache_info())
+
+    # 6. 只要结果的快速掷骰
+    print("⚡ roll_total 2d6+3:", roll_total("2d6+3"))
+    print()
+
+    # 7. 精确分布（不掷骰）
+    dist = dice_distribution("2d6+3")
+    print("📈 2d6+3 精确分布:", dist, "方差", round(dist.variance, 3))
+    print("   1d20+3 达到 AC 15 的概率:", prob_at_least("1d20+3", 15))
+    print()
+
+    # 8. 扩展语法：多项、取舍、重掷、属性引用
+    result5 = roll_detail("2d20kh1+1d4+DEX_MOD", stats={"DEX": 14})
+    print("🧮 扩展语法:", result5.notation)
+    print("每次结果:", result5.rolls)
+    print("过程说明:", result5.breakdown)
+    print("   4d6kh3 期望:", round(expected_value("4d6kh3"), 4))
+    print()
+
+    # 9. 批量掷骰（需要 numpy）
+    if np is not None:
+        totals = roll_many("1d8+2", 100000, crit=True, crit_mode="double_result", rng=42)
+        print("🎲 批量掷骰 1d8+2 x100000 (double_result):", "均值", round(float(totals.mean()), 3))
@@ -0,0 +1,242 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List
+
+from utils import output
+
+# 日志级别（与标准库 logging 的数值一致）
+DEBUG = 10
+INFO = 20
+WARNING = 30
+OFF = 100
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING"}
+
+
+# -----------------------------
+# 日志记录
+# -----------------------------
+class LogRecord:
+    """
+    一条结构化日志
+
+    只保存模板和字段，message 在第一次被读取时才格式化（之后缓存），
+    没有任何接收方读取时完全不产生字符串拼接的开销
+    """
+    __slots__ = ("level", "event", "template", "fields", "created", "_message")
+
+    def __init__(self, level: int, event: str, template: str, fields: Dict):
+        self.level = level
+        self.event = event          # 事件类型，例如 "round" / "status" / "victory"
+        self.template = template    # str.format 模板，引用 fields 中的字段
+        self.fields = fields
+        self.created = time.time()
+        self._message = None
+
+    @property
+    def message(self) -> str:
+        if self._message is None:
+            self._message = self.template.format(**self.fields) if self.fields else self.template
+        return self._message
+
+    def to_dict(self) -> Dict:
+        """结构化输出（JSON Lines 等）"""
+        return {"time": self.created, "level": LEVEL_NAMES.get(self.level, self.level), "event": self.event,
+                **self.fields, "msg": self.message}
+
+    def __repr__(self):
+        return f"LogRecord({self.event!r}, {self.message!r})"
+
+
+# -----------------------------
+# 接收方
+# -----------------------------
+class Sink:
+    """接收方基类：level 以上的记录才会交给 emit"""
+
+    def __init__(self, level: int = INFO):
+        self.level = level
+
+    def emit(self, record: LogRecord):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ConsoleSink(Sink):
+    """
+    输出到控制台（与原来 log_msg 的默认行为相同）
+
+    不指定 stream 时经由全局输出端 utils.output，输出端为 NullOutput 时不格式化
+    """
+
+    def __init__(self, level: int = INFO, stream=None):
+        super().__init__(level)
+        self.stream = stream
+
+    def emit(self, record):
+        if self.stream is not None:
+            print(record.message, file=self.stream)
+        elif output.enabled:
+            output.emit(record.message)
+
+
+class CallbackSink(Sink):
+    """把格式化后的文本交给回调函数，用于前端 / 界面（即原来的 log_callback）"""
+
+    def __init__(self, callback: Callable[[str], None], level: int = INFO):
+        super().__init__(level)
+        self.callback = callback
+
+    def emit(self, record):
+        self.callback(record.message)
+
+
+class AsyncFileSink(Sink):
+    """
+    异步写文件
+
+    emit 只把记录放进队列，格式化和写盘都在后台线程中完成，战斗循环不等待磁盘 IO。
+    fmt="text" 每行一条消息，fmt="json" 每行一个 JSON 对象（带事件类型和字段）。
+    """
+
+    _STOP = object()
+
+    def __init__(self, path: str, level: int = DEBUG, fmt: str = "text"):
+        super().__init__(level)
+        if fmt not in ("text", "json"):
+            raise ValueError(f"未知的日志格式: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._writer, name=f"log-writer:{path}", daemon=True)
+        self._thread.start()
+
+    def emit(self, record):
+        self._queue.put(record)
+
+    def _writer(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                record = self._queue.get()
+                if record is self._STOP:
+                    break
+                lines = [record]
+                # 一次取完队列中已有的记录，合并成一次写入
+                while True:
+                    try:
+                        record = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if record is self._STOP:
+                        self._write(f, lines)
+                        return
+                    lines.append(record)
+                self._write(f, lines)
+
+    def _write(self, f, records: List[LogRecord]):
+        if self.fmt == "json":
+            f.write("".join(json.dumps(r.to_dict(), ensure_ascii=False) + "\n" for r in records))
+        else:
+            f.write("".join(r.message + "\n" for r in records))
+        f.flush()
+
+    def close(self):
+        """写完队列中剩余的记录后关闭文件"""
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+
+
+# -----------------------------
+# 日志器
+# -----------------------------
+class BattleLogger:
+    """
+    惰性、按级别过滤的结构化日志
+
+    - log(level, event, template, **fields)：低于所有接收方和环形缓冲区级别的记录直接丢弃，
+      连 LogRecord 都不创建；否则只保存模板和字段，由接收方决定是否格式化
+    - 最近 capacity 条记录保存在固定长度的环形缓冲区中（代替原来无限增长的列表）
+    - enabled_for(level) 供调用方在构造开销较大的日志（如整队状态）之前先判断
+
+    用法：
+        logger = BattleLogger(sinks=[ConsoleSink(INFO), AsyncFileSink("battle.log", DEBUG, fmt="json")])
+        logger.info("round", "--- 回合 {round} ---", round=3)
+    """
+
+    def __init__(self, sinks: List[Sink] = None, capacity: int = 1000, buffer_level: int = INFO):
+        self.sinks: List[Sink] = list(sinks or [])
+        self.buffer = deque(maxlen=capacity)
+        self.buffer_level = buffer_level
+        self._update_level()
+
+    def _update_level(self):
+        self.level = min([self.buffer_level] + [s.level for s in self.sinks])
+
+    def add_sink(self, sink: Sink):
+        self.sinks.append(sink)
+        self._update_level()
+
+    def remove_sink(self, sink: Sink):
+        self.sinks.remove(sink)
+        self._update_level()
+
+    def set_buffer_level(self, level: int):
+        self.buffer_level = level
+        self._update_level()
+
+    def enabled_for(self, level: int) -> bool:
+        return level >= self.level
+
+    def log(self, level: int, event: str, template: str, **fields):
+        if level < self.level:
+            return
+        record = LogRecord(level, event, template, fields)
+        if level >= self.buffer_level:
+            self.buffer.append(record)
+        for sink in self.sinks:
+            if level >= sink.level:
+                sink.emit(record)
+
+    def debug(self, event: str, template: str, **fields):
+        self.log(DEBUG, event, template, **fields)
+
+    def info(self, event: str, template: str, **fields):
+        self.log(INFO, event, template, **fields)
+
+    def warning(self, event: str, template: str, **fields):
+        self.log(WARNING, event, template, **fields)
+
+    def records(self, event: str = None) -> List[LogRecord]:
+        """环形缓冲区中的记录，可按事件类型过滤"""
+        return [r for r in self.buffer if event is None or r.event == event]
+
+    def messages(self) -> List[str]:
+        """环形缓冲区中记录的文本"""
+        return [r.message for r in self.buffer]
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+
+    path = os.path.join(tempfile.gettempdir(), "battle_log_demo.jsonl")
+    file_sink = AsyncFileSink(path, DEBUG, fmt="json")
+    logger = BattleLogger(sinks=[ConsoleSink(INFO), file_sink], capacity=3)
+    logger.info("round", "--- 回合 {round} ---", round=1)
+    logger.debug("roll", "d20 = {roll}", roll=17)          # 控制台不显示，只写文件
+    logger.info("status", "{name}: {hp}/{max_hp} HP", name="战士", hp=25, max_hp=30)
+    logger.close()
+    print("环形缓冲区:", logger.messages())
+    with open(path, encoding="utf-8") as f:
+        print(f.read())
+    os.remove(path)
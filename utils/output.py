@@ -0,0 +1,123 @@
+# ======================
+# 全局输出：游戏模块的提示信息统一经由这里，而不是直接 print
+# ======================
+import contextlib
+import sys
+from typing import Callable, List
+
+# 用法：
+#     from utils import output
+#     output.emit(f"{name} 装备了 {item}")
+#     if output.enabled:                 # 热路径上先判断，关闭输出时连字符串都不拼
+#         output.emit(f"...")
+#
+#     with output.redirect(output.NullOutput()):   # 批量模拟：丢弃所有输出
+#         ...
+#     output.set_sink(output.CallbackOutput(ui.show))  # 前端：交给界面显示
+
+
+# -----------------------------
+# 输出端
+# -----------------------------
+class Output:
+    """输出端基类"""
+
+    def write(self, msg: str):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+
+class ConsoleOutput(Output):
+    """逐行打印到控制台（默认，与原来的 print 相同）"""
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write(self, msg):
+        print(msg, file=self.stream or sys.stdout)
+
+
+class NullOutput(Output):
+    """丢弃所有输出，用于批量模拟；设为当前输出端时 enabled 为 False"""
+
+    def write(self, msg):
+        pass
+
+
+class BufferedOutput(Output):
+    """
+    攒够 capacity 行再一次写出，用于命令行批处理
+
+    等待用户输入前需要 flush（output.prompt 会自动处理）
+    """
+
+    def __init__(self, stream=None, capacity: int = 256):
+        self.stream = stream
+        self.capacity = capacity
+        self.lines: List[str] = []
+
+    def write(self, msg):
+        self.lines.append(msg)
+        if len(self.lines) >= self.capacity:
+            self.flush()
+
+    def flush(self):
+        if self.lines:
+            stream = self.stream or sys.stdout
+            stream.write("\n".join(self.lines) + "\n")
+            stream.flush()
+            self.lines.clear()
+
+
+class CallbackOutput(Output):
+    """把每条消息交给回调函数，用于 pygame 等前端"""
+
+    def __init__(self, callback: Callable[[str], None]):
+        self.callback = callback
+
+    def write(self, msg):
+        self.callback(msg)
+
+
+# -----------------------------
+# 当前输出端
+# -----------------------------
+sink: Output = ConsoleOutput()
+enabled = True  # 当前输出端是否会使用消息（NullOutput 时为 False）
+
+
+def emit(msg: str):
+    """输出一条提示信息"""
+    sink.write(msg)
+
+
+def set_sink(new: Output) -> Output:
+    """替换当前输出端，返回原来的输出端"""
+    global sink, enabled
+    old = sink
+    old.flush()
+    sink = new
+    enabled = not isinstance(new, NullOutput)
+    return old
+
+
+@contextlib.contextmanager
+def redirect(new: Output):
+    """在 with 块内使用 new 作为输出端，结束后刷新并恢复"""
+    old = set_sink(new)
+    try:
+        yield new
+    finally:
+        set_sink(old)
+
+
+def flush():
+    sink.flush()
+
+
+def prompt(text: str = "") -> str:
+    """等待用户输入（先把缓冲中的输出写出）"""
+    sink.flush()
+    return input(text)
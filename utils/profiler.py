@@ -0,0 +1,255 @@
+import functools
+import inspect
+import marshal
+from contextvars import ContextVar
+from time import perf_counter_ns
+from typing import Dict, List, Optional, Tuple
+
+
+# -----------------------------
+# 分阶段计时
+# -----------------------------
+class Profiler:
+    """
+    分阶段计时注册表
+
+    以“阶段名”为单位记录调用次数、累计耗时（含子阶段）和自身耗时（不含子阶段），单位纳秒。
+    计时点有两种：
+    - 用 @profiled("阶段名") 标记的方法：关闭时类上就是原函数，没有任何额外开销；
+      enable() 时才把它们替换成计时包装，disable() 时还原
+    - with PROFILER.section("阶段名"): 用于非方法的代码块，关闭时返回一个空操作的上下文
+
+    嵌套栈保存在 ContextVar 中：同一事件循环上交错执行的多个 asyncio 任务各有各的栈，
+    await 期间切到别的任务不会把子阶段耗时记到错误的父阶段上
+
+    用法：
+        with PROFILER:                       # 等价于 enable() ... disable()
+            battle.start_battle()
+        print(PROFILER.report())
+        PROFILER.dump_stats("battle.prof")   # 可用 pstats / snakeviz 查看
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stats: Dict[str, List[int]] = {}          # {阶段: [调用次数, 累计 ns, 自身 ns]}
+        self.callers: Dict[Tuple[str, str], List[int]] = {}  # {(父阶段, 阶段): [调用次数, 累计 ns, 自身 ns]}
+        # 当前上下文的栈顶 [阶段, 子阶段耗时, 父帧]；每个 asyncio 任务有独立的一份
+        self._stack: ContextVar[Optional[list]] = ContextVar(f"profiler_stack_{id(self)}", default=None)
+        self._hooks: List[tuple] = []                    # [(类, 方法名, 原函数, 阶段)]
+        self._locations: Dict[str, Tuple[str, int]] = {}  # {阶段: (文件, 行号)}，用于 pstats 导出
+
+    # ---------- 开关 ----------
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    def enable(self):
+        """开启计时：把所有登记的方法替换为计时包装"""
+        if self.enabled:
+            return
+        self.enabled = True
+        for owner, name, func, phase in self._hooks:
+            setattr(owner, name, self._wrap(func, phase))
+
+    def disable(self):
+        """关闭计时：还原所有原函数（已记录的数据保留）"""
+        if not self.enabled:
+            return
+        self.enabled = False
+        for owner, name, func, _ in self._hooks:
+            setattr(owner, name, func)
+
+    def reset(self):
+        self.stats.clear()
+        self.callers.clear()
+        self._stack.set(None)
+
+    def register(self, owner, name: str, func, phase: str):
+        """登记一个可计时的方法（由 @profiled 在类创建时调用）"""
+        self._hooks.append((owner, name, func, phase))
+        code = getattr(func, "__code__", None)
+        self._locations.setdefault(phase, (code.co_filename, code.co_firstlineno) if code else ("~", 0))
+        if self.enabled:
+            setattr(owner, name, self._wrap(func, phase))
+
+    # ---------- 计时 ----------
+    def _enter(self, phase: str):
+        self._stack.set([phase, 0, self._stack.get()])
+        return perf_counter_ns()
+
+    def _exit(self, phase: str, start: int):
+        elapsed = perf_counter_ns() - start
+        top, children, parent = self._stack.get()
+        assert top == phase, f"计时阶段嵌套错乱：结束 {phase}，栈顶却是 {top}"
+        self._stack.set(parent)
+        own = elapsed - children
+        entry = self.stats.get(phase)
+        if entry is None:
+            entry = self.stats[phase] = [0, 0, 0]
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] += own
+        if parent is not None:
+            parent[1] += elapsed
+            edge = self.callers.get((parent[0], phase))
+            if edge is None:
+                edge = self.callers[(parent[0], phase)] = [0, 0, 0]
+            edge[0] += 1
+            edge[1] += elapsed
+            edge[2] += own
+
+    def _wrap(self, func, phase: str):
+        enter, exit_ = self._enter, self._exit
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def timed(*args, **kwargs):
+                start = enter(phase)
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    exit_(phase, start)
+        else:
+            @functools.wraps(func)
+            def timed(*args, **kwargs):
+                start = enter(phase)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    exit_(phase, start)
+        return timed
+
+    def section(self, phase: str):
+        """给一段代码计时的上下文管理器；关闭时不计时"""
+        if not self.enabled:
+            return _NULL_SECTION
+        self._locations.setdefault(phase, ("~", 0))
+        return _Section(self, phase)
+
+    # ---------- 导出 ----------
+    def report(self, limit: int = None) -> str:
+        """按累计耗时排序的文字报告"""
+        rows = sorted(self.stats.items(), key=lambda kv: kv[1][1], reverse=True)[:limit]
+        total = sum(entry[2] for entry in self.stats.values()) or 1
+        lines = [f"{'阶段':<28}{'次数':>10}{'累计 ms':>12}{'自身 ms':>12}{'平均 µs':>10}{'自身占比':>9}"]
+        for phase, (calls, cumulative, own) in rows:
+            lines.append(f"{phase:<30}{calls:>10}{cumulative / 1e6:>12.3f}{own / 1e6:>12.3f}"
+                         f"{cumulative / calls / 1e3:>10.2f}{own / total:>10.1%}")
+        return "\n".join(lines)
+
+    def dump_stats(self, path: str):
+        """
+        以 cProfile / pstats 的格式写出，可用 pstats.Stats(path) 或 snakeviz 查看
+
+        每个阶段是一个“函数”：tt 为自身耗时，ct 为累计耗时，调用关系来自阶段嵌套
+        """
+        def key(phase):
+            filename, line = self._locations.get(phase, ("~", 0))
+            return filename, line, phase
+
+        stats = {}
+        for phase, (calls, cumulative, own) in self.stats.items():
+            callers = {key(parent): (edge[0], edge[0], edge[2] / 1e9, edge[1] / 1e9)
+                       for (parent, child), edge in self.callers.items() if child == phase}
+            stats[key(phase)] = (calls, calls, own / 1e9, cumulative / 1e9, callers)
+        with open(path, "wb") as f:
+            marshal.dump(stats, f)
+
+
+class _Section:
+    __slots__ = ("profiler", "phase", "start")
+
+    def __init__(self, profiler: Profiler, phase: str):
+        self.profiler = profiler
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = self.profiler._enter(self.phase)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._exit(self.phase, self.start)
+
+
+class _NullSection:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return None
+
+
+_NULL_SECTION = _NullSection()
+
+# 全局注册表，游戏模块的计时点都登记在这里
+PROFILER = Profiler()
+
+
+class profiled:
+    """
+    方法装饰器：把方法登记为 PROFILER 的一个计时阶段
+
+    类创建时（__set_name__）直接把原函数放回类上，所以关闭计时时没有任何开销
+
+        class BattleManager:
+            @profiled("battle.print_status")
+            def print_status(self): ...
+    """
+
+    def __init__(self, phase: str, profiler: Profiler = None):
+        self.phase = phase
+        self.profiler = profiler or PROFILER
+        self.func = None
+
+    def __call__(self, func):
+        self.func = func
+        return self
+
+    def __set_name__(self, owner, name):
+        setattr(owner, name, self.func)
+        self.profiler.register(owner, name, self.func, self.phase)
+
+
+if __name__ == "__main__":
+    import os
+    import pstats
+    import tempfile
+
+    from game.Event.battle import BattleManager
+    from game.Simulation.montecarlo import create_units
+    from utils import output
+    from utils.logger import OFF
+    # 以脚本运行时本模块是 __main__，游戏模块登记在 utils.profiler 的全局注册表上
+    from utils.profiler import PROFILER, profiled
+
+    class Demo:
+        @profiled("demo.outer")
+        def outer(self):
+            for _ in range(3):
+                self.inner()
+            with PROFILER.section("demo.block"):
+                sum(range(10000))
+
+        @profiled("demo.inner")
+        def inner(self):
+            sum(range(1000))
+
+    Demo().outer()                       # 未开启：不计时
+    with PROFILER:
+        Demo().outer()
+    print(PROFILER.report())
+
+    # 一场 500 vs 500 的自动战斗
+    PROFILER.reset()
+    players, enemies = create_units(["战士"] * 250 + ["法师"] * 250, ["兽人"] * 500)
+    with PROFILER, output.redirect(output.NullOutput()):
+        BattleManager(players, enemies, rng=1, log_level=OFF).start_battle()
+    print(PROFILER.report())
+
+    path = os.path.join(tempfile.gettempdir(), "profiler_demo.prof")
+    PROFILER.dump_stats(path)
+    pstats.Stats(path).sort_stats("cumulative").print_stats(5)
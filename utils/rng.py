@@ -0,0 +1,170 @@
+import hashlib
+import random
+import secrets
+from typing import List, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖：RNGStream.numpy() 需要，BlockRNG 有纯 Python 退路
+    np = None
+
+
+# -----------------------------
+# 子流种子推导
+# -----------------------------
+def _derive_seed(seed: int, path: Tuple[int, ...]) -> int:
+    """
+    由根种子和子流路径推导出 256 位种子
+
+    使用 blake2b 而不是内置 hash()，保证不同进程、不同机器上结果一致
+    """
+    key = f"{seed}:{'/'.join(map(str, path))}".encode()
+    return int.from_bytes(hashlib.blake2b(key, digest_size=32).digest(), "big")
+
+
+# -----------------------------
+# 可复现、可拆分的随机数流
+# -----------------------------
+class RNGStream:
+    """
+    可复现、可拆分的随机数流
+
+    - 相同 seed + 相同 path 得到完全相同的随机序列，可按种子逐位重放战斗
+    - spawn(n) 拆分出 n 个互相独立的子流，例如每个并行 worker 一个
+    - 实例本身可调用 rng(a, b)，可以直接作为 roll_detail / CompiledDice.roll 的 rng 参数
+
+    用法：
+        rng = RNGStream(42)
+        ATTACK_DICE.roll(rng=rng)
+        workers = rng.spawn(8)
+    """
+    __slots__ = ("seed", "path", "_random", "_spawned", "_generator", "randint", "random", "choice", "shuffle")
+
+    def __init__(self, seed: int = None, path: Sequence[int] = ()):
+        if seed is None:
+            seed = secrets.randbits(64)
+        self.seed = seed                  # 根种子（子流共享）
+        self.path = tuple(path)           # 子流路径，根流为 ()
+        self._random = random.Random(_derive_seed(seed, self.path))
+        self._spawned = 0                 # 已拆分出的子流数量
+        self._generator = None            # 对应的 NumPy Generator，首次使用时创建
+
+        # 直接绑定底层方法，省去一层 Python 调用
+        self.randint = self._random.randint
+        self.random = self._random.random
+        self.choice = self._random.choice
+        self.shuffle = self._random.shuffle
+
+    def __repr__(self):
+        return f"RNGStream(seed={self.seed}, path={self.path})"
+
+    def __call__(self, a: int, b: int) -> int:
+        return self._random.randint(a, b)
+
+    def __getstate__(self):
+        return {"seed": self.seed, "path": self.path, "state": self._random.getstate(), "spawned": self._spawned}
+
+    def __setstate__(self, state):
+        self.__init__(state["seed"], state["path"])
+        self._random.setstate(state["state"])
+        self._spawned = state["spawned"]
+
+    def spawn(self, n: int = 1) -> List["RNGStream"]:
+        """
+        拆分出 n 个独立子流
+
+        多次调用得到的子流互不重复（与 numpy.random.SeedSequence.spawn 的约定一致）
+        """
+        children = [RNGStream(self.seed, self.path + (self._spawned + i,)) for i in range(n)]
+        self._spawned += n
+        return children
+
+    def numpy(self):
+        """
+        与本流对应的 NumPy Generator（同一个流始终返回同一个 Generator），
+        可直接传给 roll_many 的 rng 参数
+        """
+        if self._generator is None:
+            if np is None:
+                raise ImportError("RNGStream.numpy 需要 numpy，请先 pip install numpy")
+            self._generator = np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=self.path))
+        return self._generator
+
+
+# -----------------------------
+# 批量预取的骰子随机数
+# -----------------------------
+class BlockRNG:
+    """
+    批量预取随机数的 RNG 后端
+
+    每种点数范围（d4 / d6 / d8 / d20 / d100 ...）各维护一个缓冲区，
+    一次性从底层流取出 block_size 个均匀整数，之后每次掷骰只是一次 list.pop()，
+    缓冲区用完时再整块补充。接口与 rng(a, b) 相同，可直接传给 roll_detail /
+    CompiledDice.roll / BattleManager。
+
+    注意：同一个种子下，BlockRNG 与直接使用 RNGStream 得到的序列不同，
+    但 BlockRNG 自身在相同种子、相同调用顺序下仍然可以完全复现。
+    """
+    __slots__ = ("stream", "block_size", "_buffers", "choice", "random", "shuffle")
+
+    def __init__(self, stream: RNGStream = None, block_size: int = 4096):
+        if stream is None or isinstance(stream, int):
+            stream = RNGStream(stream)
+        if block_size <= 0:
+            raise ValueError("block_size must be >= 1")
+        self.stream = stream            # 底层随机数流
+        self.block_size = block_size    # 每次补充的数量
+        self._buffers = {}              # {(a, b): [预取的点数]}
+
+        # 非骰子用途（目标选择等）直接交给底层流
+        self.choice = stream.choice
+        self.random = stream.random
+        self.shuffle = stream.shuffle
+
+    def __repr__(self):
+        return f"BlockRNG({self.stream!r}, block_size={self.block_size})"
+
+    @property
+    def seed(self) -> int:
+        return self.stream.seed
+
+    def __call__(self, a: int, b: int) -> int:
+        buffer = self._buffers.get((a, b))
+        if not buffer:
+            buffer = self._refill(a, b)
+        return buffer.pop()
+
+    randint = __call__
+
+    def _refill(self, a: int, b: int) -> List[int]:
+        """整块补充 [a, b] 范围的缓冲区"""
+        if np is not None:
+            buffer = self.stream.numpy().integers(a, b + 1, size=self.block_size).tolist()
+        else:
+            # 没有 numpy 时退化为 random.choices，仍比逐个 randint 快
+            buffer = self.stream._random.choices(range(a, b + 1), k=self.block_size)
+        self._buffers[(a, b)] = buffer
+        return buffer
+
+    def spawn(self, n: int = 1) -> List["BlockRNG"]:
+        """拆分出 n 个独立的 BlockRNG（底层流各自 spawn）"""
+        return [BlockRNG(child, self.block_size) for child in self.stream.spawn(n)]
+
+    def numpy(self):
+        return self.stream.numpy()
+
+
+if __name__ == "__main__":
+    # 1. 相同种子得到相同序列
+    a, b = RNGStream(2024), RNGStream(2024)
+    print("🎲 相同种子:", [a.randint(1, 20) for _ in range(5)], [b.randint(1, 20) for _ in range(5)])
+
+    # 2. 子流互相独立，且可由 (seed, path) 重建
+    workers = RNGStream(2024).spawn(3)
+    print("🧵 子流:", [w.randint(1, 20) for w in workers])
+    print("🔁 重建子流 1:", RNGStream(2024, (1,)).randint(1, 20))
+
+    # 3. 批量预取：接口与 rng(a, b) 相同
+    block = BlockRNG(2024)
+    print("📦 BlockRNG d20:", [block(1, 20) for _ in range(5)])